@@ -0,0 +1,211 @@
+# alarms.py - MIN-HEAP ALARM SCHEDULER
+import heapq
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from schedule import validity
+
+logger = logging.getLogger(__name__)
+
+# Due-but-unacknowledged alarms kept for pollers; the oldest are dropped first
+MAX_PENDING_ALARMS = 500
+
+# How long a due alarm waits for an answer before it is dropped
+PENDING_GRACE = timedelta(hours=2)
+
+# Medication fields that affect when or how an alarm fires
+ALARM_FIELDS = ("alarm_enabled", "alarm_time", "active", "name", "patient", "dosage",
+                "start_date", "end_date")
+
+
+def parse_alarm_time(value: str) -> time:
+    """Parse an "HH:MM" alarm time, raising ValueError on bad input"""
+    return datetime.strptime(value, "%H:%M").time()
+
+
+def next_fire(alarm_time: time, after: datetime) -> datetime:
+    """First occurrence of alarm_time strictly after the given moment"""
+    fire = datetime.combine(after.date(), alarm_time)
+    if fire <= after:
+        fire += timedelta(days=1)
+    return fire
+
+
+class AlarmScheduler:
+    """Keeps parsed alarm times in a min-heap keyed by next fire time.
+
+    Polling pops only the alarms that came due since the last poll, so a
+    check costs O(due alarms) and a poll that lands a few minutes late
+    still sees everything that fired in between. Alarms ring only on
+    days inside the medication's start_date/end_date, re-arm from the
+    poll time (an idle gap yields one alarm, not one per missed day) and
+    each medication has at most one pending alarm, dropped after
+    PENDING_GRACE. Changed medications get a new generation number;
+    their old heap entries are skipped when they surface instead of
+    being searched for and removed.
+    """
+
+    def __init__(self, load_alarms: Callable[[], Iterable[dict]],
+                 max_pending: int = MAX_PENDING_ALARMS,
+                 clock: Callable[[], datetime] = datetime.now):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[float, int, int]] = []     # (fire timestamp, med id, generation)
+        self._alarms: Dict[int, dict] = {}                 # med id -> alarm details
+        self._generation: Dict[int, int] = {}
+        self._pending: "OrderedDict[str, dict]" = OrderedDict()
+        self._pending_ids: Dict[int, str] = {}              # med id -> its pending alarm id
+        self._max_pending = max_pending
+        self._due_listeners: List[Callable[[List[dict]], None]] = []
+        self.dropped = 0
+
+        now = self._clock()
+        with self._lock:
+            for med in load_alarms():
+                self._schedule(med, now)
+
+    # =====================
+    # SCHEDULING
+    # =====================
+    def _schedule(self, med: dict, now: datetime):
+        med_id = med["id"]
+        self._unschedule(med_id)
+        generation = self._generation[med_id]
+
+        if not (med.get("alarm_enabled") and med.get("active", True) and med.get("alarm_time")):
+            return
+        try:
+            alarm_time = parse_alarm_time(med["alarm_time"])
+        except ValueError:
+            logger.warning("Medication %s has invalid alarm_time %r; alarm not scheduled",
+                           med_id, med["alarm_time"])
+            return
+
+        start, end = validity(med)
+        self._alarms[med_id] = alarm = {
+            "alarm_time": alarm_time,
+            "start": start,
+            "end": end,
+            "medication": med.get("name"),
+            "patient": med.get("patient"),
+            "dosage": med.get("dosage"),
+            "time": med.get("alarm_time"),
+        }
+        self._arm(med_id, alarm, generation, now)
+
+    def _arm(self, med_id: int, alarm: dict, generation: int, after: datetime):
+        """Push the next fire after ``after`` that falls inside the validity window"""
+        fire = next_fire(alarm["alarm_time"], after)
+        if fire.toordinal() < alarm["start"]:
+            fire = datetime.combine(date.fromordinal(alarm["start"]), alarm["alarm_time"])
+        if fire.toordinal() <= alarm["end"]:
+            heapq.heappush(self._heap, (fire.timestamp(), med_id, generation))
+
+    def _unschedule(self, med_id: int):
+        self._generation[med_id] = self._generation.get(med_id, 0) + 1
+        self._alarms.pop(med_id, None)
+
+    def on_change(self, kind: str, old: Optional[dict], new: Optional[dict]):
+        """Repository listener: reschedule changed alarms, ack taken doses"""
+        if kind != "medication":
+            return
+        with self._lock:
+            if new is None:
+                self._unschedule(old["id"])
+                self._acknowledge_medication(old["id"])
+                return
+            if old is not None and new.get("taken_count", 0) > old.get("taken_count", 0):
+                self._acknowledge_medication(new["id"])
+            if old is None or any(old.get(f) != new.get(f) for f in ALARM_FIELDS):
+                self._schedule(new, self._clock())
+
+    # =====================
+    # POLLING
+    # =====================
+    def add_due_listener(self, listener: Callable[[List[dict]], None]):
+        """Call listener(alarms) whenever a poll finds newly due alarms"""
+        self._due_listeners.append(listener)
+
+    def poll(self) -> List[dict]:
+        """Move alarms that came due into the pending buffer and return it"""
+        now = self._clock()
+        now_ts = now.timestamp()
+        fired = []
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now_ts:
+                fire_ts, med_id, generation = heapq.heappop(heap)
+                if self._generation.get(med_id) != generation:
+                    continue  # stale entry for a changed medication
+                alarm = self._alarms[med_id]
+                due_at = datetime.fromtimestamp(fire_ts)
+                # After an idle gap only the latest missed occurrence counts
+                latest = next_fire(alarm["alarm_time"], now - timedelta(days=1))
+                if due_at < latest and alarm["start"] <= latest.toordinal() <= alarm["end"]:
+                    due_at = latest
+                if now - due_at <= PENDING_GRACE:
+                    fired.append(self._add_pending(med_id, due_at, alarm))
+                # Re-arm from now: days missed while nobody polled are not replayed
+                self._arm(med_id, alarm, generation, now)
+            self._expire(now)
+            pending = list(self._pending.values())
+        if fired:
+            for listener in self._due_listeners:
+                listener(fired)
+        return pending
+
+    def next_due(self) -> Optional[datetime]:
+        """When the earliest live alarm fires (None if nothing is scheduled)"""
+        with self._lock:
+            heap = self._heap
+            while heap and self._generation.get(heap[0][1]) != heap[0][2]:
+                heapq.heappop(heap)
+            return datetime.fromtimestamp(heap[0][0]) if heap else None
+
+    def acknowledge(self, alarm_id: str) -> bool:
+        with self._lock:
+            pending = self._pending.pop(alarm_id, None)
+            if pending is None:
+                return False
+            self._pending_ids.pop(pending["medication_id"], None)
+            return True
+
+    def _acknowledge_medication(self, med_id: int):
+        alarm_id = self._pending_ids.pop(med_id, None)
+        if alarm_id is not None:
+            self._pending.pop(alarm_id, None)
+
+    def _expire(self, now: datetime):
+        """Drop pending alarms older than the grace window (oldest are first)"""
+        cutoff = (now - PENDING_GRACE).isoformat()
+        while self._pending:
+            alarm_id, pending = next(iter(self._pending.items()))
+            if pending["due_at"] >= cutoff:
+                break
+            del self._pending[alarm_id]
+            self._pending_ids.pop(pending["medication_id"], None)
+
+    def _add_pending(self, med_id: int, due_at: datetime, alarm: dict) -> dict:
+        # A newer alarm replaces the medication's unanswered one
+        self._acknowledge_medication(med_id)
+        alarm_id = f"{med_id}-{due_at:%Y%m%d%H%M}"
+        self._pending_ids[med_id] = alarm_id
+        self._pending[alarm_id] = pending = {
+            "type": "medication_alarm",
+            "alarm_id": alarm_id,
+            "medication_id": med_id,
+            "medication": alarm["medication"],
+            "patient": alarm["patient"],
+            "dosage": alarm["dosage"],
+            "time": alarm["time"],
+            "due_at": due_at.isoformat(),
+            "message": f"Time to take {alarm['medication']} ({alarm['dosage']})"
+        }
+        while len(self._pending) > self._max_pending:
+            _, dropped = self._pending.popitem(last=False)
+            self._pending_ids.pop(dropped["medication_id"], None)
+            self.dropped += 1
+        return pending
@@ -0,0 +1,388 @@
+# analytics.py - COLUMNAR DOSE TABLE FOR ADHERENCE ANALYTICS
+import threading
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from schedule import SLOT_TIMES, TIME_ORDER, cycle_start, day_slots, validity
+
+# Days of dose history kept in the table (and the longest analytics window)
+HISTORY_DAYS = 365
+
+# Days generated per vectorized pass when back-filling history
+GENERATE_DAYS = 31
+
+# Rows reserved up front; the columns double in size when full
+INITIAL_CAPACITY = 4096
+
+# Taken-epoch value of a dose that has not been taken
+NOT_TAKEN = -1
+
+# Minutes-late bucket edges for the late-dose distribution
+LATE_EDGES = (0, 15, 30, 60, 120, 240)
+LATE_LABELS = ("early", "0-15 min", "15-30 min", "30-60 min", "1-2 h", "2-4 h", "4 h+")
+
+COLUMNS = (
+    ("medication_id", np.int64),
+    ("patient_id", np.int32),
+    ("scheduled", np.int64),   # epoch seconds
+    ("taken", np.int64),       # epoch seconds, NOT_TAKEN if missed/pending
+    ("slot", np.int8),         # TIME_ORDER rank of the schedule slot
+    ("live", np.bool_),        # False for doses cancelled by a later change
+)
+
+SLOT_OFFSETS = {rank: SLOT_TIMES[slot].hour * 3600 + SLOT_TIMES[slot].minute * 60
+                for slot, rank in TIME_ORDER.items()}
+
+
+def _midnight(ordinal: int) -> int:
+    return int(datetime.combine(date.fromordinal(ordinal), datetime.min.time()).timestamp())
+
+
+def _day_of(ts: int) -> int:
+    return date.fromtimestamp(ts).toordinal()
+
+
+def _timestamp(value) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(datetime.fromisoformat(str(value)).timestamp())
+    except ValueError:
+        return None
+
+
+def frame(columns: List[str], *data: np.ndarray) -> dict:
+    """Table in pandas "split" form: ``pd.DataFrame(**payload)`` rebuilds it"""
+    return {"columns": columns, "data": [list(row) for row in zip(*(d.tolist() for d in data))]}
+
+
+class DoseTable:
+    """One row per scheduled dose, stored column-wise in NumPy arrays.
+
+    Rows are generated from each active medication's pattern and
+    start/end dates, from the moment it was created, and filled in as
+    mark-taken events arrive. A change cancels the medication's future
+    doses for today and schedules the new ones; past rows are history and
+    never change. Aggregations run as vectorized passes over the columns.
+
+    Takes that happened before the process started are replayed from
+    ``logged(start, end)`` (the dose log's (medication id, epoch
+    microseconds) events); a medication with no logged take in the
+    window falls back to its ``last_taken``.
+    """
+
+    def __init__(self, load_active: Callable[[], Iterable[dict]],
+                 clock: Callable[[], datetime] = datetime.now,
+                 logged: Optional[Callable[[datetime, datetime], List[Tuple[int, int]]]] = None):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._size = 0
+        self._columns = {name: np.empty(INITIAL_CAPACITY, dtype) for name, dtype in COLUMNS}
+        self._patient_codes: Dict[str, int] = {}
+        self._patient_names: List[str] = []
+        self._labels: Dict[int, Tuple[str, str]] = {}       # med id -> (name, patient)
+        self._plans: Dict[int, tuple] = {}                   # active med id -> dose plan
+        self._today_rows: Dict[int, List[int]] = {}          # med id -> today's row indices
+        # Rows are appended day by day, so all of a day's rows lie between
+        # its first row and the next day's; day ordinal -> first row index
+        self._day_start: Dict[int, int] = {}
+
+        now = self._clock()
+        self._day = now.date().toordinal()
+        with self._lock:
+            meds = list(load_active())
+            for med in meds:
+                self._plan(med, _timestamp(med.get("created_at")))
+            first_day = self._day - HISTORY_DAYS + 1
+            self._backfill(first_day, self._day)
+            replayed = set()
+            if logged is not None:
+                events = logged(datetime.fromtimestamp(_midnight(first_day)), now)
+                replayed = self._replay(events)
+            for med in meds:
+                taken_at = _timestamp(med.get("last_taken"))
+                if taken_at is not None and med["id"] not in replayed:
+                    self._take(med["id"], taken_at)
+
+    # =====================
+    # ROW STORAGE
+    # =====================
+    def _append(self, **values: np.ndarray) -> int:
+        count = len(values["medication_id"])
+        start, end = self._size, self._size + count
+        capacity = len(self._columns["medication_id"])
+        if end > capacity:
+            while capacity < end:
+                capacity *= 2
+            for name, column in self._columns.items():
+                grown = np.empty(capacity, column.dtype)
+                grown[:start] = column[:start]
+                self._columns[name] = grown
+        for name, column in self._columns.items():
+            column[start:end] = values[name]
+        self._size = end
+        return start
+
+    def _patient_code(self, name: str) -> int:
+        code = self._patient_codes.get(name)
+        if code is None:
+            code = self._patient_codes[name] = len(self._patient_names)
+            self._patient_names.append(name)
+        return code
+
+    def _plan(self, med: dict, first_ts: Optional[int]):
+        """Remember which slots a medication needs, on which days of its cycle and from when"""
+        start_ord, end_ord = validity(med)
+        cycle = day_slots(med)
+        # (slot rank, cycle length, day of the cycle) per dose
+        doses = [(rank, len(cycle), phase) for phase, slots in enumerate(cycle) for rank, _, _ in slots]
+        patient = med.get("patient", "Unknown")
+        self._labels[med["id"]] = (med.get("name", "Unknown"), patient)
+        self._plans[med["id"]] = (self._patient_code(patient), doses, start_ord, end_ord,
+                                  first_ts if first_ts is not None else 0, cycle_start(med))
+
+    def _generate(self, med_ids: List[int], first_ord: int, last_ord: int, after_ts: int = 0):
+        """Append rows for the given medications on days [first_ord, last_ord]"""
+        plans = [(med_id, self._plans[med_id]) for med_id in med_ids if med_id in self._plans]
+        pairs = [(med_id, plan, dose) for med_id, plan in plans for dose in plan[1]]
+        if not pairs or last_ord < first_ord:
+            return
+        ms_med = np.array([med_id for med_id, _, _ in pairs], np.int64)
+        ms_patient = np.array([plan[0] for _, plan, _ in pairs], np.int32)
+        ms_slot = np.array([dose[0] for _, _, dose in pairs], np.int8)
+        ms_offset = np.array([SLOT_OFFSETS[dose[0]] for _, _, dose in pairs], np.int64)
+        ms_period = np.array([dose[1] for _, _, dose in pairs], np.int64)
+        ms_phase = np.array([dose[2] for _, _, dose in pairs], np.int64)
+        ms_cycle = np.array([plan[5] for _, plan, _ in pairs], np.int64)
+        ms_start = np.array([plan[2] for _, plan, _ in pairs], np.int64)
+        ms_end = np.array([plan[3] for _, plan, _ in pairs], np.int64)
+        ms_first = np.array([max(plan[4], after_ts) for _, plan, _ in pairs], np.int64)
+        midnights = np.array([_midnight(d) for d in range(first_ord, last_ord + 1)], np.int64)
+        # Day of ms_first, clamped to [first_ord - 1, last_ord]
+        ms_first_day = np.searchsorted(midnights, ms_first, side="right") - 1 + first_ord
+
+        # Each dose only gets the days inside its own window
+        lo = np.maximum(np.maximum(ms_start, ms_first_day), first_ord)
+        hi = np.minimum(ms_end, last_ord)
+        counts = np.maximum(hi - lo + 1, 0)
+        total = int(counts.sum())
+        if not total:
+            return
+        pair_index = np.repeat(np.arange(len(pairs)), counts)
+        day = lo[pair_index] + (np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts))
+        scheduled = midnights[day - first_ord] + ms_offset[pair_index]
+        keep = ((scheduled >= ms_first[pair_index])
+                & ((day - ms_cycle[pair_index]) % ms_period[pair_index] == ms_phase[pair_index]))
+        pair_index, scheduled, day = pair_index[keep], scheduled[keep], day[keep]
+        order = np.lexsort((ms_slot[pair_index], scheduled))
+        pair_index, scheduled, day = pair_index[order], scheduled[order], day[order]
+
+        start = self._append(
+            medication_id=ms_med[pair_index],
+            patient_id=ms_patient[pair_index],
+            scheduled=scheduled,
+            taken=np.full(len(scheduled), NOT_TAKEN, np.int64),
+            slot=ms_slot[pair_index],
+            live=np.ones(len(scheduled), np.bool_),
+        )
+        days, first_rows = np.unique(day, return_index=True)
+        for d, row in zip(days.tolist(), (first_rows + start).tolist()):
+            self._day_start.setdefault(d, row)
+        if last_ord == self._day:
+            today = _midnight(self._day)
+            rows = np.flatnonzero(scheduled >= today) + start
+            for row, med_id in zip(rows.tolist(), self._columns["medication_id"][rows].tolist()):
+                self._today_rows.setdefault(med_id, []).append(row)
+
+    def _backfill(self, first_ord: int, last_ord: int):
+        """Generate days [first_ord, last_ord], each pass only for plans valid in it"""
+        windows = {}
+        for med_id, plan in self._plans.items():
+            lo, hi = max(first_ord, plan[2], _day_of(plan[4])), min(last_ord, plan[3])
+            if lo <= hi:
+                windows[med_id] = (lo, hi)
+        if not windows:
+            return
+        for start in range(min(lo for lo, _ in windows.values()), last_ord + 1, GENERATE_DAYS):
+            end = min(start + GENERATE_DAYS - 1, last_ord)
+            med_ids = [med_id for med_id, (lo, hi) in windows.items() if lo <= end and hi >= start]
+            if med_ids:
+                self._generate(med_ids, start, end)
+
+    def _trim(self, first_ord: int):
+        """Drop rows scheduled before day ``first_ord``"""
+        kept = [row for day, row in self._day_start.items() if day >= first_ord]
+        drop = min(kept) if kept else self._size
+        if drop:
+            n = self._size
+            for column in self._columns.values():
+                column[:n - drop] = column[drop:n]
+            self._size = n - drop
+        self._day_start = {day: row - drop for day, row in self._day_start.items() if day >= first_ord}
+
+    def _roll_over(self):
+        """Drop days that left the history and generate any that started since the last write"""
+        today = self._clock().date().toordinal()
+        if today > self._day:
+            first = max(self._day + 1, today - HISTORY_DAYS + 1)
+            self._day = today
+            self._today_rows = {}
+            self._trim(today - HISTORY_DAYS + 1)
+            self._backfill(first, today)
+
+    # =====================
+    # CHANGES
+    # =====================
+    def _take(self, med_id: int, taken_at: int):
+        """Fill the untaken dose of that day closest to the time it was taken"""
+        if date.fromtimestamp(taken_at).toordinal() != self._day:
+            return
+        rows = [r for r in self._today_rows.get(med_id, ())
+                if self._columns["live"][r] and self._columns["taken"][r] == NOT_TAKEN]
+        if rows:
+            scheduled = self._columns["scheduled"]
+            best = min(rows, key=lambda r: abs(int(scheduled[r]) - taken_at))
+            self._columns["taken"][best] = taken_at
+
+    def _replay(self, events: List[Tuple[int, int]]) -> set:
+        """Fill back-filled rows from logged takes; returns the medication ids seen.
+
+        Each medication's takes on a day fill that day's doses in time
+        order, the n-th take the n-th dose; takes beyond the day's doses
+        are ignored. Runs right after the back-fill, while every row is
+        still an untaken history row.
+        """
+        if not events or not self._size:
+            return set()
+        ev_med = np.array([med_id for med_id, _ in events], np.int64)
+        ev_taken = np.array([at for _, at in events], np.int64) // 1_000_000
+        n = self._size
+        med = self._columns["medication_id"][:n]
+        scheduled = self._columns["scheduled"][:n]
+        first_day = _day_of(int(scheduled.min()))
+        midnights = np.array([_midnight(d) for d in range(first_day, self._day + 2)], np.int64)
+        span = len(midnights)
+        ev_day = np.searchsorted(midnights, ev_taken, side="right") - 1
+
+        # Rows and takes keyed by (dense medication code, day)
+        meds = np.unique(med)
+        ev_code = np.minimum(np.searchsorted(meds, ev_med), len(meds) - 1)
+        known = (meds[ev_code] == ev_med) & (ev_day >= 0) & (ev_day < span - 1)
+        ev_code, ev_day, ev_taken = ev_code[known], ev_day[known], ev_taken[known]
+        if not len(ev_code):
+            return set()
+        row_key = np.searchsorted(meds, med) * span + np.searchsorted(midnights, scheduled, side="right") - 1
+        ev_key = ev_code * span + ev_day
+
+        rows = np.lexsort((scheduled, row_key))
+        sorted_keys = row_key[rows]
+        order = np.lexsort((ev_taken, ev_key))
+        ev_key, ev_taken = ev_key[order], ev_taken[order]
+        # Rank of each take among its medication's takes that day
+        group_keys, group_first = np.unique(ev_key, return_index=True)
+        rank = np.arange(len(ev_key)) - group_first[np.searchsorted(group_keys, ev_key)]
+        target = np.searchsorted(sorted_keys, ev_key, side="left") + rank
+        fill = target < np.searchsorted(sorted_keys, ev_key, side="right")
+        self._columns["taken"][rows[target[fill]]] = ev_taken[fill]
+        return set(meds[ev_code].tolist())
+
+    def _cancel_upcoming(self, med_id: int, now_ts: int):
+        for row in self._today_rows.get(med_id, ()):
+            if self._columns["scheduled"][row] > now_ts and self._columns["taken"][row] == NOT_TAKEN:
+                self._columns["live"][row] = False
+
+    def on_change(self, kind: str, old: Optional[dict], new: Optional[dict]):
+        self.on_batch(kind, [(old, new)])
+
+    def on_batch(self, kind: str, changes: List[Tuple[Optional[dict], Optional[dict]]]):
+        if kind != "medication":
+            return
+        now_ts = int(self._clock().timestamp())
+        with self._lock:
+            self._roll_over()
+            replanned = []
+            for old, new in changes:
+                med = new if new is not None else old
+                med_id = med["id"]
+                if old is not None and new is not None and new.get("taken_count", 0) > old.get("taken_count", 0):
+                    taken_at = _timestamp(new.get("last_taken"))
+                    if taken_at is not None:
+                        self._take(med_id, taken_at)
+                if old is not None and new is not None and all(
+                        old.get(f) == new.get(f) for f in ("pattern", "patient", "start_date", "end_date", "active")):
+                    continue
+                self._cancel_upcoming(med_id, now_ts)
+                self._plans.pop(med_id, None)
+                if new is not None and new.get("active", True):
+                    self._plan(new, now_ts)
+                    replanned.append(med_id)
+            self._generate(replanned, self._day, self._day, now_ts)
+
+    # =====================
+    # AGGREGATIONS
+    # =====================
+    def _window(self, days: int) -> Dict[str, np.ndarray]:
+        """Copies of the rows scheduled in the last ``days`` days, up to now"""
+        now_ts = int(self._clock().timestamp())
+        with self._lock:
+            self._roll_over()
+            first_day = self._day - days + 1
+            starts = [row for day, row in self._day_start.items() if day >= first_day]
+            lo, hi = (min(starts) if starts else self._size), self._size
+            cols = {name: column[lo:hi].copy() for name, column in self._columns.items()}
+        first_ts = _midnight(first_day)
+        keep = cols["live"] & (cols["scheduled"] >= first_ts) & (cols["scheduled"] <= now_ts)
+        return {name: column[keep] for name, column in cols.items()}
+
+    def adherence(self, days: int, by: str = "patient") -> dict:
+        """Doses due vs taken per patient (or per medication)"""
+        rows = self._window(days)
+        key = rows["patient_id"] if by == "patient" else rows["medication_id"]
+        keys, inverse = np.unique(key, return_inverse=True)
+        due = np.bincount(inverse, minlength=len(keys))
+        taken = np.bincount(inverse, weights=rows["taken"] != NOT_TAKEN, minlength=len(keys)).astype(np.int64)
+        rate = np.round(np.divide(taken, due, out=np.zeros(len(keys)), where=due > 0), 4)
+        if by == "patient":
+            names = np.array([self._patient_names[k] for k in keys.tolist()], dtype=object)
+            return frame(["patient", "due", "taken", "missed", "adherence"],
+                         names, due, taken, due - taken, rate)
+        labels = [self._labels.get(k, ("Unknown", "Unknown")) for k in keys.tolist()]
+        return frame(["medication_id", "medication", "patient", "due", "taken", "missed", "adherence"],
+                     keys, np.array([l[0] for l in labels], dtype=object),
+                     np.array([l[1] for l in labels], dtype=object), due, taken, due - taken, rate)
+
+    def late_distribution(self, days: int) -> dict:
+        """How late taken doses were, bucketed by minutes after the slot"""
+        rows = self._window(days)
+        taken = rows["taken"] != NOT_TAKEN
+        minutes = (rows["taken"][taken] - rows["scheduled"][taken]) / 60
+        counts = np.bincount(np.digitize(minutes, LATE_EDGES), minlength=len(LATE_LABELS))
+        return frame(["bucket", "doses"], np.array(LATE_LABELS, dtype=object), counts)
+
+    def missed_streaks(self, days: int) -> dict:
+        """Longest and current run of consecutive missed doses per medication"""
+        rows = self._window(days)
+        if not len(rows["medication_id"]):
+            return frame(["medication_id", "medication", "patient", "longest_streak", "current_streak"])
+        order = np.lexsort((rows["scheduled"], rows["medication_id"]))
+        med = rows["medication_id"][order]
+        missed = rows["taken"][order] == NOT_TAKEN
+
+        # Run-length encode (medication, missed) and keep the missed runs
+        breaks = np.flatnonzero((med[1:] != med[:-1]) | (missed[1:] != missed[:-1])) + 1
+        starts = np.concatenate(([0], breaks))
+        lengths = np.diff(np.concatenate((starts, [len(med)])))
+        run_med, run_missed = med[starts], missed[starts]
+
+        meds, inverse = np.unique(run_med, return_inverse=True)
+        longest = np.zeros(len(meds), np.int64)
+        np.maximum.at(longest, inverse, np.where(run_missed, lengths, 0))
+        last_run = np.flatnonzero(np.concatenate((run_med[1:] != run_med[:-1], [True])))
+        current = np.where(run_missed[last_run], lengths[last_run], 0)
+
+        labels = [self._labels.get(k, ("Unknown", "Unknown")) for k in meds.tolist()]
+        return frame(["medication_id", "medication", "patient", "longest_streak", "current_streak"],
+                     meds, np.array([l[0] for l in labels], dtype=object),
+                     np.array([l[1] for l in labels], dtype=object), longest, current)
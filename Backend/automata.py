@@ -1,25 +1,420 @@
-# automata.py - DFA LOGIC (No changes needed)
-VALID_SYMBOLS = {"M", "E", "T", "X"}
+# automata.py - DFA LOGIC (compiled, table-driven)
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+SYMBOL_MEANINGS = {
+    "M": "Morning",
+    "N": "Noon",
+    "A": "Afternoon",
+    "E": "Evening",
+    "B": "Bedtime",
+    "T": "Twice Daily",
+    "X": "Skip",
+}
+
+VALID_SYMBOLS = set(SYMBOL_MEANINGS)
+
+# Schedule slots each symbol doses at (times come from schedule.SLOT_CLOCK)
+SYMBOL_SLOTS = {
+    "M": ("morning",),
+    "N": ("noon",),
+    "A": ("afternoon",),
+    "E": ("evening",),
+    "B": ("bedtime",),
+    "T": ("morning", "evening"),
+    "X": (),
+}
+
+PATTERN_HELP = (
+    "Use M (Morning), N (Noon), A (Afternoon), E (Evening), B (Bedtime), T (Twice Daily) "
+    "and X (Skip); (..){n} repeats a group, and [..] is a cycle with one symbol per day, "
+    "e.g. ME, MNB, (MX){3}, [MXMXMXX]"
+)
+
+
+# =====================
+# REGULAR EXPRESSION -> MINIMIZED DFA
+# =====================
+class DFA(NamedTuple):
+    """A minimized DFA over bytes: one 256-entry row per state, state 0 starts"""
+    table: Tuple[bytes, ...]
+    accepting: bytes            # accepting[state] == 1 for accepting states
+    dead: Optional[int]         # state that can never reach acceptance
+
+    def matches(self, text: str) -> bool:
+        """Single table-driven pass over the text"""
+        table, dead = self.table, self.dead
+        state = 0
+        for char in text:
+            code = ord(char)
+            if code > 255:
+                return False
+            state = table[state][code]
+            if state == dead:
+                return False
+        return self.accepting[state] == 1
+
+
+class _Parser:
+    """Recursive-descent parser for a small regex dialect.
+
+    Supports literals, ``\\`` escapes, classes like ``[a-z]``, groups,
+    ``|`` and the ``*``, ``+``, ``?``, ``{m}``, ``{m,}`` and ``{m,n}``
+    quantifiers. Produces a tuple AST.
+    """
+
+    def __init__(self, expression: str):
+        self.text = expression
+        self.pos = 0
+
+    def parse(self):
+        node = self._alternation()
+        if self.pos != len(self.text):
+            raise ValueError(f"Unexpected {self.text[self.pos]!r} at {self.pos} in {self.text!r}")
+        return node
+
+    def _peek(self) -> Optional[str]:
+        return self.text[self.pos] if self.pos < len(self.text) else None
+
+    def _take(self) -> str:
+        if self.pos >= len(self.text):
+            raise ValueError(f"Unexpected end of {self.text!r}")
+        char = self.text[self.pos]
+        self.pos += 1
+        return char
+
+    def _alternation(self):
+        branches = [self._concat()]
+        while self._peek() == "|":
+            self.pos += 1
+            branches.append(self._concat())
+        return branches[0] if len(branches) == 1 else ("alt", tuple(branches))
+
+    def _concat(self):
+        parts = []
+        while self._peek() not in (None, "|", ")"):
+            parts.append(self._repeat())
+        return ("cat", tuple(parts))
+
+    def _repeat(self):
+        node = self._atom()
+        while True:
+            char = self._peek()
+            if char == "*":
+                node = ("rep", node, 0, None)
+            elif char == "+":
+                node = ("rep", node, 1, None)
+            elif char == "?":
+                node = ("rep", node, 0, 1)
+            elif char == "{":
+                end = self.text.index("}", self.pos)
+                low, comma, high = self.text[self.pos + 1:end].partition(",")
+                node = ("rep", node, int(low), None if comma and not high else int(high or low))
+                self.pos = end
+            else:
+                return node
+            self.pos += 1
+
+    def _atom(self):
+        char = self._take()
+        if char == "(":
+            node = self._alternation()
+            if self._take() != ")":
+                raise ValueError(f"Unbalanced group in {self.text!r}")
+            return node
+        if char == "[":
+            return ("set", self._class())
+        if char == "\\":
+            return ("set", frozenset({ord(self._take())}))
+        if char in "*+?{":
+            raise ValueError(f"Nothing to repeat at {self.pos - 1} in {self.text!r}")
+        return ("set", frozenset({ord(char)}))
+
+    def _class(self) -> FrozenSet[int]:
+        codes = set()
+        negate = self._peek() == "^"
+        if negate:
+            self.pos += 1
+        while self._peek() != "]":
+            char = self._take()
+            if char == "\\":
+                char = self._take()
+            if self._peek() == "-" and self.pos + 1 < len(self.text) and self.text[self.pos + 1] != "]":
+                self.pos += 1
+                last = self._take()
+                codes.update(range(ord(char), ord(last) + 1))
+            else:
+                codes.add(ord(char))
+        self.pos += 1
+        return frozenset(range(256)) - codes if negate else frozenset(codes)
+
+
+class _NFA:
+    """Thompson construction: epsilon moves plus byte-set moves"""
+
+    def __init__(self):
+        self.epsilon: List[List[int]] = []
+        self.moves: List[List[Tuple[FrozenSet[int], int]]] = []
+
+    def state(self) -> int:
+        self.epsilon.append([])
+        self.moves.append([])
+        return len(self.epsilon) - 1
+
+    def build(self, node) -> Tuple[int, int]:
+        """Fragment (start, end) for an AST node"""
+        kind = node[0]
+        if kind == "set":
+            start, end = self.state(), self.state()
+            self.moves[start].append((node[1], end))
+            return start, end
+        if kind == "cat":
+            start = end = self.state()
+            for part in node[1]:
+                first, last = self.build(part)
+                self.epsilon[end].append(first)
+                end = last
+            return start, end
+        if kind == "alt":
+            start, end = self.state(), self.state()
+            for branch in node[1]:
+                first, last = self.build(branch)
+                self.epsilon[start].append(first)
+                self.epsilon[last].append(end)
+            return start, end
+        # ("rep", child, low, high): low copies, then optional copies or a loop
+        _, child, low, high = node
+        start = end = self.state()
+        for _ in range(low):
+            first, last = self.build(child)
+            self.epsilon[end].append(first)
+            end = last
+        if high is None:
+            first, last = self.build(child)
+            self.epsilon[end].append(first)
+            self.epsilon[last].append(first)
+            exit_ = self.state()
+            self.epsilon[end].append(exit_)
+            self.epsilon[last].append(exit_)
+            return start, exit_
+        exit_ = self.state()
+        for _ in range(high - low):
+            first, last = self.build(child)
+            self.epsilon[end].append(first)
+            self.epsilon[end].append(exit_)
+            end = last
+        self.epsilon[end].append(exit_)
+        return start, exit_
+
+    def closure(self, states: Iterable[int]) -> FrozenSet[int]:
+        seen = set(states)
+        stack = list(seen)
+        while stack:
+            for target in self.epsilon[stack.pop()]:
+                if target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        return frozenset(seen)
+
+
+def _byte_classes(nfa: _NFA) -> List[List[int]]:
+    """Group bytes that every move treats alike, so subsets are built per class"""
+    sets = [byte_set for moves in nfa.moves for byte_set, _ in moves]
+    groups: Dict[Tuple[int, ...], List[int]] = {}
+    for code in range(256):
+        signature = tuple(i for i, byte_set in enumerate(sets) if code in byte_set)
+        groups.setdefault(signature, []).append(code)
+    return list(groups.values())
+
+
+def _subsets(nfa: _NFA, start: int, accept: int, classes: List[List[int]]):
+    """Subset construction: DFA transitions per byte class, plus accepting flags"""
+    first = nfa.closure((start,))
+    index = {first: 0}
+    order = [first]
+    transitions: List[List[int]] = []
+    for subset in order:
+        row = []
+        for codes in classes:
+            code = codes[0]
+            targets = nfa.closure(t for s in subset for byte_set, t in nfa.moves[s] if code in byte_set)
+            if targets not in index:
+                index[targets] = len(order)
+                order.append(targets)
+            row.append(index[targets])
+        transitions.append(row)
+    accepting = [accept in subset for subset in order]
+    return transitions, accepting
+
+
+def _hopcroft(transitions: List[List[int]], accepting: List[bool]) -> Tuple[List[int], int]:
+    """Hopcroft's partition refinement: state -> block, and the number of blocks"""
+    n = len(transitions)
+    n_classes = len(transitions[0]) if transitions else 0
+    inverse = [[[] for _ in range(n)] for _ in range(n_classes)]
+    for state, row in enumerate(transitions):
+        for c, target in enumerate(row):
+            inverse[c][target].append(state)
+
+    final = {s for s in range(n) if accepting[s]}
+    rest = set(range(n)) - final
+    partition = [block for block in (final, rest) if block]
+    work = [min(partition, key=len)] if len(partition) == 2 else []
+    while work:
+        splitter = work.pop()
+        for c in range(n_classes):
+            incoming = {s for t in splitter for s in inverse[c][t]}
+            if not incoming:
+                continue
+            refined = []
+            for block in partition:
+                inside, outside = block & incoming, block - incoming
+                if inside and outside:
+                    refined.extend((inside, outside))
+                    if block in work:
+                        work.remove(block)
+                        work.extend((inside, outside))
+                    else:
+                        work.append(min(inside, outside, key=len))
+                else:
+                    refined.append(block)
+            partition = refined
+
+    # Number blocks so the start state's block is 0
+    partition.sort(key=lambda block: (0 not in block, min(block)))
+    block_of = [0] * n
+    for number, block in enumerate(partition):
+        for state in block:
+            block_of[state] = number
+    return block_of, len(partition)
+
+
+@lru_cache(maxsize=None)
+def compile_regex(expression: str) -> DFA:
+    """Compile a regex to a minimized, table-driven DFA (memoized by expression text)"""
+    nfa = _NFA()
+    start, accept = nfa.build(_Parser(expression).parse())
+    classes = _byte_classes(nfa)
+    transitions, accepting = _subsets(nfa, start, accept, classes)
+    block_of, n_blocks = _hopcroft(transitions, accepting)
+    if n_blocks > 255:
+        raise ValueError(f"{expression!r} needs {n_blocks} states; at most 255 fit a byte table")
+
+    class_of = [0] * 256
+    for c, codes in enumerate(classes):
+        for code in codes:
+            class_of[code] = c
+    rows = [None] * n_blocks
+    flags = bytearray(n_blocks)
+    for state, row in enumerate(transitions):
+        block = block_of[state]
+        if rows[block] is None:
+            rows[block] = bytes(block_of[row[class_of[code]]] for code in range(256))
+            flags[block] = accepting[state]
+
+    dead = next((b for b in range(n_blocks)
+                 if not flags[b] and all(rows[b][code] == b for code in range(256))), None)
+    return DFA(tuple(rows), bytes(flags), dead)
+
+
+# =====================
+# SCHEDULE PATTERN LANGUAGE
+# =====================
+def pattern_grammar(symbols: Iterable[str]) -> str:
+    """The pattern language as a regex over characters.
+
+    An item is a symbol or a parenthesized run of symbols, optionally
+    repeated with {n}; a pattern is one or more items (every symbol is
+    taken every day) or items inside [..] (one symbol per day, cycling).
+    """
+    letters = "".join(sorted(symbols))
+    symbol = f"[{letters}{letters.lower()}]"
+    count = r"\{[1-9][0-9]?\}"
+    item = rf"({symbol}({count})?|\({symbol}+\)({count})?)"
+    return rf"{item}+|\[{item}+\]"
+
+
+_GRAMMAR = compile_regex(pattern_grammar(SYMBOL_MEANINGS))
+
+# Bytes of a plain symbol-only pattern (the common case, checked in C)
+_SYMBOL_BYTES = "".join(SYMBOL_MEANINGS).encode("ascii") + "".join(SYMBOL_MEANINGS).lower().encode("ascii")
+
+
+class PatternAnalysis(NamedTuple):
+    """Result of validating and expanding a pattern"""
+    pattern: str                # normalized (upper-case) pattern
+    valid: bool
+    meaning: Tuple[str, ...]
+    counts: Dict[str, int]      # occurrences of each symbol
+    days: Tuple[Tuple[str, ...], ...] = ()   # symbols per day of the cycle (one day if not a cycle)
+
+    @property
+    def symbols(self) -> Tuple[str, ...]:
+        return tuple(symbol for day in self.days for symbol in day)
+
+    def on_day(self, offset: int) -> Tuple[str, ...]:
+        """Symbols taken ``offset`` days into the cycle"""
+        return self.days[offset % len(self.days)] if self.days else ()
+
+
+def _expand(pattern: str) -> Tuple[Tuple[str, ...], ...]:
+    """Days of symbols for a pattern the grammar accepted (upper-case)"""
+    cycle = pattern.startswith("[")
+    body = pattern[1:-1] if cycle else pattern
+    symbols = []
+    i = 0
+    while i < len(body):
+        if body[i] == "(":
+            close = body.index(")", i)
+            unit, i = body[i + 1:close], close + 1
+        else:
+            unit, i = body[i], i + 1
+        if i < len(body) and body[i] == "{":
+            close = body.index("}", i)
+            unit, i = unit * int(body[i + 1:close]), close + 1
+        symbols.extend(unit)
+    return tuple((s,) for s in symbols) if cycle else (tuple(symbols),)
+
+
+def analyze(pattern: str) -> PatternAnalysis:
+    """Validate with one DFA pass, then expand the accepted pattern"""
+    normalized = pattern.upper()
+    if not _GRAMMAR.matches(pattern):
+        return PatternAnalysis(normalized, False, (), {})
+
+    days = _expand(normalized)
+    counts = dict.fromkeys(SYMBOL_MEANINGS, 0)
+    for day in days:
+        for symbol in day:
+            counts[symbol] += 1
+    return PatternAnalysis(
+        normalized,
+        True,
+        tuple(SYMBOL_MEANINGS[s] for day in days for s in day),
+        counts,
+        days,
+    )
+
 
 def validate_pattern(pattern: str) -> bool:
     """DFA-based validation"""
-    if not pattern:
-        return False
+    return validate_many((pattern,))[0]
+
+
+def validate_many(patterns: Iterable[str]) -> List[bool]:
+    """Validate a batch of patterns.
+
+    Plain symbol patterns are checked by a single C-level
+    ``bytes.translate`` call (deleting every symbol byte leaves nothing);
+    anything else takes one pass through the compiled grammar table.
+    """
+    symbol_bytes = _SYMBOL_BYTES
+    matches = _GRAMMAR.matches
+    return [
+        bool(p) and ((p.isascii() and not p.encode("ascii").translate(None, symbol_bytes)) or matches(p))
+        for p in patterns
+    ]
 
-    for char in pattern.upper():
-        if char not in VALID_SYMBOLS:
-            return False
-    return True
 
 def pattern_meaning(pattern: str):
-    meaning = []
-    for char in pattern.upper():
-        if char == "M":
-            meaning.append("Morning")
-        elif char == "E":
-            meaning.append("Evening")
-        elif char == "T":
-            meaning.append("Twice Daily")
-        elif char == "X":
-            meaning.append("Skip")
-    return meaning
\ No newline at end of file
+    return list(analyze(pattern).meaning)
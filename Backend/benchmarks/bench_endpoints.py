@@ -0,0 +1,96 @@
+# bench_endpoints.py - PER-ENDPOINT MICRO-BENCHMARKS
+"""Time the hot API endpoints in-process with TestClient at several data sizes.
+
+Run from the Backend folder:
+
+    python benchmarks/bench_endpoints.py --sizes 1k,100k,1M --requests 200
+
+For each size a seeded data set is generated (see workload.py), the API
+is bound to it and every endpoint is called sequentially; p50/p95/p99
+latencies are printed and saved under benchmarks/results/. Pass
+``--baseline`` with an earlier result file to see the difference. The
+1M size needs several GB of memory.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+import main
+from workload import build_store, compare, generate, parse_sizes, print_table, random_pattern, save_results, summarize
+
+# Endpoints whose response grows with the data set get fewer calls
+HEAVY = {"GET /api/schedule/today"}
+
+
+def endpoints(client: TestClient, n_medications: int, pattern_length, seed: int) -> dict:
+    rng = random.Random(seed)
+    patterns = [random_pattern(rng, pattern_length) for _ in range(64)]
+    return {
+        "GET /validate-pattern": lambda i: client.get(f"/validate-pattern/{patterns[i % len(patterns)]}"),
+        "GET /api/schedule/today": lambda i: client.get("/api/schedule/today"),
+        "GET /api/notifications/check": lambda i: client.get("/api/notifications/check"),
+        "GET /api/stats": lambda i: client.get("/api/stats"),
+        "POST mark-taken": lambda i: client.post(
+            f"/api/medications/{i * 7919 % n_medications + 1}/mark-taken"),
+    }
+
+
+def run(store, rows: int, args) -> list:
+    main.bind_repository(store)
+    client = TestClient(main.app)
+    results = []
+    for name, call in endpoints(client, rows, args.pattern_length, args.seed).items():
+        count = max(3, args.requests // 20) if name in HEAVY else args.requests
+        for i in range(min(count, args.warmup)):
+            call(i)
+        latencies = []
+        for i in range(count):
+            start = time.perf_counter()
+            response = call(i)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, (name, response.status_code, response.text[:200])
+        results.append({"rows": rows, "backend": args.backend, "endpoint": name, **summarize(latencies)})
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=parse_sizes, default=parse_sizes("1k,100k,1M"),
+                        help="medication counts, e.g. 1k,100k,1M")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--pattern-length", type=int, nargs=2, default=(1, 4), metavar=("MIN", "MAX"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file (default benchmarks/results/endpoints-<time>.json)")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.sizes:
+            start = time.perf_counter()
+            patients, medications = generate(rows, pattern_length=tuple(args.pattern_length), seed=args.seed)
+            store = build_store(args.backend, patients, medications, os.path.join(tmp, f"bench-{rows}.db"))
+            del patients, medications
+            print(f"seeded {rows} medications in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+            results.extend(run(store, rows, args))
+            if args.backend == "sqlite":
+                store.close()
+
+    print_table(results)
+    settings = {k: v for k, v in vars(args).items() if k not in ("output", "baseline")}
+    print(f"\nsaved {save_results('endpoints', settings, results, args.output)}")
+    if args.baseline:
+        compare(args.baseline, results)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,79 @@
+# bench_memory.py - DICT vs SLOTS RECORD MEMORY BENCHMARK
+"""Compare the memory held by medication dicts and by MedicationRecords.
+
+Run from the Backend folder:
+
+    python benchmarks/bench_memory.py --medications 200000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Medication
+from records import MedicationRecord
+
+DRUGS = ["Metformin", "Lisinopril", "Atorvastatin", "Amlodipine", "Omeprazole", "Levothyroxine"]
+PATTERNS = ["M", "E", "ME", "T", "MXE", "MET"]
+FREQUENCIES = ["Once Daily", "Twice Daily", "Three Times Daily"]
+
+
+def model_dumps(n: int, n_patients: int):
+    """Dicts exactly as the API stores them today (Medication.to_record())"""
+    for i in range(n):
+        yield Medication(
+            id=i,
+            name=DRUGS[i % len(DRUGS)],
+            patient=f"Patient {i % n_patients}",
+            dosage=f"{(i % 4 + 1) * 5}mg",
+            pattern=PATTERNS[i % len(PATTERNS)],
+            frequency=FREQUENCIES[i % len(FREQUENCIES)],
+            start_date=date(2024, 1, 1 + i % 28),
+            end_date=date(2025, 1, 1 + i % 28),
+            alarm_enabled=i % 3 == 0,
+            alarm_time="08:00" if i % 3 == 0 else None,
+        ).to_record()
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    items = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return items, size, elapsed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--medications", type=int, default=200000)
+    parser.add_argument("--patients", type=int, default=5000)
+    args = parser.parse_args()
+
+    # Each stored dict owns the strings its request body parsed, so both
+    # sides start from JSON text decoded inside the measured build
+    bodies = [json.dumps(m, default=str) for m in model_dumps(args.medications, args.patients)]
+
+    dicts, dict_bytes, dict_time = measure(lambda: [json.loads(body) for body in bodies])
+    del dicts
+    records, record_bytes, record_time = measure(
+        lambda: [MedicationRecord.from_dict(json.loads(body)) for body in bodies])
+
+    n = args.medications
+    print(f"{'storage':<12}{'total MB':>12}{'bytes/med':>12}{'build s':>10}")
+    print(f"{'dict':<12}{dict_bytes / 1e6:>12.1f}{dict_bytes / n:>12.0f}{dict_time:>10.2f}")
+    print(f"{'record':<12}{record_bytes / 1e6:>12.1f}{record_bytes / n:>12.0f}{record_time:>10.2f}")
+    print(f"records use {record_bytes / dict_bytes:.0%} of the dict memory")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,88 @@
+# bench_storage.py - MEMORY vs SQLITE BACKEND BENCHMARK
+"""Compare the storage backends on the existing API endpoints.
+
+Run from the Backend folder:
+
+    python benchmarks/bench_storage.py --medications 20000 --requests 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+import main
+from repository import InMemoryRepository
+from sqlite_repository import SQLiteRepository
+
+PATTERNS = ["M", "E", "ME", "T", "MXE", "MET"]
+
+
+def seed(store, n_patients: int, n_medications: int):
+    for i in range(1, n_patients + 1):
+        store.add_patient({"id": i, "name": f"Patient {i}", "phone": f"+1{i:09d}", "gender": "Other"})
+    for i in range(1, n_medications + 1):
+        store.add_medication({
+            "id": i,
+            "name": f"Drug {i}",
+            "patient": f"Patient {i % n_patients + 1}",
+            "dosage": "10mg",
+            "pattern": PATTERNS[i % len(PATTERNS)],
+            "alarm_enabled": i % 3 == 0,
+            "alarm_time": "08:00" if i % 3 == 0 else None,
+            "active": i % 10 != 0,
+        })
+
+
+def run(store, n_medications: int, n_requests: int) -> dict:
+    main.bind_repository(store)
+    client = TestClient(main.app)
+    endpoints = {
+        "GET /patients/{id}": lambda i: client.get(f"/patients/{i % 100 + 1}"),
+        "POST mark-taken": lambda i: client.post(f"/api/medications/{i * 7919 % n_medications + 1}/mark-taken"),
+        "GET /api/stats": lambda i: client.get("/api/stats"),
+        "GET /medications/active": lambda i: client.get("/medications/active"),
+        "GET /api/schedule/today": lambda i: client.get("/api/schedule/today"),
+    }
+    results = {}
+    for name, call in endpoints.items():
+        # Listing endpoints are far heavier, so they get fewer iterations
+        count = n_requests if "{id}" in name or "mark" in name else max(1, n_requests // 20)
+        start = time.perf_counter()
+        for i in range(count):
+            assert call(i).status_code == 200
+        results[name] = (time.perf_counter() - start) / count * 1000
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=100)
+    parser.add_argument("--medications", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    memory = InMemoryRepository()
+    seed(memory, args.patients, args.medications)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite = SQLiteRepository(os.path.join(tmp, "bench.db"))
+        seed(sqlite, args.patients, args.medications)
+
+        timings = {
+            "memory": run(memory, args.medications, args.requests),
+            "sqlite": run(sqlite, args.medications, args.requests),
+        }
+        sqlite.close()
+
+    print(f"{'endpoint':<28}{'memory ms':>12}{'sqlite ms':>12}")
+    for name in timings["memory"]:
+        print(f"{name:<28}{timings['memory'][name]:>12.3f}{timings['sqlite'][name]:>12.3f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,168 @@
+# load_test.py - CONCURRENT LOAD DRIVER AGAINST A LOCAL UVICORN
+"""Start the API under uvicorn with seeded data and load it from many connections.
+
+Run from the Backend folder:
+
+    python benchmarks/load_test.py --sizes 1k,100k --concurrency 16 --duration 10
+
+For each size a uvicorn server is started in a child process on the
+generated data set (see workload.py). Every endpoint is then driven by
+``--concurrency`` keep-alive connections for ``--duration`` seconds, and
+throughput and p50/p95/p99 latencies are printed and saved under
+benchmarks/results/. Pass ``--baseline`` with an earlier result file to
+see the difference.
+"""
+import argparse
+import http.client
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workload import build_store, compare, generate, parse_sizes, print_table, random_pattern, save_results, summarize
+
+# Seconds to wait for the child server to seed its data and start listening
+STARTUP_TIMEOUT = 600
+
+
+def serve(args):
+    """Child process: seed a repository, bind the API to it and run uvicorn"""
+    import uvicorn
+    import main
+
+    patients, medications = generate(args.rows, pattern_length=tuple(args.pattern_length), seed=args.seed)
+    store = build_store("memory", patients, medications)
+    del patients, medications
+    main.bind_repository(store)
+    uvicorn.run(main.app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+def requests_for(rows: int, pattern_length, seed: int) -> dict:
+    """Endpoint name -> function building the (method, path) of the i-th call"""
+    rng = random.Random(seed)
+    patterns = [random_pattern(rng, pattern_length) for _ in range(64)]
+    return {
+        "GET /validate-pattern": lambda i: ("GET", f"/validate-pattern/{patterns[i % len(patterns)]}"),
+        "GET /api/schedule/today": lambda i: ("GET", "/api/schedule/today"),
+        "GET /api/notifications/check": lambda i: ("GET", "/api/notifications/check"),
+        "GET /api/stats": lambda i: ("GET", "/api/stats"),
+        "POST mark-taken": lambda i: ("POST", f"/api/medications/{i * 7919 % rows + 1}/mark-taken"),
+    }
+
+
+def drive(host: str, port: int, make_request: Callable[[int], Tuple[str, str]],
+          concurrency: int, duration: float) -> Tuple[List[float], int, float]:
+    """Run ``concurrency`` closed-loop clients for ``duration`` seconds"""
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(worker: int):
+        conn = http.client.HTTPConnection(host, port, timeout=120)
+        mine, failed, i = [], 0, worker
+        while time.perf_counter() < deadline:
+            method, path = make_request(i)
+            i += concurrency
+            start = time.perf_counter()
+            try:
+                conn.request(method, path)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=120)
+                ok = False
+            if ok:
+                mine.append(time.perf_counter() - start)
+            else:
+                failed += 1
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - start
+
+
+def wait_until_up(host: str, port: int, server: subprocess.Popen):
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with status {server.returncode}")
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request("GET", "/")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError("server did not start in time")
+
+
+def run(rows: int, args) -> list:
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--rows", str(rows),
+               "--host", args.host, "--port", str(args.port), "--seed", str(args.seed),
+               "--pattern-length", *map(str, args.pattern_length)]
+    server = subprocess.Popen(command)
+    try:
+        start = time.perf_counter()
+        wait_until_up(args.host, args.port, server)
+        print(f"server up with {rows} medications after {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        results = []
+        for name, make_request in requests_for(rows, args.pattern_length, args.seed).items():
+            latencies, errors, elapsed = drive(args.host, args.port, make_request, args.concurrency, args.duration)
+            results.append({"rows": rows, "endpoint": name, "concurrency": args.concurrency,
+                            "errors": errors, **summarize(latencies, elapsed)})
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=parse_sizes, default=parse_sizes("1k,100k,1M"),
+                        help="medication counts, e.g. 1k,100k,1M")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pattern-length", type=int, nargs=2, default=(1, 4), metavar=("MIN", "MAX"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file (default benchmarks/results/load-<time>.json)")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--rows", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    results = []
+    for rows in args.sizes:
+        results.extend(run(rows, args))
+
+    print_table(results, extra=("throughput_rps", "errors"))
+    settings = {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "serve", "rows")}
+    print(f"\nsaved {save_results('load', settings, results, args.output)}")
+    if args.baseline:
+        compare(args.baseline, results)
+
+
+if __name__ == "__main__":
+    main_cli()
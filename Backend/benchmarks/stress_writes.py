@@ -0,0 +1,126 @@
+# stress_writes.py - CONCURRENT WRITE STRESS TEST
+"""Hammer the write endpoints from many threads and check nothing is lost.
+
+Run from the Backend folder:
+
+    python benchmarks/stress_writes.py --threads 32 --taps 200
+
+Every thread taps "Taken" on a few shared medications while others add
+and delete medications and read the medication lists and today's
+schedule. Afterwards
+each medication's taken_count must equal the number of successful taps,
+and the running stats and the schedule must match a full recount. Exits
+with status 1 if anything is off.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+import main
+from repository import InMemoryRepository
+from schedule import TodaySchedule
+from sqlite_repository import SQLiteRepository
+from stats import verify
+
+HOT_MEDICATIONS = 4
+
+
+def seed(store):
+    store.add_patient({"id": 1, "name": "Stress Patient", "phone": "+10000000000", "gender": "Other"})
+    for i in range(1, HOT_MEDICATIONS + 1):
+        store.add_medication({"id": i, "name": f"Drug {i}", "patient": "Stress Patient",
+                              "dosage": "10mg", "pattern": "MET", "alarm_enabled": True,
+                              "alarm_time": "08:00", "active": True})
+
+
+def run(store, threads: int, taps: int) -> list:
+    seed(store)
+    main.bind_repository(store)
+    client = TestClient(main.app)
+
+    def tapper(worker: int) -> int:
+        ok = 0
+        for i in range(taps):
+            med_id = (worker + i) % HOT_MEDICATIONS + 1
+            ok += client.post(f"/api/medications/{med_id}/mark-taken").status_code == 200
+        return ok
+
+    def adder(worker: int) -> int:
+        base = 1000 + worker * taps
+        for i in range(taps):
+            client.post("/medications", json={"id": base + i, "name": "Extra", "patient": "Stress Patient",
+                                              "dosage": "5mg", "pattern": "ME"})
+        return 0
+
+    def deleter(worker: int) -> int:
+        base = 500000 + worker * taps
+        for i in range(taps):
+            client.post("/medications", json={"id": base + i, "name": "Brief", "patient": "Stress Patient",
+                                              "dosage": "5mg", "pattern": "M", "alarm_enabled": True,
+                                              "alarm_time": "09:00"})
+            assert client.delete(f"/medications/{base + i}").status_code == 200
+        return 0
+
+    def reader(_: int) -> int:
+        for _ in range(taps // 4):
+            assert client.get("/medications/active").status_code == 200
+            assert client.get("/medications", params={"patient": "Stress Patient"}).status_code == 200
+            assert client.get("/medications", params={"alarm_enabled": True}).status_code == 200
+            assert client.get("/api/schedule/today").status_code == 200
+        return 0
+
+    helpers = max(1, threads // 4)
+    jobs = [tapper] * threads + [adder] * helpers + [deleter] * helpers + [reader] * helpers
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        futures = [pool.submit(job, n) for n, job in enumerate(jobs)]
+        taps_ok = sum(f.result() for f in futures)
+
+    problems = []
+    counted = sum(store.get_medication(i)["taken_count"] for i in range(1, HOT_MEDICATIONS + 1))
+    if counted != taps_ok:
+        problems.append(f"lost updates: {taps_ok} taps succeeded, taken_count sums to {counted}")
+    check = verify(main.counters, store)
+    if not check["consistent"]:
+        problems.append(f"stats drifted: {check['mismatches']}")
+    expected = TodaySchedule(store.active_medications, main.dose_log.count_on).entries()
+    if sorted(map(repr, main.today_schedule.entries())) != sorted(map(repr, expected)):
+        problems.append("today's schedule differs from a fresh rebuild")
+    return problems
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--taps", type=int, default=200)
+    args = parser.parse_args()
+
+    # Switch threads as often as possible to provoke interleavings
+    sys.setswitchinterval(1e-6)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "memory": InMemoryRepository(),
+            "sqlite": SQLiteRepository(os.path.join(tmp, "stress.db")),
+        }
+        for name, store in backends.items():
+            start = time.perf_counter()
+            problems = run(store, args.threads, args.taps)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<8}{'FAIL' if problems else 'ok':<6}{elapsed:.1f}s")
+            for problem in problems:
+                print(f"    {problem}")
+            failed = failed or bool(problems)
+        backends["sqlite"].close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,181 @@
+# workload.py - SEEDED SYNTHETIC DATA AND RESULT FILES FOR BENCHMARKS
+"""Shared pieces of the endpoint benchmarks.
+
+``generate()`` builds a reproducible data set of any size: the same seed
+and sizes always give the same patients, medications and patterns.
+``summarize()`` turns raw latencies into the numbers we compare, and
+``save_results()`` / ``compare()`` keep runs as JSON files so a change
+to main.py can be checked against the run before it.
+"""
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from automata import VALID_SYMBOLS
+from repository import InMemoryRepository
+from sqlite_repository import SQLiteRepository
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+DRUGS = ["Metformin", "Lisinopril", "Atorvastatin", "Amlodipine", "Omeprazole",
+         "Levothyroxine", "Simvastatin", "Losartan", "Gabapentin", "Sertraline"]
+DOSAGES = ["5mg", "10mg", "20mg", "40mg", "100mg", "500mg"]
+FREQUENCIES = ["Once Daily", "Twice Daily", "Three Times Daily"]
+SYMBOLS = sorted(VALID_SYMBOLS)
+
+
+def parse_sizes(text: str) -> List[int]:
+    """"1k,100k,1M" -> [1000, 100000, 1000000]"""
+    units = {"k": 1_000, "m": 1_000_000}
+    sizes = []
+    for part in text.split(","):
+        part = part.strip().lower()
+        if part:
+            sizes.append(int(float(part[:-1]) * units[part[-1]]) if part[-1] in units else int(part))
+    return sizes
+
+
+def random_pattern(rng: random.Random, length: Tuple[int, int]) -> str:
+    return "".join(rng.choice(SYMBOLS) for _ in range(rng.randint(*length)))
+
+
+def generate(n_medications: int, n_patients: Optional[int] = None,
+             pattern_length: Tuple[int, int] = (1, 4), seed: int = 0) -> Tuple[List[dict], List[dict]]:
+    """Patients and medications shaped like the records the API stores.
+
+    About one patient per ten medications unless ``n_patients`` is given.
+    Medications run from some weeks ago to some months ahead, a third
+    have alarms, and one in ten is inactive.
+    """
+    rng = random.Random(seed)
+    n_patients = n_patients or max(1, n_medications // 10)
+    today = date.today()
+    stamp = datetime.now().isoformat()
+
+    patients = [{
+        "id": i,
+        "name": f"Patient {i}",
+        "phone": f"+1{i:010d}",
+        "gender": rng.choice(["Male", "Female", "Other"]),
+        "email": f"patient{i}@example.com",
+        "dob": date(1940 + rng.randrange(70), rng.randint(1, 12), rng.randint(1, 28)),
+        "emergency_contact": None,
+        "blood_group": rng.choice(["A+", "A-", "B+", "B-", "O+", "O-", "AB+", "AB-"]),
+        "weight": round(rng.uniform(45, 120), 1),
+        "medical_history": None,
+        "allergies": None,
+        "created_at": stamp,
+    } for i in range(1, n_patients + 1)]
+
+    medications = []
+    for i in range(1, n_medications + 1):
+        alarm = rng.random() < 1 / 3
+        start = today - timedelta(days=rng.randrange(60))
+        medications.append({
+            "id": i,
+            "name": rng.choice(DRUGS),
+            "patient": f"Patient {rng.randint(1, n_patients)}",
+            "dosage": rng.choice(DOSAGES),
+            "pattern": random_pattern(rng, pattern_length),
+            "frequency": rng.choice(FREQUENCIES),
+            "instructions": None,
+            "start_date": start,
+            "end_date": start + timedelta(days=rng.randint(30, 365)),
+            "alarm_enabled": alarm,
+            "alarm_time": f"{rng.randrange(24):02d}:{rng.randrange(60):02d}" if alarm else None,
+            "active": rng.random() >= 0.1,
+            "created_at": stamp,
+            "last_updated": stamp,
+        })
+    return patients, medications
+
+
+def build_store(backend: str, patients: List[dict], medications: List[dict], path: Optional[str] = None):
+    """A repository holding the generated data ("memory" or "sqlite" at ``path``)"""
+    if backend == "memory":
+        return InMemoryRepository(patients, medications)
+    store = SQLiteRepository(path)
+    store.add_patients(patients)
+    store.add_medications(medications)
+    return store
+
+
+# =====================
+# RESULTS
+# =====================
+def summarize(latencies: Sequence[float], elapsed: Optional[float] = None) -> Dict[str, float]:
+    """Request count, mean and p50/p95/p99 in milliseconds (plus req/s given wall time)"""
+    ms = sorted(value * 1000 for value in latencies)
+    if len(ms) > 1:
+        cuts = statistics.quantiles(ms, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = ms[0] if ms else 0.0
+    summary = {
+        "requests": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3) if ms else 0.0,
+        "p50_ms": round(p50, 3),
+        "p95_ms": round(p95, 3),
+        "p99_ms": round(p99, 3),
+        "max_ms": round(ms[-1], 3) if ms else 0.0,
+    }
+    if elapsed:
+        summary["throughput_rps"] = round(len(ms) / elapsed, 1)
+    return summary
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(RESULTS_DIR)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(name: str, settings: dict, results: List[dict], path: Optional[str] = None) -> str:
+    """Write a run to ``path`` (default benchmarks/results/<name>-<time>.json)"""
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{name}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    run = {
+        "benchmark": name,
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": settings,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+    return path
+
+
+def print_table(results: List[dict], extra: Sequence[str] = ()):
+    columns = ("p50_ms", "p95_ms", "p99_ms", *extra)
+    print(f"{'rows':>9}  {'endpoint':<30}" + "".join(f"{c:>16}" for c in columns))
+    for row in results:
+        print(f"{row['rows']:>9}  {row['endpoint']:<30}" + "".join(f"{row.get(c, 0):>16}" for c in columns))
+
+
+def compare(baseline_path: str, results: List[dict]):
+    """Print each p50/p99 next to the same (rows, endpoint) in an earlier run"""
+    with open(baseline_path) as f:
+        baseline = {(r["rows"], r["endpoint"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {baseline_path}")
+    print(f"{'rows':>9}  {'endpoint':<30}{'p50 before':>12}{'p50 now':>12}{'p99 before':>12}{'p99 now':>12}")
+    for row in results:
+        before = baseline.get((row["rows"], row["endpoint"]))
+        if before is None:
+            continue
+        print(f"{row['rows']:>9}  {row['endpoint']:<30}{before['p50_ms']:>12}{row['p50_ms']:>12}"
+              f"{before['p99_ms']:>12}{row['p99_ms']:>12}")
@@ -0,0 +1,357 @@
+# bulk_io.py - STREAMING NDJSON EXPORT AND IMPORT
+import json
+import re
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from automata import PATTERN_HELP, validate_many
+from models import Patient, Medication
+from records import Record
+from repository import DuplicateIdError
+
+# Records fetched from the repository per export page
+EXPORT_PAGE_SIZE = 1000
+
+# Lines validated and committed together during an import
+IMPORT_CHUNK_SIZE = 5000
+
+# Per-line errors included in an import report; later ones are only counted
+MAX_REPORTED_ERRORS = 1000
+
+# Largest batch accepted by the bulk create endpoints
+MAX_BULK_ITEMS = 10000
+
+# Largest bulk create body, a generous 4 KiB per record
+MAX_BULK_BYTES = MAX_BULK_ITEMS * 4096
+
+PATIENT_LIST = TypeAdapter(List[Patient])
+MEDICATION_LIST = TypeAdapter(List[Medication])
+
+# screen(records) -> warnings for each medication of a batch about to be
+# stored; a pair interacting within the batch is reported once
+Screen = Callable[[List[dict]], List[List[dict]]]
+
+SCREENING_REJECTED = "Screening found {} warning(s); resend with override_warnings=true to add anyway"
+
+
+# =====================
+# EXPORT
+# =====================
+def export_ndjson(list_page: Callable[..., List[Record]]) -> Iterator[bytes]:
+    """Yield one JSON line per record, paging through the repository by id"""
+    after_id = None
+    while True:
+        page = list_page(after_id=after_id, limit=EXPORT_PAGE_SIZE)
+        if not page:
+            return
+        yield "".join(json.dumps(record.to_dict(), default=str) + "\n" for record in page).encode("utf-8")
+        if len(page) < EXPORT_PAGE_SIZE:
+            return
+        after_id = page[-1]["id"]
+
+
+# =====================
+# IMPORT
+# =====================
+class ImportReport:
+    def __init__(self):
+        self.lines = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self.warned = 0
+        self.warnings: List[dict] = []
+
+    def fail(self, line: int, error: str, record_id: Optional[int] = None):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "id": record_id, "error": error})
+
+    def warn(self, line: int, record_id: int, warnings: List[dict]):
+        self.warned += 1
+        if len(self.warnings) < MAX_REPORTED_ERRORS:
+            self.warnings.append({"line": line, "id": record_id, "warnings": warnings})
+
+    def as_dict(self) -> dict:
+        return {
+            "status": "completed",
+            "lines": self.lines,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda e: e["line"]),
+            "errors_truncated": self.failed > len(self.errors),
+            "warned": self.warned,
+            "warnings": sorted(self.warnings, key=lambda w: w["line"]),
+            "warnings_truncated": self.warned > len(self.warnings)
+        }
+
+
+def _describe_error(detail: dict, loc=None) -> str:
+    location = ".".join(str(part) for part in (detail["loc"] if loc is None else loc))
+    return f"{location}: {detail['msg']}" if location else detail["msg"]
+
+
+def _describe(error: ValidationError) -> str:
+    return _describe_error(error.errors()[0])
+
+
+def _assign_ids(items: list, reserve: Callable[[int], range]):
+    """Give records sent without an id fresh ids from the repository"""
+    missing = [item for item in items if item.id is None]
+    for item, new_id in zip(missing, reserve(len(missing)) if missing else ()):
+        item.id = new_id
+
+
+def _import_chunk(model, insert_many, insert_one, existing_ids: Callable[..., Set[int]],
+                  reserve: Callable[[int], range], lines: List[Tuple[int, bytes]],
+                  report: ImportReport, kind: str, screen: Optional[Screen] = None,
+                  override_warnings: bool = False):
+    parsed = []
+    for line_no, raw in lines:
+        try:
+            parsed.append((line_no, model.model_validate_json(raw)))
+        except ValidationError as e:
+            report.fail(line_no, _describe(e))
+
+    if model is Medication:
+        # One batched DFA pass for the whole chunk
+        flags = validate_many([item.pattern for _, item in parsed])
+        valid = []
+        for (line_no, item), ok in zip(parsed, flags):
+            if ok:
+                valid.append((line_no, item))
+            else:
+                report.fail(line_no, f"Invalid DFA pattern '{item.pattern}'. {PATTERN_HELP}", item.id)
+        parsed = valid
+
+    _assign_ids([item for _, item in parsed], reserve)
+    taken = existing_ids(item.id for _, item in parsed)
+    records = []
+    for line_no, item in parsed:
+        if item.id in taken:
+            report.fail(line_no, f"{kind} with id {item.id} already exists", item.id)
+            continue
+        taken.add(item.id)
+        records.append((line_no, item.to_record()))
+
+    # Screen before writing: lines with warnings fail unless overridden
+    warnings_by_line: Dict[int, List[dict]] = {}
+    if screen is not None and records:
+        accepted = []
+        for (line_no, record), warnings in zip(records, screen([record for _, record in records])):
+            if warnings and not override_warnings:
+                report.fail(line_no, SCREENING_REJECTED.format(len(warnings)), record["id"])
+                report.warn(line_no, record["id"], warnings)
+                continue
+            if warnings:
+                warnings_by_line[line_no] = warnings
+            accepted.append((line_no, record))
+        records = accepted
+
+    if not records:
+        return
+    try:
+        insert_many([record for _, record in records])
+        report.imported += len(records)
+    except DuplicateIdError:
+        # An id was taken by a concurrent write since the check above;
+        # fall back to row-by-row inserts to report exactly which one.
+        inserted = []
+        for line_no, record in records:
+            try:
+                insert_one(record)
+                report.imported += 1
+                inserted.append((line_no, record))
+            except DuplicateIdError as e:
+                report.fail(line_no, str(e), record["id"])
+        records = inserted
+
+    for line_no, record in records:
+        if line_no in warnings_by_line:
+            report.warn(line_no, record["id"], warnings_by_line[line_no])
+
+
+async def import_ndjson(chunks: AsyncIterator[bytes], store, kind: str,
+                        screen: Optional[Screen] = None, override_warnings: bool = False) -> dict:
+    """Parse an NDJSON request body line by line, committing in chunks.
+
+    Only the current chunk of lines is held in memory; validation and the
+    repository write run on the threadpool so the event loop stays free.
+    Medications are passed to ``screen`` before they are written; a line
+    with warnings fails unless ``override_warnings`` is set, and every
+    warning is listed in the report.
+    """
+    if kind == "medication":
+        model, existing_ids, reserve = Medication, store.existing_medication_ids, store.reserve_medication_ids
+        insert_many, insert_one = store.add_medications, store.add_medication
+    else:
+        model, existing_ids, reserve = Patient, store.existing_patient_ids, store.reserve_patient_ids
+        insert_many, insert_one = store.add_patients, store.add_patient
+    label = kind.capitalize()
+
+    report = ImportReport()
+    buffer = b""
+    batch: List[Tuple[int, bytes]] = []
+
+    async def flush():
+        if batch:
+            await run_in_threadpool(_import_chunk, model, insert_many, insert_one, existing_ids, reserve,
+                                    list(batch), report, label, screen, override_warnings)
+            batch.clear()
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for raw in lines:
+            report.lines += 1
+            raw = raw.strip()
+            if raw:
+                batch.append((report.lines, raw))
+        if len(batch) >= IMPORT_CHUNK_SIZE:
+            await flush()
+
+    if buffer.strip():
+        report.lines += 1
+        batch.append((report.lines, buffer.strip()))
+    await flush()
+    return report.as_dict()
+
+
+# =====================
+# BULK CREATE (all or nothing)
+# =====================
+class BatchRejected(ValueError):
+    """A bulk create failed validation; nothing was written"""
+
+    def __init__(self, status_code: int, message: str, errors: List[dict]):
+        super().__init__(message)
+        self.status_code = status_code
+        self.errors = errors
+
+
+def _item_errors(error: ValidationError) -> List[dict]:
+    """First error per list index from a TypeAdapter(list[...]) failure"""
+    by_index: Dict[int, dict] = {}
+    for detail in error.errors():
+        loc = detail["loc"]
+        if not loc or not isinstance(loc[0], int):
+            raise BatchRejected(422, "Expected a JSON list of records",
+                                [{"index": None, "error": detail["msg"]}])
+        if loc[0] not in by_index:
+            by_index[loc[0]] = {"index": loc[0], "error": _describe_error(detail, loc[1:])}
+    return [by_index[i] for i in sorted(by_index)]
+
+
+# A JSON string (escapes included) or a structural character
+_JSON_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|[\[\]{},]')
+
+
+def _too_many_items(body: bytes, limit: int) -> bool:
+    """Whether a JSON list holds more than ``limit`` items, without parsing it.
+
+    Every record is an object, so a body with at most ``limit`` opening
+    braces is accepted at once; otherwise top-level commas are counted,
+    skipping strings, until the limit is passed.
+    """
+    if body.count(b"{") <= limit:
+        return False
+    depth = commas = 0
+    for match in _JSON_TOKEN.finditer(body):
+        token = match.group()
+        if token in (b"[", b"{"):
+            depth += 1
+        elif token in (b"]", b"}"):
+            depth -= 1
+        elif token == b"," and depth == 1:
+            commas += 1
+            if commas >= limit:
+                return True
+    return False
+
+
+async def read_batch(content_length: Optional[str], chunks: AsyncIterator[bytes]) -> bytes:
+    """A bulk create body, rejected as soon as it is known to be too large"""
+    if content_length is not None and content_length.isdigit() and int(content_length) > MAX_BULK_BYTES:
+        raise BatchRejected(413, f"At most {MAX_BULK_BYTES} bytes per batch", [])
+    body = bytearray()
+    async for chunk in chunks:
+        body += chunk
+        if len(body) > MAX_BULK_BYTES:
+            raise BatchRejected(413, f"At most {MAX_BULK_BYTES} bytes per batch", [])
+    return bytes(body)
+
+
+def create_batch(body: bytes, store, kind: str, screen: Optional[Screen] = None,
+                 override_warnings: bool = False) -> dict:
+    """Validate and insert a JSON list of records in one transaction.
+
+    Oversized batches are rejected before anything is parsed. The whole
+    list is then validated by one TypeAdapter call, ids are checked
+    against the store in a single lookup and medication patterns go
+    through one batched DFA pass. Any failure rejects the entire batch.
+    Medications are then passed to ``screen``: any warning rejects the
+    batch unless ``override_warnings`` is set, in which case the warnings
+    are attached to their items.
+    """
+    if kind == "medication":
+        adapter, existing_ids, insert_many = MEDICATION_LIST, store.existing_medication_ids, store.add_medications
+        reserve = store.reserve_medication_ids
+    else:
+        adapter, existing_ids, insert_many = PATIENT_LIST, store.existing_patient_ids, store.add_patients
+        reserve = store.reserve_patient_ids
+    label = kind.capitalize()
+
+    if _too_many_items(body, MAX_BULK_ITEMS):
+        raise BatchRejected(413, f"At most {MAX_BULK_ITEMS} records per batch", [])
+    try:
+        items = adapter.validate_json(body or b"[]")
+    except ValidationError as e:
+        raise BatchRejected(422, f"{label} batch failed validation", _item_errors(e))
+
+    errors = []
+    if kind == "medication":
+        for index, (item, ok) in enumerate(zip(items, validate_many([m.pattern for m in items]))):
+            if not ok:
+                errors.append({"index": index, "id": item.id,
+                               "error": f"Invalid DFA pattern '{item.pattern}'. {PATTERN_HELP}"})
+    if errors:
+        raise BatchRejected(400, f"{label} batch contains invalid patterns", errors)
+
+    _assign_ids(items, reserve)
+    taken = existing_ids(item.id for item in items)
+    seen = set()
+    for index, item in enumerate(items):
+        if item.id in taken or item.id in seen:
+            errors.append({"index": index, "id": item.id, "error": f"{label} with id {item.id} already exists"})
+        seen.add(item.id)
+    if errors:
+        raise BatchRejected(409, f"{label} batch contains duplicate ids", errors)
+
+    records = [item.to_record() for item in items]
+    screened = [[] for _ in records]
+    if screen is not None and kind == "medication":
+        screened = screen(records)
+        flagged = [{"index": index, "id": record["id"], "warnings": warnings}
+                   for index, (record, warnings) in enumerate(zip(records, screened)) if warnings]
+        if flagged and not override_warnings:
+            raise BatchRejected(409, SCREENING_REJECTED.format(sum(len(f["warnings"]) for f in flagged)), flagged)
+
+    try:
+        insert_many(records)
+    except DuplicateIdError as e:
+        raise BatchRejected(409, str(e), [])
+
+    results = [{"index": index, "id": item.id, "status": "created"} for index, item in enumerate(items)]
+    warned = 0
+    for result, warnings in zip(results, screened):
+        if warnings:
+            result["warnings"] = warnings
+            warned += 1
+    return {
+        "status": "success",
+        "created": len(items),
+        "warned": warned,
+        "items": results
+    }
@@ -0,0 +1,184 @@
+# dose_log.py - APPEND-ONLY DOSE EVENT LOG
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+# Events remembered per medication for "recent doses" reads
+RECENT_DOSES = 20
+
+# On-disk record: medication id, event time (epoch microseconds), kind
+RECORD = struct.Struct("<qqB")
+
+EVENT_TAKEN = 1
+EVENT_KINDS = {EVENT_TAKEN: "taken"}
+
+
+def _micros(moment: datetime) -> int:
+    return int(moment.timestamp() * 1_000_000)
+
+
+def _event(event_id: int, med_id: int, at: int, kind: int) -> dict:
+    return {
+        "event_id": event_id,
+        "medication_id": med_id,
+        "event": EVENT_KINDS.get(kind, "unknown"),
+        "at": datetime.fromtimestamp(at / 1_000_000).isoformat()
+    }
+
+
+class DoseLog:
+    """Every dose event, kept in typed arrays instead of dicts.
+
+    Events are three parallel ``array`` columns (17 bytes per event) in
+    the order they were recorded, so an event's id is its position and
+    never changes. Time order is kept separately as arrays of event ids
+    sorted by (time, id): one for the whole log and one per medication.
+    A late event keeps its real time and is bisect-inserted into those
+    indexes, time ranges are found by bisection and pages continue from
+    an ``after_id`` cursor. Each medication also gets a fixed-size ring
+    buffer of its latest event times for cheap "recent doses" reads.
+    With a path, events are also appended to a binary file of packed
+    records and reloaded on start.
+    """
+
+    def __init__(self, path: Optional[str] = None, recent: int = RECENT_DOSES):
+        self._lock = threading.Lock()
+        self._times = array("q")
+        self._med_ids = array("q")
+        self._kinds = array("B")
+        self._order = array("q")               # event ids by (time, id)
+        self._by_med: Dict[int, array] = {}    # med id -> its event ids by (time, id)
+        self._recent = recent
+        self._rings: Dict[int, array] = {}   # med id -> [count, t0, t1, ...]
+        self._file: Optional[BinaryIO] = None
+        if path is not None:
+            if os.path.exists(path):
+                self._load(path)
+            self._file = open(path, "ab")
+
+    def _load(self, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % RECORD.size   # ignore a torn final record
+        for med_id, at, kind in RECORD.iter_unpack(data[:usable]):
+            self._append(med_id, at, kind)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # =====================
+    # WRITES
+    # =====================
+    def _append(self, med_id: int, at: int, kind: int) -> int:
+        event_id = len(self._times)
+        self._times.append(at)
+        self._med_ids.append(med_id)
+        self._kinds.append(kind)
+        _index(self._order, self._times, event_id)
+        by_med = self._by_med.get(med_id)
+        if by_med is None:
+            by_med = self._by_med[med_id] = array("q")
+        _index(by_med, self._times, event_id)
+
+        ring = self._rings.get(med_id)
+        if ring is None:
+            ring = self._rings[med_id] = array("q", bytes(8 * (self._recent + 1)))
+        ring[1 + ring[0] % self._recent] = at
+        ring[0] += 1
+        return event_id
+
+    def record(self, med_id: int, moment: datetime, kind: int = EVENT_TAKEN) -> int:
+        at = _micros(moment)
+        with self._lock:
+            event_id = self._append(med_id, at, kind)
+            if self._file is not None:
+                self._file.write(RECORD.pack(med_id, at, kind))
+                self._file.flush()
+        return event_id
+
+    def on_change(self, kind: str, old: Optional[dict], new: Optional[dict]):
+        """Repository listener: log every increase of taken_count"""
+        if kind != "medication" or old is None or new is None:
+            return
+        if new.get("taken_count", 0) > old.get("taken_count", 0) and new.get("last_taken"):
+            try:
+                moment = datetime.fromisoformat(str(new["last_taken"]))
+            except ValueError:
+                moment = datetime.now()
+            self.record(new["id"], moment)
+
+    # =====================
+    # READS
+    # =====================
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def recent(self, med_id: int) -> List[dict]:
+        """The medication's latest events, newest first"""
+        with self._lock:
+            ring = self._rings.get(med_id)
+            if ring is None:
+                return []
+            count = ring[0]
+            times = [ring[1 + (count - 1 - i) % self._recent] for i in range(min(count, self._recent))]
+        times.sort(reverse=True)   # a late event may have been recorded after a newer one
+        return [
+            {"medication_id": med_id, "event": EVENT_KINDS[EVENT_TAKEN],
+             "at": datetime.fromtimestamp(at / 1_000_000).isoformat()}
+            for at in times
+        ]
+
+    def count_on(self, med_id: int, day: date) -> int:
+        """How many events the medication has on ``day``"""
+        midnight = datetime.combine(day, time())
+        with self._lock:
+            order = self._by_med.get(med_id)
+            if order is None:
+                return 0
+            at_of = self._times.__getitem__
+            return (bisect_left(order, _micros(midnight + timedelta(days=1)), key=at_of)
+                    - bisect_left(order, _micros(midnight), key=at_of))
+
+    def between(self, start: datetime, end: datetime) -> List[Tuple[int, int]]:
+        """(medication id, epoch microseconds) of every event in [start, end), in time order"""
+        with self._lock:
+            times, order = self._times, self._order
+            first = bisect_left(order, _micros(start), key=times.__getitem__)
+            stop = bisect_left(order, _micros(end), key=times.__getitem__)
+            return [(self._med_ids[event_id], times[event_id]) for event_id in order[first:stop]]
+
+    def history(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                med_id: Optional[int] = None, after_id: Optional[int] = None,
+                limit: int = 100) -> List[dict]:
+        """Events in [start, end) in time order, continuing after ``after_id``"""
+        with self._lock:
+            times = self._times
+            order = self._order if med_id is None else self._by_med.get(med_id)
+            if order is None:
+                return []
+            at_of = times.__getitem__
+            first = 0 if start is None else bisect_left(order, _micros(start), key=at_of)
+            stop = len(order) if end is None else bisect_left(order, _micros(end), key=at_of)
+            if after_id is not None and after_id >= 0:
+                # Resume after the cursor's (time, id) position in this index
+                cursor = (times[after_id], after_id) if 0 <= after_id < len(times) else (float("inf"), after_id)
+                first = max(first, bisect_right(order, cursor, key=lambda e: (times[e], e)))
+            page = [(event_id, self._med_ids[event_id], times[event_id], self._kinds[event_id])
+                    for event_id in order[first:min(stop, first + limit)]]
+        return [_event(*row) for row in page]
+
+
+def _index(order: array, times: array, event_id: int):
+    """Insert ``event_id`` into ``order``, kept sorted by (time, id)"""
+    at = times[event_id]
+    if not order or times[order[-1]] <= at:
+        order.append(event_id)
+    else:
+        # Ids only grow, so the newest event goes after every equal time
+        order.insert(bisect_right(order, at, key=times.__getitem__), event_id)
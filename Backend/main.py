@@ -1,14 +1,96 @@
 # main.py - ENHANCED BACKEND
-from fastapi import FastAPI, HTTPException
+import json
+import os
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, time
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+from time import perf_counter
 from models import Patient, Medication
-from storage import patients, medications
-from automata import validate_pattern, pattern_meaning
+import storage
+from records import to_json
+from repository import DuplicateIdError, NotFoundError
+from automata import PATTERN_HELP, SYMBOL_MEANINGS, analyze, validate_many, validate_pattern
+from schedule import SCHEDULE_SLOTS, ScheduleRange, TodaySchedule, templates
+from alarms import AlarmScheduler
+from notification_stream import AlarmBroadcaster
+from starlette.concurrency import run_in_threadpool
+from bulk_io import BatchRejected, create_batch, export_ndjson, import_ndjson, read_batch
+from stats import SystemCounters, verify as verify_counters
+from analytics import HISTORY_DAYS, DoseTable
+from dose_log import DoseLog
+from metrics import DisabledMetrics, Metrics, MetricsMiddleware
+from responses import FastJSONResponse, ResourceVersions, ResponseCache
+from search import MAX_SEARCH_RESULTS, PatientSearch
+from screening import InteractionTable, Screening
+
+# Medication preview shown when a medication is added
+SCHEDULE_PREVIEW = {
+    symbol: {"time": " & ".join(slot[0] for slot in slots), "type": SYMBOL_MEANINGS[symbol], "char": symbol}
+    for symbol, slots in SCHEDULE_SLOTS.items() if slots
+}
+
+# Debug/test mode: expose a consistency check for the running counters
+DEBUG_STATS = os.environ.get("MEDICATION_DEBUG_STATS", "0") == "1"
+
+# Request/phase metrics and GET /metrics (MEDICATION_METRICS=0 turns them off)
+METRICS_ENABLED = os.environ.get("MEDICATION_METRICS", "1") == "1"
+metrics = Metrics() if METRICS_ENABLED else DisabledMetrics()
+
+# Longest window /api/schedule will expand in one request
+MAX_SCHEDULE_DAYS = 366
+
+# Schedule entries serialized per streamed chunk
+SCHEDULE_CHUNK = 500
+
+# Largest page a listing endpoint will return
+MAX_PAGE_SIZE = 1000
+
+PATIENT_FIELDS = set(Patient.model_fields)
+MEDICATION_FIELDS = set(Medication.model_fields) | {"last_taken", "taken_count"}
+
+
+def bind_repository(store, dose_log_path: Optional[str] = None,
+                    interactions_path: str = storage.INTERACTIONS_PATH):
+    """Point the API and its derived views at a repository.
+
+    Derived views are built from the repository once and then follow its
+    writes instead of being recomputed per request.
+    """
+    global repo, counters, today_schedule, schedule_range, dose_table, dose_log
+    global alarm_scheduler, alarm_broadcaster, patient_search, screening, versions, response_cache
+    repo = store
+    dose_log = DoseLog(dose_log_path)
+    store.subscribe(dose_log.on_change)
+    counters = SystemCounters(store)
+    store.subscribe(counters.on_change, counters.on_batch)
+    today_schedule = TodaySchedule(store.active_medications, dose_log.count_on)
+    store.subscribe(today_schedule.on_change, today_schedule.on_batch)
+    schedule_range = ScheduleRange(store.active_medications, dose_log.count_on)
+    store.subscribe(schedule_range.on_change, schedule_range.on_batch)
+    dose_table = DoseTable(store.active_medications, logged=dose_log.between)
+    store.subscribe(dose_table.on_change, dose_table.on_batch)
+    alarm_scheduler = AlarmScheduler(store.alarm_medications)
+    store.subscribe(alarm_scheduler.on_change)
+    alarm_broadcaster = AlarmBroadcaster(alarm_scheduler)
+    store.subscribe(alarm_broadcaster.wake, alarm_broadcaster.wake)
+    patient_search = PatientSearch(store.list_patients())
+    store.subscribe(patient_search.on_change, patient_search.on_batch)
+    screening = Screening(InteractionTable.load(interactions_path), store.list_patients(), store.active_medications())
+    store.subscribe(screening.on_change, screening.on_batch)
+    # Subscribed last: a new version is only visible once every view has the change
+    versions = ResourceVersions()
+    store.subscribe(versions.on_change, versions.on_batch)
+    response_cache = ResponseCache()
+
+
+bind_repository(storage.repo, storage.DOSE_LOG_PATH)
 
 app = FastAPI(
     title="Smart Medication System API",
-    version="2.0"
+    version="2.0",
+    default_response_class=FastJSONResponse
 )
 
 # CORS Middleware
@@ -17,8 +99,12 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-After-Id", "ETag"],
 )
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 # =====================
 # ROOT ENDPOINT
 # =====================
@@ -34,23 +120,62 @@ def home():
 # =====================
 # DFA PATTERN VALIDATION
 # =====================
-@app.get("/validate-pattern/{pattern}")
-def validate(pattern: str):
-    """Enhanced DFA Pattern Validation"""
-    if validate_pattern(pattern):
-        meaning = pattern_meaning(pattern)
+def _validation_result(pattern: str, analysis) -> dict:
+    if analysis is not None and analysis.valid:
         return {
             "pattern": pattern,
             "valid": True,
-            "meaning": meaning,
-            "schedule_count": len(meaning),
-            "has_skip": "X" in pattern.upper(),
+            "meaning": list(analysis.meaning),
+            "schedule_count": len(analysis.meaning),
+            "has_skip": analysis.counts["X"] > 0,
+            "cycle_days": len(analysis.days),
             "message": f"Pattern '{pattern}' is valid"
         }
     return {
         "pattern": pattern,
         "valid": False,
-        "message": f"Pattern '{pattern}' is invalid. Use only M (Morning), E (Evening), T (Twice Daily), X (Skip)"
+        "message": f"Pattern '{pattern}' is invalid. {PATTERN_HELP}"
+    }
+
+@app.get("/validate-pattern/{pattern}")
+def validate(pattern: str):
+    """Enhanced DFA Pattern Validation"""
+    with metrics.phase("dfa_validation"):
+        analysis = analyze(pattern)
+    return _validation_result(pattern, analysis)
+
+@app.post("/validate-patterns")
+async def validate_many_patterns(request: Request):
+    """Validate a batch of patterns in one request.
+
+    Accepts a JSON list, a JSON object with a "patterns" list, or a
+    plain-text body with one pattern per line.
+    """
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            data = json.loads(body or b"[]")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+        patterns = data.get("patterns") if isinstance(data, dict) else data
+        if not isinstance(patterns, list) or not all(isinstance(p, str) for p in patterns):
+            raise HTTPException(status_code=422, detail="Expected a list of pattern strings")
+    else:
+        patterns = [line.strip() for line in body.decode("utf-8", "replace").splitlines() if line.strip()]
+
+    start = perf_counter()
+    with metrics.phase("dfa_validation"):
+        flags = validate_many(patterns)
+        analyses = [analyze(p) if ok else None for p, ok in zip(patterns, flags)]
+    results = [_validation_result(p, a) for p, a in zip(patterns, analyses)]
+    valid_count = sum(flags)
+
+    return {
+        "count": len(results),
+        "valid_count": valid_count,
+        "invalid_count": len(results) - valid_count,
+        "results": results,
+        "elapsed_ms": round((perf_counter() - start) * 1000, 3)
     }
 
 # =====================
@@ -58,234 +183,417 @@ def validate(pattern: str):
 # =====================
 @app.post("/patients")
 def add_patient(patient: Patient):
-    patients.append(patient.dict())
+    """Add a patient; without an id the next free one is assigned"""
+    record = patient.to_record()
+    if record["id"] is None:
+        record["id"] = repo.reserve_patient_ids()[0]
+    try:
+        repo.add_patient(record)
+    except DuplicateIdError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     return {
         "status": "success",
         "message": f"Patient '{patient.name}' added",
-        "patient_id": patient.id,
+        "patient_id": record["id"],
         "timestamp": datetime.now().isoformat()
     }
 
+async def _create_batch(request: Request, kind: str, override_warnings: bool = False) -> dict:
+    try:
+        body = await read_batch(request.headers.get("content-length"), request.stream())
+        return await run_in_threadpool(create_batch, body, repo, kind, screening.check_many, override_warnings)
+    except BatchRejected as e:
+        raise HTTPException(status_code=e.status_code, detail={"message": str(e), "errors": e.errors})
+
+@app.post("/patients/bulk")
+async def add_patients_bulk(request: Request):
+    """Add a JSON list of patients atomically: all are created or none"""
+    return await _create_batch(request, "patient")
+
+def _page(records: List[dict], limit: Optional[int],
+          fields: Optional[str], allowed: set) -> Tuple[List[dict], Dict[str, str]]:
+    """Apply the fields= projection and work out the next-page cursor header"""
+    headers = {}
+    if limit is not None and len(records) == limit:
+        headers["X-Next-After-Id"] = str(records[-1]["id"])
+    if not fields:
+        return to_json(records), headers
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return [{name: record.get(name) for name in names} for record in records], headers
+
 @app.get("/patients")
-def get_patients():
-    return patients
+def get_patients(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after_id: Optional[int] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,name")
+):
+    """List patients in id order; pass X-Next-After-Id back as after_id for the next page"""
+    return response_cache.respond(
+        request, ("patients", limit, after_id, fields), versions["patient"],
+        lambda: _page(repo.list_patients(after_id=after_id, limit=limit), limit, fields, PATIENT_FIELDS)
+    )
+
+@app.get("/patients/search")
+def search_patients(
+    name: Optional[str] = Query(None, description="Name prefix; any word of the name can start the match"),
+    phone: Optional[str] = Query(None, description="Exact phone number, punctuation ignored"),
+    email: Optional[str] = Query(None, description="Exact email, case-insensitive"),
+    allergy: Optional[str] = Query(None, description="Words that must all appear in allergies"),
+    history: Optional[str] = Query(None, description="Words that must all appear in medical_history"),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,name")
+):
+    """Find patients through the search indexes; results are in name order when searching by name"""
+    if all(value is None or not value.strip() for value in (name, phone, email, allergy, history)):
+        raise HTTPException(status_code=400, detail="Give at least one of name, phone, email, allergy or history")
+    with metrics.phase("patient_search"):
+        ids = patient_search.search(name=name, phone=phone, email=email, allergy=allergy,
+                                    history=history, limit=limit)
+        records = [p for p in map(repo.get_patient, ids) if p is not None]
+    return _page(records, None, fields, PATIENT_FIELDS)[0]
 
 @app.get("/patients/{patient_id}")
 def get_patient(patient_id: int):
-    for patient in patients:
-        if patient["id"] == patient_id:
-            return patient
-    raise HTTPException(status_code=404, detail="Patient not found")
+    patient = repo.get_patient(patient_id)
+    if patient is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return to_json(patient)
 
 # =====================
 # MEDICATION MANAGEMENT
 # =====================
 @app.post("/medications")
-def add_medication(med: Medication):
-    """Add medication with DFA pattern validation"""
-    if not validate_pattern(med.pattern):
+def add_medication(med: Medication, override_warnings: bool = False):
+    """Add medication with DFA pattern validation and allergy/interaction screening.
+
+    A medication with screening warnings is rejected with 409 (listing
+    them) unless ``override_warnings`` is set; it is then stored and the
+    warnings are returned with it.
+    """
+    # Run the DFA first so only accepted patterns reach the template cache
+    with metrics.phase("dfa_validation"):
+        valid = validate_pattern(med.pattern)
+    if not valid:
         raise HTTPException(
             status_code=400,
-            detail=f"Invalid DFA pattern '{med.pattern}'. Only M, E, T, X allowed."
+            detail=f"Invalid DFA pattern '{med.pattern}'. {PATTERN_HELP}"
         )
+    template = templates.get(med.pattern)
     
-    # Add created timestamp
-    med_dict = med.dict()
-    med_dict["created_at"] = datetime.now().isoformat()
-    med_dict["last_updated"] = datetime.now().isoformat()
+    # Add created timestamp (and the next free id when none was given)
+    med_dict = med.to_record()
+    if med_dict["id"] is None:
+        med_dict["id"] = repo.reserve_medication_ids()[0]
     
-    medications.append(med_dict)
+    # Screen against the patient's allergies and other active medications
+    with metrics.phase("screening"):
+        warnings = screening.check(med_dict)
+    if warnings and not override_warnings:
+        raise HTTPException(status_code=409, detail={
+            "message": f"Screening found {len(warnings)} warning(s); resend with override_warnings=true to add anyway",
+            "warnings": warnings
+        })
+    
+    try:
+        repo.add_medication(med_dict)
+    except DuplicateIdError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
     # Generate schedule for the medication
-    schedule_items = []
-    for char in med.pattern.upper():
-        if char == "M":
-            schedule_items.append({
-                "time": "08:00 AM",
-                "type": "Morning",
-                "char": "M"
-            })
-        elif char == "E":
-            schedule_items.append({
-                "time": "08:00 PM",
-                "type": "Evening",
-                "char": "E"
-            })
-        elif char == "T":
-            schedule_items.append({
-                "time": "08:00 AM & 08:00 PM",
-                "type": "Twice Daily",
-                "char": "T"
-            })
+    schedule_items = [SCHEDULE_PREVIEW[char] for char in template.symbols if char in SCHEDULE_PREVIEW]
     
     return {
         "status": "success",
         "message": f"Medication '{med.name}' added",
         "medication": med_dict,
         "schedule": schedule_items,
+        "warnings": warnings,
         "pattern_analysis": {
             "length": len(med.pattern),
-            "morning_count": med.pattern.upper().count("M"),
-            "evening_count": med.pattern.upper().count("E"),
-            "twice_count": med.pattern.upper().count("T"),
-            "skip_count": med.pattern.upper().count("X")
+            "morning_count": template.counts["M"],
+            "noon_count": template.counts["N"],
+            "afternoon_count": template.counts["A"],
+            "evening_count": template.counts["E"],
+            "bedtime_count": template.counts["B"],
+            "twice_count": template.counts["T"],
+            "skip_count": template.counts["X"],
+            "cycle_days": len(template.doses)
         }
     }
 
+@app.post("/medications/bulk")
+async def add_medications_bulk(request: Request, override_warnings: bool = False):
+    """Add a JSON list of medications atomically with one batched DFA check.
+
+    Screening warnings reject the whole batch (409) unless override_warnings is set.
+    """
+    return await _create_batch(request, "medication", override_warnings)
+
 @app.get("/medications")
-def get_medications():
-    return medications
+def get_medications(
+    request: Request,
+    patient: Optional[str] = None,
+    active: Optional[bool] = None,
+    alarm_enabled: Optional[bool] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after_id: Optional[int] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,name,patient")
+):
+    """List medications in id order with optional filters and projection"""
+    def build():
+        records = repo.list_medications(patient=patient, active=active, alarm_enabled=alarm_enabled,
+                                        after_id=after_id, limit=limit)
+        return _page(records, limit, fields, MEDICATION_FIELDS)
+
+    key = ("medications", patient, active, alarm_enabled, limit, after_id, fields)
+    return response_cache.respond(request, key, versions["medication"], build)
 
 @app.get("/medications/active")
-def get_active_medications():
-    return [m for m in medications if m.get("active", True)]
+def get_active_medications(request: Request):
+    return response_cache.respond(request, "medications/active", versions["medication"],
+                                  lambda: (to_json(repo.active_medications()), {}))
+
+@app.delete("/medications/{med_id}")
+def delete_medication(med_id: int):
+    try:
+        med = repo.delete_medication(med_id)
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Medication not found")
+    return {
+        "status": "success",
+        "message": f"Medication '{med['name']}' deleted",
+        "medication_id": med_id
+    }
+
+@app.post("/api/medications/{med_id}/deactivate")
+def deactivate_medication(med_id: int):
+    """Stop a medication; it drops out of the schedule and active lists"""
+    try:
+        med = repo.update_medication(med_id, active=False, last_updated=datetime.now().isoformat())
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Medication not found")
+    return {
+        "status": "success",
+        "message": f"Medication '{med['name']}' deactivated",
+        "medication_id": med_id
+    }
+
+# =====================
+# BULK EXPORT / IMPORT (NDJSON)
+# =====================
+@app.get("/api/export/patients")
+def export_patients():
+    """Stream every patient as one JSON object per line"""
+    return StreamingResponse(export_ndjson(repo.list_patients), media_type="application/x-ndjson")
+
+@app.get("/api/export/medications")
+def export_medications():
+    """Stream every medication as one JSON object per line"""
+    return StreamingResponse(export_ndjson(repo.list_medications), media_type="application/x-ndjson")
+
+@app.post("/api/import/patients")
+async def import_patients(request: Request):
+    """Import NDJSON patients; returns a per-line error report"""
+    return await import_ndjson(request.stream(), repo, "patient")
+
+@app.post("/api/import/medications")
+async def import_medications(request: Request, override_warnings: bool = False):
+    """Import NDJSON medications (DFA-validated); returns a per-line error report.
+
+    Lines with screening warnings fail unless override_warnings is set.
+    """
+    return await import_ndjson(request.stream(), repo, "medication", screening.check_many, override_warnings)
 
 # =====================
 # ENHANCED SCHEDULE GENERATION
 # =====================
 @app.get("/api/schedule/today")
-def get_today_schedule():
-    """Generate today's schedule from DFA patterns"""
-    schedule = []
-    
-    for med in medications:
-        if not med.get("active", True):
-            continue
-            
-        pattern = med.get("pattern", "M")
-        med_name = med.get("name", "Unknown")
-        patient = med.get("patient", "Unknown")
-        dosage = med.get("dosage", "N/A")
-        
-        # Generate schedule based on DFA pattern
-        for char in pattern.upper():
-            if char == "M":
-                schedule.append({
-                    "time": "08:00 AM",
-                    "medication": med_name,
-                    "patient": patient,
-                    "dosage": dosage,
-                    "pattern_char": "M",
-                    "pattern_type": "Morning",
-                    "medication_id": med.get("id"),
-                    "status": "pending",
-                    "alarm_time": med.get("alarm_time", "08:00")
-                })
-            elif char == "E":
-                schedule.append({
-                    "time": "08:00 PM",
-                    "medication": med_name,
-                    "patient": patient,
-                    "dosage": dosage,
-                    "pattern_char": "E",
-                    "pattern_type": "Evening",
-                    "medication_id": med.get("id"),
-                    "status": "pending",
-                    "alarm_time": med.get("alarm_time", "20:00")
-                })
-            elif char == "T":
-                # Add both morning and evening for Twice Daily
-                schedule.append({
-                    "time": "08:00 AM",
-                    "medication": med_name,
-                    "patient": patient,
-                    "dosage": dosage,
-                    "pattern_char": "T",
-                    "pattern_type": "Twice Daily (AM)",
-                    "medication_id": med.get("id"),
-                    "status": "pending",
-                    "alarm_time": med.get("alarm_time", "08:00")
-                })
-                schedule.append({
-                    "time": "08:00 PM",
-                    "medication": med_name,
-                    "patient": patient,
-                    "dosage": dosage,
-                    "pattern_char": "T",
-                    "pattern_type": "Twice Daily (PM)",
-                    "medication_id": med.get("id"),
-                    "status": "pending",
-                    "alarm_time": med.get("alarm_time", "20:00")
-                })
-            # X means skip - no schedule item
-    
-    # Sort schedule by time
-    time_order = {"08:00 AM": 1, "12:00 PM": 2, "02:00 PM": 3, "08:00 PM": 4}
-    schedule.sort(key=lambda x: time_order.get(x["time"], 99))
-    
-    return schedule
+def get_today_schedule(request: Request):
+    """Today's schedule, materialized once and patched on every change"""
+    with metrics.phase("schedule_expansion"):
+        return response_cache.respond(request, "schedule/today", (versions["medication"], date.today()),
+                                      lambda: (today_schedule.entries(), {}))
+
+def _ndjson_chunks(entries):
+    batch = []
+    for entry in entries:
+        batch.append(json.dumps(entry))
+        if len(batch) >= SCHEDULE_CHUNK:
+            yield ("\n".join(batch) + "\n").encode("utf-8")
+            batch = []
+    if batch:
+        yield ("\n".join(batch) + "\n").encode("utf-8")
+
+@app.get("/api/schedule")
+def get_schedule_range(
+    from_date: Optional[date] = Query(None, alias="from", description="First day (YYYY-MM-DD), default today"),
+    to_date: Optional[date] = Query(None, alias="to", description="Last day (YYYY-MM-DD), default the first day")
+):
+    """Stream the schedule for a date window as NDJSON, one entry per line.
+
+    Medications only appear on days between their start_date and end_date.
+    """
+    first = from_date or date.today()
+    last = to_date or first
+    if last < first:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (last - first).days >= MAX_SCHEDULE_DAYS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SCHEDULE_DAYS} days per request")
+    entries = metrics.timed("schedule_expansion", schedule_range.entries(first, last))
+    return StreamingResponse(_ndjson_chunks(entries),
+                             media_type="application/x-ndjson")
 
 # =====================
 # NOTIFICATION ENDPOINTS
 # =====================
 @app.get("/api/notifications/check")
 def check_notifications():
-    """Check for pending notifications"""
-    current_time = datetime.now()
-    notifications = []
-    
-    for med in medications:
-        if med.get("alarm_enabled") and med.get("alarm_time"):
-            try:
-                alarm_time = datetime.strptime(med.get("alarm_time"), "%H:%M").time()
-                if (current_time.hour == alarm_time.hour and 
-                    current_time.minute == alarm_time.minute):
-                    notifications.append({
-                        "type": "medication_alarm",
-                        "medication": med.get("name"),
-                        "patient": med.get("patient"),
-                        "dosage": med.get("dosage"),
-                        "time": med.get("alarm_time"),
-                        "message": f"Time to take {med.get('name')} ({med.get('dosage')})"
-                    })
-            except:
-                pass
+    """Alarms that came due and have not been acknowledged yet"""
+    with metrics.phase("notification_scan"):
+        notifications = alarm_scheduler.poll()
     
     return {
         "has_notifications": len(notifications) > 0,
         "notifications": notifications,
         "count": len(notifications),
-        "timestamp": current_time.isoformat()
+        "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/api/notifications/stream")
+def stream_notifications():
+    """Server-Sent Events stream that pushes alarms as they come due"""
+    return StreamingResponse(
+        alarm_broadcaster.subscribe(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/notifications/{alarm_id}/ack")
+def acknowledge_notification(alarm_id: str):
+    """Dismiss a pending alarm (marking the medication taken also does this)"""
+    if not alarm_scheduler.acknowledge(alarm_id):
+        raise HTTPException(status_code=404, detail="Alarm not found")
+    return {"status": "success", "alarm_id": alarm_id}
+
+@app.get("/api/medications/{med_id}/doses")
+def get_recent_doses(med_id: int):
+    """The medication's most recent dose events, newest first"""
+    if repo.get_medication(med_id) is None:
+        raise HTTPException(status_code=404, detail="Medication not found")
+    return dose_log.recent(med_id)
+
+@app.get("/api/doses")
+def get_dose_history(
+    response: Response,
+    from_time: Optional[datetime] = Query(None, alias="from"),
+    to_time: Optional[datetime] = Query(None, alias="to"),
+    medication_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Dose events in [from, to) in time order; pass X-Next-After-Id back as after_id"""
+    events = dose_log.history(from_time, to_time, medication_id, after_id, limit)
+    if len(events) == limit:
+        response.headers["X-Next-After-Id"] = str(events[-1]["event_id"])
+    return events
+
 @app.post("/api/medications/{med_id}/mark-taken")
 def mark_medication_taken(med_id: int):
     """Mark medication as taken"""
-    for med in medications:
-        if med["id"] == med_id:
-            med["last_taken"] = datetime.now().isoformat()
-            med["taken_count"] = med.get("taken_count", 0) + 1
-            return {
-                "status": "success",
-                "message": f"Medication '{med['name']}' marked as taken",
-                "last_taken": med["last_taken"]
-            }
-    raise HTTPException(status_code=404, detail="Medication not found")
+    try:
+        med = repo.mark_taken(med_id, datetime.now().isoformat())
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Medication not found")
+    return {
+        "status": "success",
+        "message": f"Medication '{med['name']}' marked as taken",
+        "last_taken": med["last_taken"]
+    }
+
+# =====================
+# DASHBOARD
+# =====================
+@app.get("/api/dashboard")
+def get_dashboard(request: Request):
+    """Everything the dashboard and sidebar show, in one request.
+
+    Alarms are polled and the next dose is picked on every request; the
+    body is rebuilt only when those or the stored records have changed.
+    """
+    with metrics.phase("notification_scan"):
+        alarms = alarm_scheduler.poll()
+    with metrics.phase("schedule_expansion"):
+        next_dose = today_schedule.next_dose()
+    version = (versions["patient"], versions["medication"], date.today(),
+               next_dose and (next_dose["medication_id"], next_dose["time"]),
+               tuple(alarm["alarm_id"] for alarm in alarms))
+
+    def build():
+        with metrics.phase("schedule_expansion"):
+            slots = today_schedule.summary()
+        return {
+            **counters.snapshot(),
+            "next_dose": next_dose,
+            "today": {
+                "total": sum(slot["total"] for slot in slots),
+                "taken": sum(slot["taken"] for slot in slots),
+                "slots": [{k: slot[k] for k in ("time", "total", "taken", "pending")} for slot in slots]
+            },
+            "pending_alarms": alarms,
+            "pending_alarm_count": len(alarms),
+            "timestamp": datetime.now().isoformat()
+        }, {}
+
+    return response_cache.respond(request, "dashboard", version, build)
+
+# =====================
+# ADHERENCE ANALYTICS
+# =====================
+# Tables are returned in pandas "split" form: pd.DataFrame(**response.json())
+@app.get("/api/analytics/adherence")
+def get_adherence(
+    days: int = Query(30, ge=1, le=HISTORY_DAYS),
+    by: str = Query("patient", pattern="^(patient|medication)$")
+):
+    """Doses due vs taken over the last `days` days, per patient or medication"""
+    return dose_table.adherence(days, by)
+
+@app.get("/api/analytics/late-doses")
+def get_late_doses(days: int = Query(30, ge=1, le=HISTORY_DAYS)):
+    """Distribution of how late taken doses were"""
+    return dose_table.late_distribution(days)
+
+@app.get("/api/analytics/missed-streaks")
+def get_missed_streaks(days: int = Query(30, ge=1, le=HISTORY_DAYS)):
+    """Longest and current runs of consecutive missed doses per medication"""
+    return dose_table.missed_streaks(days)
 
 # =====================
 # SYSTEM STATISTICS
 # =====================
 @app.get("/api/stats")
 def get_system_stats():
-    """Get system statistics"""
-    total_patients = len(patients)
-    total_medications = len(medications)
-    active_medications = len([m for m in medications if m.get("active", True)])
-    
-    # Pattern statistics
-    pattern_stats = {}
-    for med in medications:
-        pattern = med.get("pattern", "")
-        for char in pattern.upper():
-            if char in pattern_stats:
-                pattern_stats[char] += 1
-            else:
-                pattern_stats[char] = 1
-    
+    """Get system statistics from the running counters"""
     return {
-        "total_patients": total_patients,
-        "total_medications": total_medications,
-        "active_medications": active_medications,
-        "pattern_statistics": pattern_stats,
+        **counters.snapshot(),
+        "pattern_cache": templates.stats(),
         "system_uptime": datetime.now().isoformat()
-    }
\ No newline at end of file
+    }
+
+@app.get("/api/stats/verify")
+def verify_system_stats():
+    """Recompute the stats from scratch and compare (MEDICATION_DEBUG_STATS=1 only)"""
+    if not DEBUG_STATS:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return verify_counters(counters, repo)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Request and phase metrics in Prometheus text format"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,248 @@
+# metrics.py - REQUEST METRICS AND PROMETHEUS EXPOSITION
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+# Histogram upper bounds (the implicit last bucket is +Inf)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# name -> (type, help, buckets)
+FAMILIES = {
+    "http_requests_total": ("counter", "Requests handled, by route and status", None),
+    "http_request_duration_seconds": ("histogram", "Request latency, by route", LATENCY_BUCKETS),
+    "http_request_size_bytes": ("histogram", "Request body size, by route", SIZE_BUCKETS),
+    "http_response_size_bytes": ("histogram", "Response body size, by route", SIZE_BUCKETS),
+    "http_requests_in_flight": ("gauge", "Requests currently being handled", None),
+    "medication_phase_duration_seconds": ("histogram", "Time spent in internal phases", LATENCY_BUCKETS),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """Counters and histograms sharded per thread.
+
+    Each thread (the event loop and every threadpool worker) writes only
+    its own shard, so recording takes no lock; a scrape adds the shards
+    up. A series is a list: ``[value]`` for counters and gauges, and
+    ``[count, sum, bucket...]`` for histograms.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, Labels], list]] = []
+        self._shards_lock = threading.Lock()   # only taken when a thread first records
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def add(self, name: str, labels: Labels, amount: float = 1):
+        shard = self._shard()
+        series = shard.get((name, labels))
+        if series is None:
+            series = shard[(name, labels)] = [0]
+        series[0] += amount
+
+    def observe(self, name: str, labels: Labels, value: float):
+        shard = self._shard()
+        series = shard.get((name, labels))
+        if series is None:
+            buckets = FAMILIES[name][2]
+            series = shard[(name, labels)] = [0, 0] + [0] * (len(buckets) + 1)
+        series[0] += 1
+        series[1] += value
+        series[2 + bisect_left(FAMILIES[name][2], value)] += 1
+
+    def phase(self, name: str) -> "PhaseTimer":
+        """``with metrics.phase("dfa_validation"): ...`` records the block's duration"""
+        return PhaseTimer(self, (("phase", name),))
+
+    def timed(self, name: str, items):
+        """Iterate ``items`` (e.g. a streamed generator), recording only the time spent producing them"""
+        labels = (("phase", name),)
+        iterator = iter(items)
+        spent = 0.0
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    spent += perf_counter() - start
+                    return
+                spent += perf_counter() - start
+                yield item
+        finally:
+            self.observe("medication_phase_duration_seconds", labels, spent)
+
+    # =====================
+    # EXPOSITION
+    # =====================
+    def collect(self) -> Dict[Tuple[str, Labels], list]:
+        """All series summed over the shards"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        totals: Dict[Tuple[str, Labels], list] = {}
+        for shard in shards:
+            for key, series in list(shard.items()):
+                total = totals.get(key)
+                if total is None:
+                    totals[key] = list(series)
+                else:
+                    for i, value in enumerate(series):
+                        total[i] += value
+        return totals
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        by_family: Dict[str, list] = {}
+        for (name, labels), series in self.collect().items():
+            by_family.setdefault(name, []).append((labels, series))
+
+        lines = []
+        for name, (kind, help_text, buckets) in FAMILIES.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "gauge" and name not in by_family:
+                lines.append(f"{name} 0")
+            for labels, series in sorted(by_family.get(name, ())):
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(labels)} {_number(series[0])}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ("+Inf",), series[2:]):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(series[1])}")
+                lines.append(f"{name}_count{_labels(labels)} {series[0]}")
+        return "\n".join(lines) + "\n"
+
+
+class PhaseTimer:
+    __slots__ = ("_metrics", "_labels", "_start")
+
+    def __init__(self, metrics: Metrics, labels: Labels):
+        self._metrics = metrics
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.observe("medication_phase_duration_seconds", self._labels, perf_counter() - self._start)
+        return False
+
+
+class DisabledMetrics(Metrics):
+    """Stand-in when metrics are turned off: every recording call does nothing"""
+
+    def add(self, name, labels, amount=1):
+        pass
+
+    def observe(self, name, labels, value):
+        pass
+
+    def phase(self, name):
+        return _NULL_TIMER
+
+    def timed(self, name, items):
+        return items
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels) + "}"
+
+
+# =====================
+# ASGI MIDDLEWARE
+# =====================
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route count, latency, in-flight and sizes.
+
+    Requests are labelled with the route template ("/patients/{patient_id}")
+    rather than the raw path, so ids do not create new series.
+    """
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+        self._templates: Dict[object, str] = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        template = self._templates.get(endpoint)
+        if template is None:
+            routes = getattr(scope.get("app"), "routes", ())
+            self._templates.update((r.endpoint, r.path) for r in routes if hasattr(r, "endpoint"))
+            template = self._templates.setdefault(endpoint, scope.get("path", "unmatched"))
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        method = scope["method"]
+        status = 500
+        response_bytes = 0
+        request_bytes = 0
+        for key, value in scope.get("headers", ()):
+            if key == b"content-length":
+                request_bytes = int(value) if value.isdigit() else 0
+                break
+
+        async def send_wrapper(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        start = perf_counter()
+        metrics.add("http_requests_in_flight", ())
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = perf_counter() - start
+            metrics.add("http_requests_in_flight", (), -1)
+            labels = (("method", method), ("route", self._route(scope)))
+            metrics.add("http_requests_total", labels + (("status", str(status)),))
+            metrics.observe("http_request_duration_seconds", labels, elapsed)
+            metrics.observe("http_request_size_bytes", labels, request_bytes)
+            metrics.observe("http_response_size_bytes", labels, response_bytes)
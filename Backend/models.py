@@ -1,10 +1,10 @@
 # models.py - ENHANCED MODELS
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import Optional
-from datetime import date, time
+from datetime import date, time, datetime
 
 class Patient(BaseModel):
-    id: int
+    id: Optional[int] = None      # assigned by the server when omitted
     name: str
     phone: str
     gender: str
@@ -17,8 +17,12 @@ class Patient(BaseModel):
     allergies: Optional[str] = None
     created_at: Optional[str] = None
 
+    def to_record(self) -> dict:
+        """Dict form kept by the repository"""
+        return self.model_dump()
+
 class Medication(BaseModel):
-    id: int
+    id: Optional[int] = None      # assigned by the server when omitted
     name: str
     patient: str
     dosage: str
@@ -31,4 +35,23 @@ class Medication(BaseModel):
     alarm_time: Optional[str] = None
     active: bool = True
     created_at: Optional[str] = None
-    last_updated: Optional[str] = None
\ No newline at end of file
+    last_updated: Optional[str] = None
+
+    @field_validator("alarm_time")
+    @classmethod
+    def check_alarm_time(cls, value: Optional[str]):
+        """Alarm times must be "HH:MM" so the scheduler can parse them"""
+        if value is not None:
+            try:
+                datetime.strptime(value, "%H:%M")
+            except ValueError:
+                raise ValueError("alarm_time must be in HH:MM format")
+        return value
+
+    def to_record(self) -> dict:
+        """Dict form kept by the repository, stamped with creation times"""
+        record = self.model_dump()
+        now = datetime.now().isoformat()
+        record["created_at"] = now
+        record["last_updated"] = now
+        return record
@@ -0,0 +1,102 @@
+# notification_stream.py - SERVER-SENT EVENTS FOR MEDICATION ALARMS
+import asyncio
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Set
+
+from alarms import AlarmScheduler
+
+# Comment line sent on otherwise silent streams so proxies keep them open
+HEARTBEAT_SECONDS = 60
+
+# Alarms queued per subscriber before a slow client starts losing events
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def format_event(alarm: dict) -> str:
+    return f"event: alarm\nid: {alarm['alarm_id']}\ndata: {json.dumps(alarm)}\n\n"
+
+
+class AlarmBroadcaster:
+    """Pushes alarms to every open stream as they come due.
+
+    A single timer task sleeps until the scheduler's next fire time (or
+    until a medication change wakes it), then polls once and fans the
+    newly due alarms out to subscriber queues. The task only exists while
+    someone is subscribed, and subscribers just wait on their queue, so
+    idle connections cost no work on the server.
+    """
+
+    def __init__(self, scheduler: AlarmScheduler):
+        self._scheduler = scheduler
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        scheduler.add_due_listener(self._on_due)
+
+    # Called from any thread (threadpool endpoints or the timer task)
+    def _on_due(self, alarms: List[dict]):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._publish, alarms)
+
+    def wake(self, *_):
+        """Repository listener: re-read the next fire time after a change"""
+        loop = self._loop
+        if loop is not None and self._wake is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake.set)
+
+    def _publish(self, alarms: List[dict]):
+        for queue in self._subscribers:
+            for alarm in alarms:
+                if queue.full():
+                    break
+                queue.put_nowait(alarm)
+
+    async def _run(self):
+        while self._subscribers:
+            due = self._scheduler.next_due()
+            timeout = None if due is None else max(0.0, (due - datetime.now()).total_seconds())
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            self._scheduler.poll()
+        self._task = None
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """Yield SSE frames for one client until it disconnects"""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        else:
+            self._wake.set()
+
+        try:
+            yield "retry: 5000\n\n"
+            # Alarms that are already due but unacknowledged
+            sent = set()
+            for alarm in self._scheduler.poll():
+                sent.add(alarm["alarm_id"])
+                yield format_event(alarm)
+            while True:
+                try:
+                    alarm = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if alarm["alarm_id"] in sent:
+                    sent.discard(alarm["alarm_id"])
+                    continue
+                yield format_event(alarm)
+        finally:
+            self._subscribers.discard(queue)
+            if not self._subscribers:
+                self._wake.set()  # let the timer task exit
@@ -0,0 +1,139 @@
+# records.py - COMPACT STORED RECORDS
+import sys
+from collections.abc import Mapping
+from datetime import date
+from typing import Iterator, Optional
+
+from models import Patient, Medication
+
+
+class _Missing:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<missing>"
+
+
+MISSING = _Missing()
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def as_date(value) -> Optional[date]:
+    """Dates arrive as date objects (models, records) or ISO strings (SQLite)"""
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class Record(Mapping):
+    """Read-only, dict-compatible record stored in ``__slots__``.
+
+    Subclasses list their fields; enum-like string fields are interned so
+    thousands of records share one copy of "Once Daily" or "ME", and date
+    fields are parsed once on the way in. Records behave like the dicts
+    they replace (``rec["name"]``, ``rec.get("active", True)``), and a
+    field the source dict did not have stays absent. ``to_dict()`` is the
+    JSON boundary; ``replace()`` returns an updated copy.
+    """
+
+    __slots__ = ()
+    FIELDS: tuple = ()
+    INTERNED: frozenset = frozenset()
+    DATES: frozenset = frozenset()
+    _FIELD_SET: frozenset = frozenset()
+    _PLAIN: tuple = ()
+    _CONVERTED: tuple = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._FIELD_SET = frozenset(cls.FIELDS)
+        # (field, slot setter) pairs, split by whether the value needs work
+        setters = {name: cls.__dict__[name].__set__ for name in cls.FIELDS}
+        cls._PLAIN = tuple((n, setters[n]) for n in cls.FIELDS if n not in cls.INTERNED | cls.DATES)
+        cls._CONVERTED = tuple((n, setters[n], _intern if n in cls.INTERNED else as_date)
+                               for n in cls.FIELDS if n in cls.INTERNED | cls.DATES)
+
+    @classmethod
+    def from_dict(cls, data) -> "Record":
+        if isinstance(data, cls):
+            return data
+        record = object.__new__(cls)
+        get = data.get
+        for name, setter in cls._PLAIN:
+            setter(record, get(name, MISSING))
+        for name, setter, convert in cls._CONVERTED:
+            value = get(name, MISSING)
+            setter(record, value if value is MISSING or value is None else convert(value))
+        return record
+
+    def replace(self, **changes) -> "Record":
+        unknown = set(changes) - self._FIELD_SET
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        data.update(changes)
+        return self.from_dict(data)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only; use replace()")
+
+    def __getitem__(self, key):
+        if key in self._FIELD_SET:
+            value = getattr(self, key)
+            if value is not MISSING:
+                return value
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._FIELD_SET:
+            value = getattr(self, key)
+            if value is not MISSING:
+                return value
+        return default
+
+    def __contains__(self, key) -> bool:
+        return key in self._FIELD_SET and getattr(self, key) is not MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        return (name for name in self.FIELDS if getattr(self, name) is not MISSING)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def to_dict(self) -> dict:
+        return {name: value for name in self.FIELDS
+                if (value := getattr(self, name)) is not MISSING}
+
+
+class PatientRecord(Record):
+    FIELDS = tuple(Patient.model_fields)
+    __slots__ = FIELDS
+    INTERNED = frozenset({"gender", "blood_group"})
+    DATES = frozenset({"dob"})
+
+
+class MedicationRecord(Record):
+    FIELDS = tuple(Medication.model_fields) + ("last_taken", "taken_count")
+    __slots__ = FIELDS
+    INTERNED = frozenset({"name", "patient", "dosage", "pattern", "frequency", "alarm_time"})
+    DATES = frozenset({"start_date", "end_date"})
+
+
+def to_json(records):
+    """Plain dicts for the API boundary (records or lists of records)"""
+    if isinstance(records, Record):
+        return records.to_dict()
+    return [r.to_dict() if isinstance(r, Record) else r for r in records]
@@ -0,0 +1,334 @@
+# repository.py - INDEXED IN-MEMORY REPOSITORY
+import threading
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from records import MedicationRecord, PatientRecord, Record
+
+
+class DuplicateIdError(ValueError):
+    """Raised when a record with the same primary key already exists"""
+
+
+class NotFoundError(KeyError):
+    """Raised when a record id is not present in the repository"""
+
+
+# listener(kind, old, new): kind is "patient" or "medication"; old is None
+# for inserts, new is the record as stored after the change.
+ChangeListener = Callable[[str, Optional[Record], Optional[Record]], None]
+
+# batch_listener(kind, changes) receives a bulk write as one list of
+# (old, new) pairs so a view can apply it in a single pass.
+Change = Tuple[Optional[Record], Optional[Record]]
+BatchListener = Callable[[str, List[Change]], None]
+
+# Record ids hash onto this many locks; two ids rarely share one
+LOCK_STRIPES = 64
+
+
+class ChangeNotifier:
+    """Lets derived views (schedules, counters, indexes) follow writes"""
+
+    def __init__(self):
+        self._listeners: List[Tuple[ChangeListener, Optional[BatchListener]]] = []
+
+    def subscribe(self, listener: ChangeListener, batch_listener: Optional[BatchListener] = None):
+        self._listeners.append((listener, batch_listener))
+
+    def _notify(self, kind: str, old: Optional[Record], new: Optional[Record]):
+        for listener, _ in self._listeners:
+            listener(kind, old, new)
+
+    def _notify_many(self, kind: str, changes: List[Change]):
+        for listener, batch_listener in self._listeners:
+            if batch_listener is not None:
+                batch_listener(kind, changes)
+            else:
+                for old, new in changes:
+                    listener(kind, old, new)
+
+
+class RecordLocks:
+    """Striped per-record write locks.
+
+    A write holds its record's lock from the read of the old version until
+    listeners have seen the new one, so concurrent writes to one record
+    are applied and published in order while writes to different records
+    run in parallel. Batches take their stripes in ascending order, which
+    rules out deadlocks between overlapping batches.
+    """
+
+    def __init__(self, stripes: int = LOCK_STRIPES):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    @contextmanager
+    def hold(self, *ids: int) -> Iterator[None]:
+        stripes = sorted({hash(i) % len(self._locks) for i in ids})
+        for stripe in stripes:
+            self._locks[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self._locks[stripe].release()
+
+
+def check_new_ids(records: List[dict], existing: Set[int], kind: str):
+    """Reject a batch that reuses an id, either within itself or from the store"""
+    seen = set()
+    for record in records:
+        record_id = record["id"]
+        if record_id in existing or record_id in seen:
+            raise DuplicateIdError(f"{kind} with id {record_id} already exists")
+        seen.add(record_id)
+
+
+class InMemoryRepository(ChangeNotifier):
+    """Patients and medications keyed by id, with secondary indexes.
+
+    Secondary indexes are dicts used as insertion-ordered sets. Sorted id
+    lists back the ``after_id`` cursor used for pagination.
+
+    Records are stored as compact read-only ``Record`` objects: an update
+    swaps in a new one, so a reader always holds a consistent version
+    without locking. Writers take
+    the record's stripe lock, and only the short id-list and index
+    mutations (and reads that iterate them) share ``_index_lock``.
+    """
+
+    def __init__(self, patients: Iterable[dict] = (), medications: Iterable[dict] = ()):
+        super().__init__()
+        self._patients: Dict[int, Record] = {}
+        self._medications: Dict[int, Record] = {}
+        self._patient_ids: List[int] = []
+        self._medication_ids: List[int] = []
+
+        # Secondary indexes
+        self._meds_by_patient: Dict[str, Dict[int, None]] = {}
+        self._active: Dict[int, None] = {}
+        self._alarm_enabled: Dict[int, None] = {}
+
+        self._patient_locks = RecordLocks()
+        self._medication_locks = RecordLocks()
+        self._index_lock = threading.Lock()
+        self._reserved: Dict[str, int] = {"patient": 0, "medication": 0}   # highest id handed out
+
+        for patient in patients:
+            self.add_patient(patient)
+        for med in medications:
+            self.add_medication(med)
+
+    # =====================
+    # PATIENTS
+    # =====================
+    def add_patient(self, patient: dict) -> Record:
+        patient = PatientRecord.from_dict(patient)
+        patient_id = patient["id"]
+        with self._patient_locks.hold(patient_id):
+            with self._index_lock:
+                if patient_id in self._patients:
+                    raise DuplicateIdError(f"Patient with id {patient_id} already exists")
+                self._patients[patient_id] = patient
+                _insert_sorted(self._patient_ids, patient_id)
+            self._notify("patient", None, patient)
+        return patient
+
+    def add_patients(self, patients: List[dict]) -> List[Record]:
+        """Insert a batch atomically: nothing is stored if any id is taken"""
+        patients = [PatientRecord.from_dict(p) for p in patients]
+        with self._patient_locks.hold(*(p["id"] for p in patients)):
+            with self._index_lock:
+                check_new_ids(patients, self.existing_patient_ids(p["id"] for p in patients), "Patient")
+                for patient in patients:
+                    self._patients[patient["id"]] = patient
+                    _insert_sorted(self._patient_ids, patient["id"])
+            self._notify_many("patient", [(None, p) for p in patients])
+        return patients
+
+    def existing_patient_ids(self, ids: Iterable[int]) -> Set[int]:
+        return {i for i in ids if i in self._patients}
+
+    def reserve_patient_ids(self, count: int = 1) -> range:
+        return self._reserve("patient", self._patient_ids, count)
+
+    def get_patient(self, patient_id: int) -> Optional[Record]:
+        return self._patients.get(patient_id)
+
+    def list_patients(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Record]:
+        """Patients in id order, starting after the ``after_id`` cursor"""
+        with self._index_lock:
+            ids = self._patient_ids
+            start = 0 if after_id is None else bisect_right(ids, after_id)
+            stop = None if limit is None else start + limit
+            return [self._patients[i] for i in ids[start:stop]]
+
+    def patient_count(self) -> int:
+        return len(self._patients)
+
+    # =====================
+    # MEDICATIONS
+    # =====================
+    def add_medication(self, med: dict) -> Record:
+        med = MedicationRecord.from_dict(med)
+        med_id = med["id"]
+        with self._medication_locks.hold(med_id):
+            with self._index_lock:
+                if med_id in self._medications:
+                    raise DuplicateIdError(f"Medication with id {med_id} already exists")
+                self._medications[med_id] = med
+                _insert_sorted(self._medication_ids, med_id)
+                self._index(med)
+            self._notify("medication", None, med)
+        return med
+
+    def add_medications(self, meds: List[dict]) -> List[Record]:
+        """Insert a batch atomically: nothing is stored if any id is taken"""
+        meds = [MedicationRecord.from_dict(m) for m in meds]
+        with self._medication_locks.hold(*(m["id"] for m in meds)):
+            with self._index_lock:
+                check_new_ids(meds, self.existing_medication_ids(m["id"] for m in meds), "Medication")
+                for med in meds:
+                    self._medications[med["id"]] = med
+                    _insert_sorted(self._medication_ids, med["id"])
+                    self._index(med)
+            self._notify_many("medication", [(None, m) for m in meds])
+        return meds
+
+    def existing_medication_ids(self, ids: Iterable[int]) -> Set[int]:
+        return {i for i in ids if i in self._medications}
+
+    def reserve_medication_ids(self, count: int = 1) -> range:
+        return self._reserve("medication", self._medication_ids, count)
+
+    def _reserve(self, kind: str, ids: List[int], count: int) -> range:
+        """Hand out ``count`` fresh ids above every stored or reserved one"""
+        with self._index_lock:
+            first = max(ids[-1] if ids else 0, self._reserved[kind]) + 1
+            self._reserved[kind] = first + count - 1
+        return range(first, first + count)
+
+    def get_medication(self, med_id: int) -> Optional[Record]:
+        return self._medications.get(med_id)
+
+    def list_medications(self, patient: Optional[str] = None, active: Optional[bool] = None,
+                         alarm_enabled: Optional[bool] = None, after_id: Optional[int] = None,
+                         limit: Optional[int] = None) -> List[Record]:
+        """Medications in id order, filtered through the secondary indexes.
+
+        A patient filter walks only that patient's ids; otherwise the
+        sorted id list is scanned from the cursor with O(1) membership
+        checks until the page is full.
+        """
+        with self._index_lock:
+            if patient is not None:
+                ids = sorted(self._meds_by_patient.get(patient, ()))
+            else:
+                ids = self._medication_ids
+            start = 0 if after_id is None else bisect_right(ids, after_id)
+
+            checks = []
+            if active is not None:
+                checks.append((self._active, active))
+            if alarm_enabled is not None:
+                checks.append((self._alarm_enabled, alarm_enabled))
+            if not checks:
+                stop = None if limit is None else start + limit
+                page = ids[start:stop]
+            else:
+                page = []
+                for index in range(start, len(ids)):
+                    med_id = ids[index]
+                    if all((med_id in members) == wanted for members, wanted in checks):
+                        page.append(med_id)
+                        if limit is not None and len(page) >= limit:
+                            break
+            return [self._medications[i] for i in page]
+
+    def medication_count(self) -> int:
+        return len(self._medications)
+
+    def medications_for_patient(self, patient_name: str) -> List[Record]:
+        with self._index_lock:
+            return [self._medications[i] for i in self._meds_by_patient.get(patient_name, ())]
+
+    def active_medications(self) -> List[Record]:
+        with self._index_lock:
+            return [self._medications[i] for i in self._active]
+
+    def active_count(self) -> int:
+        return len(self._active)
+
+    def alarm_medications(self) -> List[Record]:
+        with self._index_lock:
+            return [self._medications[i] for i in self._alarm_enabled]
+
+    def update_medication(self, med_id: int, **changes) -> Record:
+        """Apply field changes to a medication and keep the indexes in sync"""
+        with self._medication_locks.hold(med_id):
+            old = self._medications.get(med_id)
+            if old is None:
+                raise NotFoundError(med_id)
+            med = old.replace(**changes)
+            self._replace(old, med)
+            self._notify("medication", old, med)
+        return med
+
+    def delete_medication(self, med_id: int) -> Record:
+        with self._medication_locks.hold(med_id):
+            with self._index_lock:
+                med = self._medications.pop(med_id, None)
+                if med is None:
+                    raise NotFoundError(med_id)
+                ids = self._medication_ids
+                del ids[bisect_left(ids, med_id)]
+                self._unindex(med)
+            self._notify("medication", med, None)
+        return med
+
+    def mark_taken(self, med_id: int, taken_at: str) -> Record:
+        with self._medication_locks.hold(med_id):
+            old = self._medications.get(med_id)
+            if old is None:
+                raise NotFoundError(med_id)
+            med = old.replace(last_taken=taken_at, taken_count=old.get("taken_count", 0) + 1)
+            self._replace(old, med)
+            self._notify("medication", old, med)
+        return med
+
+    # =====================
+    # INDEX MAINTENANCE
+    # =====================
+    def _replace(self, old: Record, new: Record):
+        """Swap in a new version of a medication (caller holds its record lock)"""
+        with self._index_lock:
+            self._unindex(old)
+            self._medications[new["id"]] = new
+            self._index(new)
+
+    def _index(self, med: Record):
+        med_id = med["id"]
+        self._meds_by_patient.setdefault(med.get("patient"), {})[med_id] = None
+        if med.get("active", True):
+            self._active[med_id] = None
+        if med.get("alarm_enabled"):
+            self._alarm_enabled[med_id] = None
+
+    def _unindex(self, med: Record):
+        med_id = med["id"]
+        by_patient = self._meds_by_patient.get(med.get("patient"))
+        if by_patient is not None:
+            by_patient.pop(med_id, None)
+            if not by_patient:
+                del self._meds_by_patient[med.get("patient")]
+        self._active.pop(med_id, None)
+        self._alarm_enabled.pop(med_id, None)
+
+
+def _insert_sorted(ids: List[int], value: int):
+    """Keep an id list sorted; ids usually arrive in increasing order"""
+    if not ids or ids[-1] < value:
+        ids.append(value)
+    else:
+        insort(ids, value)
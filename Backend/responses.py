@@ -0,0 +1,126 @@
+# responses.py - FAST JSON RESPONSES AND PRE-ENCODED RESPONSE CACHE
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from hashlib import blake2b
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # stdlib json is used without it
+    orjson = None
+
+# Distinct (resource, query) responses kept pre-encoded
+MAX_CACHED_RESPONSES = 256
+
+
+def _default(value):
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(content) -> bytes:
+        return orjson.dumps(content, default=_default)
+else:
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(content) -> bytes:
+        return _encoder.encode(content).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class ResourceVersions:
+    """Repository listener counting changes per record kind.
+
+    A response built after reading version ``v`` reflects at least every
+    write that produced ``v``, so (kind, version) can key cached bodies.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {"patient": 0, "medication": 0}
+
+    def on_change(self, kind: str, old: Optional[dict], new: Optional[dict]):
+        with self._lock:
+            self._versions[kind] = self._versions.get(kind, 0) + 1
+
+    def on_batch(self, kind: str, changes: List[Tuple[Optional[dict], Optional[dict]]]):
+        self.on_change(kind, None, None)
+
+    def __getitem__(self, kind: str) -> int:
+        return self._versions.get(kind, 0)
+
+
+class CachedBody(NamedTuple):
+    version: Hashable
+    etag: str
+    body: bytes
+    headers: Dict[str, str]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison: W/"x" matches "x", and * matches anything"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """Encoded JSON bodies for read endpoints, reused until the data changes.
+
+    Each (resource, query) key keeps the body built for one data version
+    with a strong ETag (a hash of the bytes, so it also survives a
+    restart). While that body is cached, a request whose If-None-Match
+    names its ETag gets a 304 without the data being read or encoded.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_RESPONSES):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+        self._max_entries = max_entries
+
+    def respond(self, request: Request, key: Hashable, version: Hashable,
+                build: Callable[[], Tuple[object, Dict[str, str]]]) -> Response:
+        """Serve ``key`` at ``version``; ``build()`` returns (content, extra headers) on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(key)
+            else:
+                entry = None
+
+        if entry is None:
+            content, headers = build()
+            body = dumps(content)
+            etag = '"' + blake2b(body, digest_size=16).hexdigest() + '"'
+            entry = CachedBody(version, etag, body, headers)
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+
+        headers = {"ETag": entry.etag, **entry.headers}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(entry.body, media_type="application/json", headers=headers)
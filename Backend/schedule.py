@@ -0,0 +1,562 @@
+# schedule.py - MATERIALIZED DAILY SCHEDULE
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+
+from automata import SYMBOL_SLOTS, analyze
+from records import as_date
+
+# Clock time of each slot a symbol can dose at
+DEFAULT_SLOT_CLOCK = {
+    "morning": "08:00",
+    "noon": "12:00",
+    "afternoon": "14:00",
+    "evening": "20:00",
+    "bedtime": "22:00",
+}
+
+# Entry type shown for each of a symbol's slots
+SLOT_TYPES = {
+    "M": ("Morning",),
+    "N": ("Noon",),
+    "A": ("Afternoon",),
+    "E": ("Evening",),
+    "B": ("Bedtime",),
+    "T": ("Twice Daily (AM)", "Twice Daily (PM)"),
+    "X": (),
+}
+
+
+def slot_clock(overrides: str) -> Dict[str, str]:
+    """Slot times with "slot=HH:MM,..." overrides applied (e.g. "morning=07:30")"""
+    clock = dict(DEFAULT_SLOT_CLOCK)
+    for item in filter(None, (part.strip() for part in overrides.split(","))):
+        slot, _, value = item.partition("=")
+        slot = slot.strip().lower()
+        if slot not in clock:
+            raise ValueError(f"Unknown schedule slot '{slot}'; expected one of {', '.join(clock)}")
+        clock[slot] = datetime.strptime(value.strip(), "%H:%M").strftime("%H:%M")
+    return clock
+
+
+# Set MEDICATION_SLOT_TIMES="morning=07:30,bedtime=21:30" to move slots
+SLOT_CLOCK = slot_clock(os.environ.get("MEDICATION_SLOT_TIMES", ""))
+
+
+def _display(clock: str) -> str:
+    return datetime.strptime(clock, "%H:%M").strftime("%I:%M %p")
+
+
+# Schedule slots produced by each DFA symbol: (time, type, default alarm)
+SCHEDULE_SLOTS = {
+    symbol: tuple((_display(SLOT_CLOCK[slot]), label, SLOT_CLOCK[slot])
+                  for slot, label in zip(slots, SLOT_TYPES[symbol]))
+    for symbol, slots in SYMBOL_SLOTS.items()
+}
+
+TIME_ORDER = {
+    _display(clock): rank
+    for rank, clock in enumerate(sorted(set(SLOT_CLOCK.values())), start=1)
+}
+
+# Clock time of each schedule slot, used to find the next dose
+SLOT_TIMES = {slot: datetime.strptime(slot, "%I:%M %p").time() for slot in TIME_ORDER}
+
+# (medication order, slot index) - unique within a time-slot bucket
+EntryKey = Tuple[int, int]
+
+# Medications per block of the validity index; a block whose latest end
+# date is before the query window is skipped without looking inside
+INTERVAL_BLOCK = 64
+
+# Open-ended start/end dates sort before/after every real date
+OPEN_START = date.min.toordinal()
+OPEN_END = date.max.toordinal()
+
+# Day cycles count from the start_date, or without one from a Monday, so
+# a 7-day cycle lines up with the week
+CYCLE_EPOCH = date(2024, 1, 1).toordinal()
+
+
+# Distinct patterns kept expanded; most medications share a handful
+MAX_PATTERN_TEMPLATES = 4096
+
+# (time rank, symbol, (time, type, default alarm)) of one dose
+Dose = Tuple[int, str, Tuple[str, str, str]]
+
+
+class PatternTemplate(NamedTuple):
+    """A pattern expanded once and shared by every medication using it"""
+    pattern: str                            # normalized (upper-case) pattern
+    valid: bool
+    symbols: Tuple[str, ...]
+    meaning: Tuple[str, ...]
+    counts: Mapping[str, int]               # read-only occurrences of each symbol
+    doses: Tuple[Tuple[Dose, ...], ...]     # per day of the cycle, in pattern order
+    slots: Tuple[Tuple[Dose, ...], ...]     # per day of the cycle, in time order
+
+    def on_day(self, offset: int) -> Tuple[Dose, ...]:
+        """Doses taken ``offset`` days into the cycle, in pattern order"""
+        return self.doses[offset % len(self.doses)] if self.doses else ()
+
+
+def _build_template(pattern: str) -> PatternTemplate:
+    analysis = analyze(pattern)
+    doses = tuple(
+        tuple((TIME_ORDER.get(slot[0], 99), char, slot) for char in symbols for slot in SCHEDULE_SLOTS[char])
+        for symbols in analysis.days
+    )
+    return PatternTemplate(
+        analysis.pattern,
+        analysis.valid,
+        analysis.symbols,
+        analysis.meaning,
+        MappingProxyType(analysis.counts),
+        doses,
+        tuple(tuple(sorted(day)) for day in doses),
+    )
+
+
+class TemplateCache:
+    """Bounded LRU of pattern -> PatternTemplate with hit/miss counts.
+
+    Only valid patterns are stored; an invalid one is expanded on every
+    lookup, so rejected input cannot evict the patterns in use.
+    """
+
+    def __init__(self, max_entries: int = MAX_PATTERN_TEMPLATES):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, PatternTemplate]" = OrderedDict()
+        self._max_entries = max_entries
+        self._hits = self._misses = self._evictions = 0
+
+    def get(self, pattern: str) -> PatternTemplate:
+        key = pattern.upper()
+        with self._lock:
+            template = self._entries.get(key)
+            if template is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return template
+            self._misses += 1
+
+        template = _build_template(key)
+        if not template.valid:
+            return template
+        with self._lock:
+            self._entries[key] = template
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return template
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "capacity": self._max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+templates = TemplateCache()
+
+
+def template(med: dict) -> PatternTemplate:
+    return templates.get(med.get("pattern", "M"))
+
+
+def taken_on(med: dict, day: date) -> bool:
+    last_taken = med.get("last_taken")
+    return bool(last_taken) and str(last_taken)[:10] == day.isoformat()
+
+
+def _dose_statuses(doses: Tuple[Dose, ...], taken: int, untaken: str = "pending") -> List[str]:
+    """Statuses of a day's doses in pattern order: the first ``taken`` by time are taken"""
+    by_time = sorted(range(len(doses)), key=lambda i: (doses[i][0], i))
+    done = set(by_time[:max(taken, 0)])
+    return ["taken" if i in done else untaken for i in range(len(doses))]
+
+
+class TakenDoses:
+    """How many doses each medication took on the day of its last_taken.
+
+    A record only says when its last dose was taken, so the count starts
+    from ``count_on`` (the dose log's events that day, at least one) and
+    grows by the taken_count delta of each mark-taken; earlier doses of
+    the day are filled in time order.
+    """
+
+    def __init__(self, count_on: Optional[Callable[[int, date], int]] = None):
+        self._count_on = count_on
+        self._days: Dict[int, Tuple[int, int]] = {}    # med id -> (day ordinal, doses taken)
+
+    def seed(self, med: dict):
+        day = as_date(str(med.get("last_taken") or "")[:10] or None)
+        if day is not None:
+            logged = self._count_on(med["id"], day) if self._count_on is not None else 0
+            self._days[med["id"]] = (day.toordinal(), max(logged, 1))
+
+    def update(self, old: Optional[dict], new: Optional[dict]):
+        if new is None:
+            self._days.pop(old["id"], None)
+            return
+        if old is None:
+            self.seed(new)
+            return
+        delta = new.get("taken_count", 0) - old.get("taken_count", 0)
+        day = as_date(str(new.get("last_taken") or "")[:10] or None)
+        if delta > 0 and day is not None:
+            known_day, known = self._days.get(new["id"], (None, 0))
+            ordinal = day.toordinal()
+            self._days[new["id"]] = (ordinal, known + delta if known_day == ordinal else delta)
+
+    def on(self, med_id: int, day: date) -> int:
+        known_day, known = self._days.get(med_id, (None, 0))
+        return known if known_day == day.toordinal() else 0
+
+
+# Stands in for a missing alarm_time (an entry then shows the slot's default)
+_UNSET = object()
+
+# (id, name, patient, dosage, alarm_time) - what an entry shows of its medication
+Shown = Tuple[Optional[int], str, str, str, object]
+
+
+def shown_fields(med: dict) -> Shown:
+    return (med.get("id"), med.get("name", "Unknown"), med.get("patient", "Unknown"),
+            med.get("dosage", "N/A"), med.get("alarm_time", _UNSET))
+
+
+def _entry(med: dict, char: str, slot: Tuple[str, str, str], status: str) -> dict:
+    return _shown_entry(shown_fields(med), char, slot, status)
+
+
+def _shown_entry(shown: Shown, char: str, slot: Tuple[str, str, str], status: str) -> dict:
+    med_id, name, patient, dosage, alarm_time = shown
+    slot_time, pattern_type, default_alarm = slot
+    return {
+        "time": slot_time,
+        "medication": name,
+        "patient": patient,
+        "dosage": dosage,
+        "pattern_char": char,
+        "pattern_type": pattern_type,
+        "medication_id": med_id,
+        "status": status,
+        "alarm_time": default_alarm if alarm_time is _UNSET else alarm_time
+    }
+
+
+def cycle_start(med: dict) -> int:
+    """Ordinal of day 0 of the medication's pattern cycle"""
+    start = as_date(med.get("start_date"))
+    return start.toordinal() if start else CYCLE_EPOCH
+
+
+def day_slots(med: dict) -> Tuple[Tuple[Dose, ...], ...]:
+    """Per day of the pattern cycle: its (time rank, symbol, slot) doses in time order"""
+    return template(med).slots
+
+
+def medication_doses(med: dict, day: date) -> Tuple[Dose, ...]:
+    """One medication's doses on a day, in pattern order"""
+    return template(med).on_day(day.toordinal() - cycle_start(med))
+
+
+def medication_entries(med: dict, day: date) -> List[dict]:
+    """Expand one medication's DFA pattern into its schedule entries for a day.
+
+    Without a dose count, a last_taken on that day marks its first dose taken.
+    """
+    doses = medication_doses(med, day)
+    statuses = _dose_statuses(doses, 1 if taken_on(med, day) else 0)
+    return [_entry(med, char, slot, status) for (_, char, slot), status in zip(doses, statuses)]
+
+
+
+def validity(med: dict) -> Tuple[int, int]:
+    """A medication's start/end dates as an inclusive ordinal interval"""
+    start, end = as_date(med.get("start_date")), as_date(med.get("end_date"))
+    return (start.toordinal() if start else OPEN_START,
+            end.toordinal() if end else OPEN_END)
+
+
+class TodaySchedule:
+    """Today's schedule, patched one medication at a time.
+
+    Entries live in one bucket per time slot, ordered by (medication
+    order, slot index). A change re-expands only the medications it
+    touches; new medications simply append to their buckets. Reads return
+    a flat list that is rebuilt by concatenating the buckets only when
+    something changed since the last read, so repeated polls never
+    rebuild or re-sort anything.
+    """
+
+    def __init__(self, load_active: Callable[[], Iterable[dict]],
+                 count_on: Optional[Callable[[int, date], int]] = None):
+        self._load_active = load_active
+        self._count_on = count_on
+        self._lock = threading.Lock()
+        self._order: Dict[int, int] = {}          # medication id -> insertion order
+        self._keys_by_med: Dict[int, List[Tuple[int, EntryKey]]] = {}
+        self._buckets: Dict[int, Tuple[List[EntryKey], List[dict]]] = {}
+        self._snapshot: Optional[List[dict]] = None
+        self._summary: Optional[List[dict]] = None
+        self._day: Optional[date] = None
+        self._taken = TakenDoses(count_on)
+        self.rebuild()
+
+    def rebuild(self):
+        """Materialize the whole schedule (startup and day rollover)"""
+        day = date.today()
+        with self._lock:
+            self._keys_by_med = {}
+            self._buckets = {}
+            self._day = day
+            self._taken = TakenDoses(self._count_on)
+            meds = list(self._load_active())
+            for med in meds:
+                self._taken.seed(med)
+            self._insert_all(meds, day)
+            self._snapshot = None
+            self._summary = None
+
+    def entries(self) -> List[dict]:
+        if self._day != date.today():
+            self.rebuild()
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = [
+                        entry
+                        for rank in sorted(self._buckets)
+                        for entry in self._buckets[rank][1]
+                    ]
+                snapshot = self._snapshot
+        return snapshot
+
+    def summary(self) -> List[dict]:
+        """Per-slot totals for the dashboard, recounted only after a change"""
+        if self._day != date.today():
+            self.rebuild()
+        summary = self._summary
+        if summary is None:
+            with self._lock:
+                if self._summary is None:
+                    self._summary = [
+                        _slot_summary(self._buckets[rank][1])
+                        for rank in sorted(self._buckets)
+                        if self._buckets[rank][1]
+                    ]
+                summary = self._summary
+        return summary
+
+    def next_dose(self, now: Optional[datetime] = None) -> Optional[dict]:
+        """First pending entry in a slot that has not passed yet today"""
+        now = now or datetime.now()
+        for slot in self.summary():
+            slot_time = SLOT_TIMES.get(slot["time"])
+            if slot["next"] is not None and (slot_time is None or slot_time >= now.time()):
+                return slot["next"]
+        return None
+
+    def on_change(self, kind: str, old: Optional[dict], new: Optional[dict]):
+        """Repository listener: re-expand only the medication that changed"""
+        if kind == "medication":
+            self._apply([(old, new)])
+
+    def on_batch(self, kind: str, changes: List[Tuple[Optional[dict], Optional[dict]]]):
+        """Repository batch listener: apply a bulk write under one lock"""
+        if kind == "medication":
+            self._apply(changes)
+
+    def _apply(self, changes):
+        day = self._day or date.today()
+        with self._lock:
+            for old, new in changes:
+                med = new if new is not None else old
+                self._taken.update(old, new)
+                self._remove(med["id"])
+            self._insert_all((new for _, new in changes if new is not None and new.get("active", True)), day)
+            self._snapshot = None
+            self._summary = None
+
+    def _remove(self, med_id: int):
+        for rank, key in self._keys_by_med.pop(med_id, ()):
+            keys, entries = self._buckets[rank]
+            index = bisect_left(keys, key)
+            del keys[index]
+            del entries[index]
+
+    def _insert_all(self, meds: Iterable[dict], day: date):
+        ordinal = day.toordinal()
+        for med in meds:
+            start, end = validity(med)
+            if not start <= ordinal <= end:
+                continue
+            order = self._order.setdefault(med["id"], len(self._order))
+            placed = []
+            doses = medication_doses(med, day)
+            statuses = _dose_statuses(doses, self._taken.on(med["id"], day))
+            for index, ((rank, char, slot), status) in enumerate(zip(doses, statuses)):
+                entry = _entry(med, char, slot, status)
+                key = (order, index)
+                keys, entries = self._buckets.setdefault(rank, ([], []))
+                if not keys or keys[-1] < key:
+                    keys.append(key)
+                    entries.append(entry)
+                else:
+                    position = bisect_left(keys, key)
+                    keys.insert(position, key)
+                    entries.insert(position, entry)
+                placed.append((rank, key))
+            self._keys_by_med[med["id"]] = placed
+
+
+def _slot_summary(entries: List[dict]) -> dict:
+    taken = sum(entry["status"] == "taken" for entry in entries)
+    return {
+        "time": entries[0]["time"],
+        "total": len(entries),
+        "taken": taken,
+        "pending": len(entries) - taken,
+        "next": next((entry for entry in entries if entry["status"] != "taken"), None)
+    }
+
+
+class ScheduleRange:
+    """Schedules for arbitrary date windows, expanded lazily.
+
+    Active medications are kept in an interval index over their
+    start_date/end_date: sorted by start, cut into blocks that remember
+    their latest end. A day's candidates are found by bisecting the
+    starts and skipping blocks that ended earlier, so medications
+    outside the window are never expanded. Entries are produced day by
+    day from a generator, holding at most one day's medication ids.
+    """
+
+    def __init__(self, load_active: Callable[[], Iterable[dict]],
+                 count_on: Optional[Callable[[int, date], int]] = None):
+        self._lock = threading.Lock()
+        self._shown: Dict[int, Shown] = {}
+        self._intervals: Dict[int, Tuple[int, int]] = {}
+        self._slots: Dict[int, tuple] = {}        # med id -> (cycle start, day_slots(), (pattern, start_date))
+        self._taken = TakenDoses(count_on)
+        self._count_on = count_on
+        self._index: Optional[tuple] = None
+        with self._lock:
+            for med in load_active():
+                self._put(med)
+                self._taken.seed(med)
+
+    def on_change(self, kind: str, old: Optional[dict], new: Optional[dict]):
+        if kind == "medication":
+            self._apply([(old, new)])
+
+    def on_batch(self, kind: str, changes: List[Tuple[Optional[dict], Optional[dict]]]):
+        if kind == "medication":
+            self._apply(changes)
+
+    def _apply(self, changes):
+        with self._lock:
+            for old, new in changes:
+                self._taken.update(old, new)
+                if new is not None and new.get("active", True):
+                    self._put(new)
+                else:
+                    self._drop((new if new is not None else old)["id"])
+
+    def _put(self, med: dict):
+        med_id = med["id"]
+        self._shown[med_id] = shown_fields(med)
+        interval = validity(med)
+        if self._intervals.get(med_id) != interval:
+            self._intervals[med_id] = interval
+            self._index = None
+        plan_key = (med.get("pattern"), med.get("start_date"))
+        previous = self._slots.get(med_id)
+        if previous is None or previous[2] != plan_key:
+            self._slots[med_id] = (cycle_start(med), day_slots(med), plan_key)
+
+    def _drop(self, med_id: int):
+        if self._shown.pop(med_id, None) is not None:
+            del self._intervals[med_id]
+            del self._slots[med_id]
+            self._index = None
+
+    def _snapshot_index(self) -> tuple:
+        """(starts, ends, ids, block max ends), rebuilt after interval changes"""
+        with self._lock:
+            if self._index is None:
+                ordered = sorted((start, end, med_id) for med_id, (start, end) in self._intervals.items())
+                ends = [end for _, end, _ in ordered]
+                self._index = (
+                    [start for start, _, _ in ordered],
+                    ends,
+                    [med_id for _, _, med_id in ordered],
+                    [max(ends[i:i + INTERVAL_BLOCK]) for i in range(0, len(ends), INTERVAL_BLOCK)],
+                )
+            return self._index
+
+    def medication_ids_on(self, day: date) -> List[int]:
+        """Ids of active medications valid on the given day, in id order"""
+        starts, ends, ids, block_ends = self._snapshot_index()
+        ordinal = day.toordinal()
+        stop = bisect_right(starts, ordinal)
+        found = []
+        for block, block_end in enumerate(block_ends):
+            first = block * INTERVAL_BLOCK
+            if first >= stop:
+                break
+            if block_end < ordinal:
+                continue
+            for i in range(first, min(first + INTERVAL_BLOCK, stop)):
+                if ends[i] >= ordinal:
+                    found.append(ids[i])
+        found.sort()
+        return found
+
+    def _on_day(self, med_id: int, day: date) -> Tuple[Dose, ...]:
+        start, days, _ = self._slots.get(med_id, (0, (), None))
+        return days[(day.toordinal() - start) % len(days)] if days else ()
+
+    def _statuses(self, med_id: int, med_slots: Tuple[Dose, ...], day: date, today: date) -> List[str]:
+        """Taken/pending for today and later; past days count the dose log's takes and the rest were missed"""
+        taken = self._taken.on(med_id, day)
+        if day >= today:
+            return _dose_statuses(med_slots, taken)
+        if self._count_on is not None:
+            taken = max(taken, self._count_on(med_id, day))
+        return _dose_statuses(med_slots, taken, "missed")
+
+    def entries(self, first: date, last: date) -> Iterator[dict]:
+        """Yield entries for every day in [first, last], by day then time"""
+        today = date.today()
+        day = first
+        while day <= last:
+            slots = []
+            for med_id in self.medication_ids_on(day):
+                shown = self._shown.get(med_id)
+                if shown is not None:
+                    med_slots = self._on_day(med_id, day)
+                    slots.append((shown, med_slots, self._statuses(med_id, med_slots, day, today)))
+            for rank in sorted({rank for _, med_slots, _ in slots for rank, _, _ in med_slots}):
+                for shown, med_slots, statuses in slots:
+                    for (slot_rank, char, slot), status in zip(med_slots, statuses):
+                        if slot_rank == rank:
+                            yield {"date": day.isoformat(), **_shown_entry(shown, char, slot, status)}
+            day += timedelta(days=1)
@@ -0,0 +1,217 @@
+# screening.py - ALLERGY AND INTERACTION SCREENING
+import json
+import threading
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from search import tokens
+
+# Most severe first
+SEVERITY_ORDER = {"contraindicated": 0, "major": 1, "moderate": 2, "minor": 3}
+
+# Severity of a medication that matches one of the patient's allergies
+ALLERGY_SEVERITY = "contraindicated"
+
+# (other term, severity, description)
+Reaction = Tuple[str, str, str]
+
+
+class InteractionTable:
+    """Drug vocabulary, classes and interactions from a JSON data file.
+
+    Names are reduced to terms: a known drug word becomes the drug plus
+    each class it belongs to ("amoxicillin" -> {"amoxicillin",
+    "penicillins"}) and a class alias in an allergy list ("sulfa")
+    becomes the class. Words outside the vocabulary are ignored.
+    """
+
+    def __init__(self, data: dict):
+        self.labels: Dict[str, str] = {}
+        drug_classes: Dict[str, set] = {}
+        aliases: Dict[str, set] = {}
+        for key, spec in data.get("classes", {}).items():
+            self.labels[key] = spec.get("label", key)
+            for drug in spec.get("drugs", ()):
+                drug_classes.setdefault(drug.casefold(), {drug.casefold()}).add(key)
+            for alias in spec.get("aliases", ()):
+                aliases.setdefault(alias.casefold(), set()).add(key)
+
+        self._cross: Dict[str, List[Reaction]] = {}
+        for rule in data.get("cross_reactivity", ()):
+            self._cross.setdefault(rule["allergy"], []).append(
+                (rule["class"], rule["severity"], rule["description"]))
+
+        self._partners: Dict[str, List[Reaction]] = {}
+        for rule in data.get("interactions", ()):
+            first, second = (name.casefold() for name in rule["between"])
+            for name in (first, second):
+                if name not in self.labels:
+                    drug_classes.setdefault(name, {name})
+            self._partners.setdefault(first, []).append((second, rule["severity"], rule["description"]))
+            self._partners.setdefault(second, []).append((first, rule["severity"], rule["description"]))
+
+        self._medication_words = {word: frozenset(terms) for word, terms in drug_classes.items()}
+        self._allergy_words = dict(self._medication_words)
+        for word, keys in aliases.items():
+            self._allergy_words[word] = self._allergy_words.get(word, frozenset()) | frozenset(keys)
+
+    @classmethod
+    def load(cls, path: str) -> "InteractionTable":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def label(self, term: str) -> str:
+        return self.labels.get(term, term)
+
+    def medication_terms(self, name: Optional[str]) -> FrozenSet[str]:
+        return _terms(self._medication_words, name)
+
+    def allergy_terms(self, text: Optional[str]) -> FrozenSet[str]:
+        return _terms(self._allergy_words, text)
+
+    def cross_reactions(self, allergy_terms: FrozenSet[str], med_terms: FrozenSet[str]) -> List[Tuple[str, Reaction]]:
+        """(allergy term, reaction) pairs where the medication is in a cross-reacting class"""
+        return [(term, reaction) for term in allergy_terms for reaction in self._cross.get(term, ())
+                if reaction[0] in med_terms]
+
+    def interactions(self, terms: FrozenSet[str], other_terms: FrozenSet[str]) -> List[Reaction]:
+        return [reaction for term in terms for reaction in self._partners.get(term, ())
+                if reaction[0] in other_terms]
+
+
+@lru_cache(maxsize=4096)
+def _name_tokens(text: str) -> FrozenSet[str]:
+    return frozenset(tokens(text))
+
+
+def _terms(words: Dict[str, FrozenSet[str]], text: Optional[str]) -> FrozenSet[str]:
+    if not text:
+        return frozenset()
+    found = frozenset()
+    for token in _name_tokens(str(text)):
+        terms = words.get(token)
+        if terms is not None:
+            found |= terms
+    return found
+
+
+class Screening:
+    """Checks a medication against its patient's allergies and active medications.
+
+    Follows repository events to keep, per patient name, the allergy
+    terms of each patient record and the terms of each active
+    medication, so a check only looks up one patient's entries.
+    """
+
+    def __init__(self, table: InteractionTable, patients: Iterable[dict], active_medications: Iterable[dict]):
+        self.table = table
+        self._lock = threading.Lock()
+        self._allergies: Dict[str, Dict[int, FrozenSet[str]]] = {}
+        self._current: Dict[str, Dict[int, Tuple[str, FrozenSet[str]]]] = {}
+        with self._lock:
+            for patient in patients:
+                self._apply("patient", None, patient)
+            for med in active_medications:
+                self._apply("medication", None, med)
+
+    def on_change(self, kind: str, old: Optional[dict], new: Optional[dict]):
+        with self._lock:
+            self._apply(kind, old, new)
+
+    def on_batch(self, kind: str, changes: List[Tuple[Optional[dict], Optional[dict]]]):
+        with self._lock:
+            for old, new in changes:
+                self._apply(kind, old, new)
+
+    def _apply(self, kind: str, old: Optional[dict], new: Optional[dict]):
+        if kind == "patient":
+            if old is not None:
+                _unlink(self._allergies, old.get("name"), old["id"])
+            if new is not None:
+                terms = self.table.allergy_terms(new.get("allergies"))
+                if terms:
+                    self._allergies.setdefault(new.get("name"), {})[new["id"]] = terms
+            return
+        if old is not None:
+            _unlink(self._current, old.get("patient"), old["id"])
+        if new is not None and new.get("active", True):
+            terms = self.table.medication_terms(new.get("name"))
+            if terms:
+                self._current.setdefault(new.get("patient"), {})[new["id"]] = (new.get("name", "Unknown"), terms)
+
+    def check(self, med: dict, pending: Iterable[Tuple[int, Tuple[str, FrozenSet[str]]]] = ()) -> List[dict]:
+        """Structured warnings for ``med``, most severe first (empty when nothing applies).
+
+        ``pending`` adds (id, (name, terms)) of medications that are about
+        to be stored alongside it.
+        """
+        name = med.get("name", "Unknown")
+        terms = self.table.medication_terms(med.get("name"))
+        if not terms:
+            return []
+        patient = med.get("patient")
+        with self._lock:
+            allergy_sets = list(self._allergies.get(patient, {}).values())
+            current = list(self._current.get(patient, {}).items())
+        current.extend(pending)
+
+        table = self.table
+        warnings = []
+        allergy_terms = frozenset().union(*allergy_sets)
+        for term in sorted(terms & allergy_terms):
+            warnings.append({
+                "type": "allergy",
+                "severity": ALLERGY_SEVERITY,
+                "medication": name,
+                "allergen": table.label(term),
+                "message": f"{patient} has a recorded allergy to {table.label(term)}",
+            })
+        for term, (_, severity, description) in table.cross_reactions(allergy_terms, terms):
+            warnings.append({
+                "type": "cross_reactivity",
+                "severity": severity,
+                "medication": name,
+                "allergen": table.label(term),
+                "message": description,
+            })
+        for other_id, (other_name, other_terms) in current:
+            if other_id == med.get("id"):
+                continue
+            for _, severity, description in table.interactions(terms, other_terms):
+                warnings.append({
+                    "type": "interaction",
+                    "severity": severity,
+                    "medication": name,
+                    "with_medication_id": other_id,
+                    "with_medication": other_name,
+                    "message": description,
+                })
+        warnings.sort(key=lambda w: SEVERITY_ORDER.get(w["severity"], len(SEVERITY_ORDER)))
+        return warnings
+
+
+    def check_many(self, meds: List[dict]) -> List[List[dict]]:
+        """Warnings for each medication of a batch about to be stored.
+
+        Each is checked against the stored records and the active
+        medications before it in the batch, so an interacting pair inside
+        the batch is reported once, on its later item.
+        """
+        earlier: Dict[str, List[Tuple[int, Tuple[str, FrozenSet[str]]]]] = {}
+        results = []
+        for med in meds:
+            patient = med.get("patient")
+            results.append(self.check(med, earlier.get(patient, ())))
+            if med.get("active", True):
+                terms = self.table.medication_terms(med.get("name"))
+                if terms:
+                    earlier.setdefault(patient, []).append((med.get("id"), (med.get("name", "Unknown"), terms)))
+        return results
+
+
+def _unlink(index: Dict[str, dict], name: Optional[str], record_id: int):
+    by_id = index.get(name)
+    if by_id is not None:
+        by_id.pop(record_id, None)
+        if not by_id:
+            del index[name]
@@ -0,0 +1,169 @@
+# search.py - INCREMENTAL PATIENT SEARCH INDEXES
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Most patients a search returns
+MAX_SEARCH_RESULTS = 100
+
+# A batch adding more names than this is merged with one sort instead of insorts
+BULK_SORT_THRESHOLD = 64
+
+_WORD = re.compile(r"\w+")
+
+
+def fold(text: Optional[str]) -> str:
+    """Case- and accent-insensitive form of a string, whitespace collapsed"""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+def name_keys(name: Optional[str]) -> List[str]:
+    """The folded name from each word on: "John Doe" -> ["john doe", "doe"]"""
+    words = fold(name).split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def phone_key(phone: Optional[str]) -> str:
+    """Digits only, so "+1 (234) 567-890" and "1234567890" match"""
+    return "".join(c for c in str(phone or "") if c.isdigit())
+
+
+def email_key(email: Optional[str]) -> str:
+    return str(email or "").strip().casefold()
+
+
+def tokens(text: Optional[str]) -> Set[str]:
+    return set(_WORD.findall(fold(text)))
+
+
+class PatientSearch:
+    """Patient lookup indexes, kept up to date from repository events.
+
+    - name: a sorted list of (folded name suffix, id), so a prefix is a
+      bisect plus a scan of the matching range; every word of a name is
+      a starting point, so "doe" finds "John Doe"
+    - phone and email: exact-match dicts of normalized value -> ids
+    - allergies and medical_history: inverted indexes of word -> ids
+    """
+
+    def __init__(self, patients: Iterable[dict] = ()):
+        self._lock = threading.Lock()
+        self._names: List[Tuple[str, int]] = []
+        self._phones: Dict[str, Set[int]] = {}
+        self._emails: Dict[str, Set[int]] = {}
+        self._allergies: Dict[str, Set[int]] = {}
+        self._history: Dict[str, Set[int]] = {}
+        with self._lock:
+            self._add_all(patients)
+
+    def on_change(self, kind: str, old: Optional[dict], new: Optional[dict]):
+        if kind != "patient":
+            return
+        with self._lock:
+            if old is not None:
+                self._remove(old)
+            if new is not None:
+                self._add_all((new,))
+
+    def on_batch(self, kind: str, changes: List[Tuple[Optional[dict], Optional[dict]]]):
+        if kind != "patient":
+            return
+        with self._lock:
+            for old, _ in changes:
+                if old is not None:
+                    self._remove(old)
+            self._add_all(new for _, new in changes if new is not None)
+
+    def _add_all(self, patients: Iterable[dict]):
+        names = []
+        for patient in patients:
+            patient_id = patient["id"]
+            names.extend((key, patient_id) for key in name_keys(patient.get("name")))
+            _link(self._phones, phone_key(patient.get("phone")), patient_id)
+            _link(self._emails, email_key(patient.get("email")), patient_id)
+            for token in tokens(patient.get("allergies")):
+                _link(self._allergies, token, patient_id)
+            for token in tokens(patient.get("medical_history")):
+                _link(self._history, token, patient_id)
+        if len(names) > BULK_SORT_THRESHOLD:
+            self._names.extend(names)
+            self._names.sort()
+        else:
+            for entry in names:
+                insort(self._names, entry)
+
+    def _remove(self, patient: dict):
+        patient_id = patient["id"]
+        for key in name_keys(patient.get("name")):
+            index = bisect_left(self._names, (key, patient_id))
+            if index < len(self._names) and self._names[index] == (key, patient_id):
+                del self._names[index]
+        _unlink(self._phones, phone_key(patient.get("phone")), patient_id)
+        _unlink(self._emails, email_key(patient.get("email")), patient_id)
+        for token in tokens(patient.get("allergies")):
+            _unlink(self._allergies, token, patient_id)
+        for token in tokens(patient.get("medical_history")):
+            _unlink(self._history, token, patient_id)
+
+    def search(self, name: Optional[str] = None, phone: Optional[str] = None,
+               email: Optional[str] = None, allergy: Optional[str] = None,
+               history: Optional[str] = None, limit: int = 20) -> List[int]:
+        """Ids of patients matching every given criterion.
+
+        ``name`` is a prefix (of the full name or of any later word) and
+        orders the results by name; ``allergy`` and ``history`` match
+        records containing all of their words. Without a name, results
+        are in id order.
+        """
+        with self._lock:
+            candidates: Optional[Set[int]] = None
+            if phone is not None:
+                candidates = _narrow(candidates, self._phones.get(phone_key(phone), ()))
+            if email is not None:
+                candidates = _narrow(candidates, self._emails.get(email_key(email), ()))
+            for text, index in ((allergy, self._allergies), (history, self._history)):
+                if text is not None:
+                    for token in tokens(text) or ("",):
+                        candidates = _narrow(candidates, index.get(token, ()))
+            if candidates is not None and not candidates:
+                return []
+
+            prefix = fold(name)
+            if not prefix:
+                return heapq.nsmallest(limit, candidates or ())
+
+            found: Dict[int, None] = {}
+            names = self._names
+            for i in range(bisect_left(names, (prefix,)), len(names)):
+                key, patient_id = names[i]
+                if not key.startswith(prefix):
+                    break
+                if candidates is None or patient_id in candidates:
+                    found[patient_id] = None
+                    if len(found) >= limit:
+                        break
+            return list(found)
+
+
+def _link(index: Dict[str, Set[int]], key: str, patient_id: int):
+    if key:
+        index.setdefault(key, set()).add(patient_id)
+
+
+def _unlink(index: Dict[str, Set[int]], key: str, patient_id: int):
+    ids = index.get(key)
+    if ids is not None:
+        ids.discard(patient_id)
+        if not ids:
+            del index[key]
+
+
+def _narrow(candidates: Optional[Set[int]], ids) -> Set[int]:
+    return set(ids) if candidates is None else candidates.intersection(ids)
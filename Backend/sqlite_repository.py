@@ -0,0 +1,307 @@
+# sqlite_repository.py - SQLITE PERSISTENCE ENGINE
+import sqlite3
+import threading
+import typing
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set
+
+from models import Patient, Medication
+from records import MedicationRecord, PatientRecord, Record
+from repository import ChangeNotifier, DuplicateIdError, NotFoundError, RecordLocks, check_new_ids
+
+# Python type -> SQLite column affinity
+SQL_TYPES = {int: "INTEGER", float: "REAL", bool: "INTEGER", str: "TEXT", date: "TEXT"}
+
+# Fields that exist on stored medications but not on the request model
+MEDICATION_EXTRA_COLUMNS = {"last_taken": "TEXT", "taken_count": "INTEGER NOT NULL DEFAULT 0"}
+COLUMN_DEFAULTS = {"taken_count": 0}
+
+
+def _column_type(annotation) -> str:
+    """Unwrap Optional[...] and map the field type to a column type"""
+    args = [a for a in typing.get_args(annotation) if a is not type(None)]
+    return SQL_TYPES.get(args[0] if args else annotation, "TEXT")
+
+
+def _columns(model, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    columns = {name: _column_type(field.annotation) for name, field in model.model_fields.items()}
+    columns["id"] = "INTEGER PRIMARY KEY"
+    columns.update(extra or {})
+    return columns
+
+
+PATIENT_COLUMNS = _columns(Patient)
+MEDICATION_COLUMNS = _columns(Medication, MEDICATION_EXTRA_COLUMNS)
+BOOL_COLUMNS = {"alarm_enabled", "active"}
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS patients ({})".format(
+        ", ".join(f"{name} {kind}" for name, kind in PATIENT_COLUMNS.items())),
+    "CREATE TABLE IF NOT EXISTS medications ({})".format(
+        ", ".join(f"{name} {kind}" for name, kind in MEDICATION_COLUMNS.items())),
+    "CREATE INDEX IF NOT EXISTS idx_medications_patient ON medications (patient)",
+    "CREATE INDEX IF NOT EXISTS idx_medications_active ON medications (active)",
+    "CREATE INDEX IF NOT EXISTS idx_medications_alarm ON medications (alarm_time) WHERE alarm_enabled = 1",
+]
+
+# Statements are kept as constants so sqlite3's statement cache reuses the
+# prepared form on every call.
+INSERT_PATIENT = "INSERT INTO patients ({}) VALUES ({})".format(
+    ", ".join(PATIENT_COLUMNS), ", ".join("?" * len(PATIENT_COLUMNS)))
+INSERT_MEDICATION = "INSERT INTO medications ({}) VALUES ({})".format(
+    ", ".join(MEDICATION_COLUMNS), ", ".join("?" * len(MEDICATION_COLUMNS)))
+SELECT_PATIENT = "SELECT * FROM patients WHERE id = ?"
+SELECT_PATIENTS = "SELECT * FROM patients WHERE id > ? ORDER BY id LIMIT ?"
+COUNT_PATIENTS = "SELECT COUNT(*) FROM patients"
+SELECT_MEDICATION = "SELECT * FROM medications WHERE id = ?"
+SELECT_PATIENT_MEDICATIONS = "SELECT * FROM medications WHERE patient = ? ORDER BY id"
+SELECT_ACTIVE = "SELECT * FROM medications WHERE active = 1 ORDER BY id"
+SELECT_ALARMS = "SELECT * FROM medications WHERE alarm_enabled = 1 AND alarm_time IS NOT NULL ORDER BY id"
+COUNT_MEDICATIONS = "SELECT COUNT(*) FROM medications"
+COUNT_ACTIVE = "SELECT COUNT(*) FROM medications WHERE active = 1"
+# Ids per "IN (...)" lookup, below SQLite's default host-parameter limit
+ID_LOOKUP_CHUNK = 500
+
+DELETE_MEDICATION = "DELETE FROM medications WHERE id = ?"
+MARK_TAKEN = "UPDATE medications SET last_taken = ?, taken_count = taken_count + 1 WHERE id = ?"
+
+
+def _cursor(after_id: Optional[int]) -> int:
+    # SQLite integer keys are 64-bit signed
+    return -(2 ** 63) if after_id is None else after_id
+
+
+def _limit(limit: Optional[int]) -> int:
+    return -1 if limit is None else limit  # LIMIT -1 means no limit
+
+
+def _to_param(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class SQLiteRepository(ChangeNotifier):
+    """Repository backed by an SQLite database file in WAL mode.
+
+    Each thread gets its own connection (FastAPI runs plain ``def``
+    endpoints on a threadpool), created lazily and reused afterwards.
+    """
+
+    def __init__(self, path: str = "medication.db"):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+        self._patient_locks = RecordLocks()
+        self._medication_locks = RecordLocks()
+        self._id_lock = threading.Lock()
+        self._reserved: Dict[str, int] = {"patients": 0, "medications": 0}   # highest id handed out
+
+        conn = self._conn()
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    # =====================
+    # CONNECTION POOL
+    # =====================
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=128)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._pool_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._pool_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    @staticmethod
+    def _row(row: Optional[sqlite3.Row], record_type=MedicationRecord) -> Optional[Record]:
+        if row is None:
+            return None
+        record = dict(row)
+        for name in BOOL_COLUMNS.intersection(record):
+            if record[name] is not None:
+                record[name] = bool(record[name])
+        return record_type.from_dict(record)
+
+    def _fetch_all(self, sql: str, params=(), record_type=MedicationRecord) -> List[Record]:
+        return [self._row(r, record_type) for r in self._conn().execute(sql, params)]
+
+    def _insert(self, sql: str, columns: Dict[str, str], record: dict, kind: str):
+        params = [_to_param(record.get(name, COLUMN_DEFAULTS.get(name))) for name in columns]
+        conn = self._conn()
+        try:
+            with conn:
+                conn.execute(sql, params)
+        except sqlite3.IntegrityError:
+            raise DuplicateIdError(f"{kind} with id {record['id']} already exists")
+
+    def _insert_many(self, sql: str, columns: Dict[str, str], table: str, records: List[dict], kind: str):
+        """One transaction for the whole batch; a duplicate rolls it all back"""
+        check_new_ids(records, self._existing_ids(table, (r["id"] for r in records)), kind)
+        rows = ([_to_param(r.get(name, COLUMN_DEFAULTS.get(name))) for name in columns] for r in records)
+        conn = self._conn()
+        try:
+            with conn:
+                conn.executemany(sql, rows)
+        except sqlite3.IntegrityError:
+            raise DuplicateIdError(f"{kind} batch contains an id that already exists")
+
+    def _existing_ids(self, table: str, ids: Iterable[int]) -> Set[int]:
+        ids = list(ids)
+        found = set()
+        conn = self._conn()
+        for start in range(0, len(ids), ID_LOOKUP_CHUNK):
+            chunk = ids[start:start + ID_LOOKUP_CHUNK]
+            sql = f"SELECT id FROM {table} WHERE id IN ({', '.join('?' * len(chunk))})"
+            found.update(row[0] for row in conn.execute(sql, chunk))
+        return found
+
+    def _reserve(self, table: str, count: int) -> range:
+        """Hand out ``count`` fresh ids above every stored or reserved one"""
+        with self._id_lock:
+            stored = self._conn().execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+            first = max(stored, self._reserved[table]) + 1
+            self._reserved[table] = first + count - 1
+        return range(first, first + count)
+
+    # =====================
+    # PATIENTS
+    # =====================
+    def add_patient(self, patient: dict) -> Record:
+        patient = PatientRecord.from_dict(patient)
+        with self._patient_locks.hold(patient["id"]):
+            self._insert(INSERT_PATIENT, PATIENT_COLUMNS, patient, "Patient")
+            self._notify("patient", None, patient)
+        return patient
+
+    def add_patients(self, patients: List[dict]) -> List[Record]:
+        patients = [PatientRecord.from_dict(p) for p in patients]
+        with self._patient_locks.hold(*(p["id"] for p in patients)):
+            self._insert_many(INSERT_PATIENT, PATIENT_COLUMNS, "patients", patients, "Patient")
+            self._notify_many("patient", [(None, p) for p in patients])
+        return patients
+
+    def existing_patient_ids(self, ids: Iterable[int]) -> Set[int]:
+        return self._existing_ids("patients", ids)
+
+    def reserve_patient_ids(self, count: int = 1) -> range:
+        return self._reserve("patients", count)
+
+    def get_patient(self, patient_id: int) -> Optional[Record]:
+        return self._row(self._conn().execute(SELECT_PATIENT, (patient_id,)).fetchone(), PatientRecord)
+
+    def list_patients(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Record]:
+        return self._fetch_all(SELECT_PATIENTS, (_cursor(after_id), _limit(limit)), PatientRecord)
+
+    def patient_count(self) -> int:
+        return self._conn().execute(COUNT_PATIENTS).fetchone()[0]
+
+    # =====================
+    # MEDICATIONS
+    # =====================
+    def add_medication(self, med: dict) -> Record:
+        med = MedicationRecord.from_dict(med)
+        with self._medication_locks.hold(med["id"]):
+            self._insert(INSERT_MEDICATION, MEDICATION_COLUMNS, med, "Medication")
+            self._notify("medication", None, med)
+        return med
+
+    def add_medications(self, meds: List[dict]) -> List[Record]:
+        meds = [MedicationRecord.from_dict(m) for m in meds]
+        with self._medication_locks.hold(*(m["id"] for m in meds)):
+            self._insert_many(INSERT_MEDICATION, MEDICATION_COLUMNS, "medications", meds, "Medication")
+            self._notify_many("medication", [(None, m) for m in meds])
+        return meds
+
+    def existing_medication_ids(self, ids: Iterable[int]) -> Set[int]:
+        return self._existing_ids("medications", ids)
+
+    def reserve_medication_ids(self, count: int = 1) -> range:
+        return self._reserve("medications", count)
+
+    def get_medication(self, med_id: int) -> Optional[Record]:
+        return self._row(self._conn().execute(SELECT_MEDICATION, (med_id,)).fetchone())
+
+    def list_medications(self, patient: Optional[str] = None, active: Optional[bool] = None,
+                         alarm_enabled: Optional[bool] = None, after_id: Optional[int] = None,
+                         limit: Optional[int] = None) -> List[Record]:
+        conditions, params = ["id > ?"], [_cursor(after_id)]
+        for column, value in (("patient", patient), ("active", active), ("alarm_enabled", alarm_enabled)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        params.append(_limit(limit))
+        sql = f"SELECT * FROM medications WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?"
+        return self._fetch_all(sql, params)
+
+    def medication_count(self) -> int:
+        return self._conn().execute(COUNT_MEDICATIONS).fetchone()[0]
+
+    def medications_for_patient(self, patient_name: str) -> List[Record]:
+        return self._fetch_all(SELECT_PATIENT_MEDICATIONS, (patient_name,))
+
+    def active_medications(self) -> List[Record]:
+        return self._fetch_all(SELECT_ACTIVE)
+
+    def active_count(self) -> int:
+        return self._conn().execute(COUNT_ACTIVE).fetchone()[0]
+
+    def alarm_medications(self) -> List[Record]:
+        return self._fetch_all(SELECT_ALARMS)
+
+    def update_medication(self, med_id: int, **changes) -> Record:
+        unknown = set(changes) - set(MEDICATION_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown medication fields: {', '.join(sorted(unknown))}")
+        with self._medication_locks.hold(med_id):
+            old = self.get_medication(med_id)
+            if old is None:
+                raise NotFoundError(med_id)
+            if changes:
+                assignments = ", ".join(f"{name} = ?" for name in changes)
+                conn = self._conn()
+                with conn:
+                    conn.execute(f"UPDATE medications SET {assignments} WHERE id = ?",
+                                 [_to_param(v) for v in changes.values()] + [med_id])
+            med = self.get_medication(med_id)
+            self._notify("medication", old, med)
+        return med
+
+    def delete_medication(self, med_id: int) -> Record:
+        with self._medication_locks.hold(med_id):
+            old = self.get_medication(med_id)
+            if old is None:
+                raise NotFoundError(med_id)
+            conn = self._conn()
+            with conn:
+                conn.execute(DELETE_MEDICATION, (med_id,))
+            self._notify("medication", old, None)
+        return old
+
+    def mark_taken(self, med_id: int, taken_at: str) -> Record:
+        # taken_count is incremented in SQL; the record lock keeps the
+        # old/new pair handed to listeners in step with other writers.
+        with self._medication_locks.hold(med_id):
+            old = self.get_medication(med_id)
+            if old is None:
+                raise NotFoundError(med_id)
+            conn = self._conn()
+            with conn:
+                conn.execute(MARK_TAKEN, (taken_at, med_id))
+            med = self.get_medication(med_id)
+            self._notify("medication", old, med)
+        return med
@@ -0,0 +1,91 @@
+# stats.py - INCREMENTALLY MAINTAINED SYSTEM COUNTERS
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from automata import SYMBOL_MEANINGS
+from schedule import templates
+
+
+def _is_active(med: Optional[dict]) -> int:
+    return int(med is not None and bool(med.get("active", True)))
+
+
+class SystemCounters:
+    """Running totals for /api/stats, updated from repository events.
+
+    Each change subtracts the old record's contribution and adds the new
+    one, so reading the stats never touches the medication list.
+    """
+
+    def __init__(self, store):
+        self._lock = threading.Lock()
+        self.reset(store)
+
+    def reset(self, store):
+        expected = recompute(store)
+        with self._lock:
+            self._patients = expected["total_patients"]
+            self._medications = expected["total_medications"]
+            self._active = expected["active_medications"]
+            self._symbols = dict.fromkeys(SYMBOL_MEANINGS, 0)
+            self._symbols.update(expected["pattern_statistics"])
+
+    def on_change(self, kind: str, old: Optional[dict], new: Optional[dict]):
+        with self._lock:
+            self._apply(kind, old, new)
+
+    def on_batch(self, kind: str, changes: List[Tuple[Optional[dict], Optional[dict]]]):
+        with self._lock:
+            for old, new in changes:
+                self._apply(kind, old, new)
+
+    def _apply(self, kind: str, old: Optional[dict], new: Optional[dict]):
+        if kind == "patient":
+            self._patients += (new is not None) - (old is not None)
+            return
+        self._medications += (new is not None) - (old is not None)
+        self._active += _is_active(new) - _is_active(old)
+        if old is not None and new is not None and old.get("pattern") == new.get("pattern"):
+            return  # e.g. mark-taken or deactivation: symbol counts unchanged
+        if old is not None:
+            for symbol, count in templates.get(old.get("pattern", "")).counts.items():
+                self._symbols[symbol] -= count
+        if new is not None:
+            for symbol, count in templates.get(new.get("pattern", "")).counts.items():
+                self._symbols[symbol] += count
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "total_patients": self._patients,
+                "total_medications": self._medications,
+                "active_medications": self._active,
+                "pattern_statistics": {s: c for s, c in self._symbols.items() if c},
+            }
+
+
+def recompute(store) -> dict:
+    """Count everything from scratch (startup and consistency checks)"""
+    active = 0
+    symbols: Dict[str, int] = {}
+    medications = store.list_medications()
+    for med in medications:
+        active += bool(med.get("active", True))
+        for symbol, count in templates.get(med.get("pattern", "")).counts.items():
+            if count:
+                symbols[symbol] = symbols.get(symbol, 0) + count
+    return {
+        "total_patients": store.patient_count(),
+        "total_medications": len(medications),
+        "active_medications": active,
+        "pattern_statistics": symbols,
+    }
+
+
+def verify(counters: SystemCounters, store) -> dict:
+    """Compare the running counters with a full recount"""
+    actual = counters.snapshot()
+    expected = recompute(store)
+    mismatches = {key: {"counter": actual[key], "recomputed": expected[key]}
+                  for key in expected if actual[key] != expected[key]}
+    return {"consistent": not mismatches, "mismatches": mismatches}
@@ -1,5 +1,7 @@
 # storage.py - ENHANCED STORAGE
+import os
 from datetime import datetime
+from repository import InMemoryRepository
 
 patients = [
     {
@@ -65,4 +67,36 @@ medications = [
         "created_at": "2024-01-16 15:00:00",
         "last_updated": "2024-01-16 15:00:00"
     }
-]
\ No newline at end of file
+]
+
+# Storage backend: "memory" (default) or "sqlite"
+STORAGE_BACKEND = os.environ.get("MEDICATION_STORAGE", "memory").lower()
+DB_PATH = os.environ.get("MEDICATION_DB_PATH", "medication.db")
+
+# Binary dose event log; kept next to the database when SQLite is used
+DOSE_LOG_PATH = os.environ.get("MEDICATION_DOSE_LOG") or (
+    f"{DB_PATH}.doses" if STORAGE_BACKEND == "sqlite" else None)
+
+# Drug classes and interactions used to screen new medications
+INTERACTIONS_PATH = os.environ.get("MEDICATION_INTERACTIONS") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "interactions.json")
+
+
+def create_repository(backend: str = STORAGE_BACKEND, db_path: str = DB_PATH):
+    """Build the selected repository, seeded with the records above"""
+    if backend == "memory":
+        return InMemoryRepository(patients, medications)
+    if backend == "sqlite":
+        from sqlite_repository import SQLiteRepository
+        store = SQLiteRepository(db_path)
+        if store.patient_count() == 0 and store.medication_count() == 0:
+            for patient in patients:
+                store.add_patient(patient)
+            for med in medications:
+                store.add_medication(med)
+        return store
+    raise ValueError(f"Unknown storage backend '{backend}'. Use 'memory' or 'sqlite'.")
+
+
+# Repository used by the API
+repo = create_repository()
@@ -1,10 +1,11 @@
 # streamlit_app.py - ENHANCED VERSION
 import streamlit as st
-import requests
+import json
 import pandas as pd
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 import time as tm
-from streamlit_autorefresh import st_autorefresh
+import streamlit.components.v1 as components
+import backend_client as backend
 
 # ======================
 # PAGE CONFIGURATION
@@ -16,9 +17,6 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Auto-refresh every 30 seconds for notifications
-st_autorefresh(interval=30000, key="notification_refresh")
-
 # ======================
 # CUSTOM CSS (Enhanced)
 # ======================
@@ -155,6 +153,119 @@ def check_medication_time():
     
     return notifications
 
+def alarm_stream_listener():
+    """Browser-side subscriber for alarms pushed by the backend.
+
+    The EventSource connection lives in the page, so alarms arrive as
+    they come due without rerunning the Streamlit script.
+    """
+    return """
+    <div id="alarm-status" style="font-family: sans-serif; font-size: 0.85rem; color: #6c757d;">
+        🔌 Connecting to alarm stream...
+    </div>
+    <div id="alarm-list" style="font-family: sans-serif;"></div>
+    <script>
+        const streamUrl = """ + json.dumps(backend.url("/api/notifications/stream")) + """;
+        const ackBase = """ + json.dumps(backend.url("/api/notifications/")) + """;
+        const statusEl = document.getElementById("alarm-status");
+        const listEl = document.getElementById("alarm-list");
+        const beep = new Audio("https://assets.mixkit.co/sfx/preview/mixkit-alarm-digital-clock-beep-989.mp3");
+        const seen = new Set();
+        if ("Notification" in window && Notification.permission === "default") {
+            Notification.requestPermission();
+        }
+        const source = new EventSource(streamUrl);
+        source.onopen = () => { statusEl.textContent = "🟢 Live medication alarms connected"; };
+        source.onerror = () => { statusEl.textContent = "🔴 Alarm stream offline - retrying..."; };
+        source.addEventListener("alarm", (event) => {
+            const alarm = JSON.parse(event.data);
+            if (seen.has(alarm.alarm_id)) return;
+            seen.add(alarm.alarm_id);
+            const card = document.createElement("div");
+            card.style.cssText = "background: #fff3cd; border-left: 5px solid #ffc107; padding: 8px 12px; margin-top: 6px; border-radius: 8px;";
+            card.textContent = "⏰ " + alarm.message + " - " + alarm.patient + " (" + alarm.time + ") ";
+            const ack = document.createElement("button");
+            ack.textContent = "🔕 Acknowledge";
+            ack.onclick = () => {
+                fetch(ackBase + encodeURIComponent(alarm.alarm_id) + "/ack", { method: "POST" })
+                    .then(() => card.remove())
+                    .catch(() => { ack.textContent = "Retry"; });
+            };
+            card.appendChild(ack);
+            listEl.prepend(card);
+            beep.play().catch(() => {});
+            if ("Notification" in window && Notification.permission === "granted") {
+                new Notification("🔔 Medication Alarm", { body: alarm.message });
+            }
+        });
+    </script>
+    """
+
+def fetch_patient_names():
+    """Patient names for selectboxes, fetched as an id/name projection"""
+    try:
+        return backend.patient_names()
+    except:
+        return [p.get('name', '') for p in st.session_state.patients]
+
+def find_patient_names(query):
+    """Type-ahead matches from the backend search index (all names without a query)"""
+    if not query or not query.strip():
+        return fetch_patient_names()
+    try:
+        return backend.search_patient_names(query.strip())
+    except:
+        prefix = query.strip().casefold()
+        names = [p.get('name', '') for p in st.session_state.patients]
+        return [n for n in names if n.casefold().startswith(prefix)
+                or any(word.startswith(prefix) for word in n.casefold().split())]
+
+def day_part(entry):
+    """Column of a schedule entry by its clock time: morning, afternoon or evening.
+
+    Bucketing by parsed time (rather than fixed labels) keeps bedtime
+    doses and MEDICATION_SLOT_TIMES overrides such as 07:30 AM visible.
+    """
+    try:
+        clock = datetime.strptime(str(entry.get("time", "")).strip(), "%I:%M %p").time()
+    except ValueError:
+        return "evening" if entry.get("pattern_char") in ("E", "B") else "morning"
+    if clock < time(12, 0):
+        return "morning"
+    if clock < time(17, 0):
+        return "afternoon"
+    return "evening"
+
+def next_local_id(records):
+    """Id for a record kept only in this session while the backend is offline"""
+    return max((r.get('id') or 0 for r in records), default=0) + 1
+
+def show_screening_warnings(warnings):
+    """Allergy and interaction screening results, most severe first"""
+    for warning in warnings:
+        severity = warning.get("severity", "").capitalize()
+        if warning.get("type") == "interaction":
+            st.warning(f"⚠️ {severity}: interacts with {warning.get('with_medication')} - {warning.get('message')}")
+        else:
+            st.warning(f"⚠️ {severity}: {warning.get('message')}")
+
+def mark_taken(med_id, name):
+    """Record a dose through the backend, which also clears its alarms"""
+    try:
+        result = backend.mark_taken(med_id)
+    except:
+        st.error(f"❌ Could not mark {name} as taken - backend unavailable or medication not found")
+        return
+    st.success(f"✅ {result.get('message', f'Marked {name} as taken!')}")
+
+def acknowledge_alarm(alarm_id):
+    try:
+        backend.acknowledge_alarm(alarm_id)
+    except:
+        st.error("❌ Could not acknowledge the alarm - it may already be dismissed")
+        return
+    st.success("🔕 Alarm acknowledged")
+
 def ring_alarm():
     """Simulate alarm ringing"""
     alarm_html = """
@@ -172,6 +283,14 @@ def ring_alarm():
     """
     return alarm_html
 
+# ======================
+# DASHBOARD DATA (one request per render)
+# ======================
+try:
+    dashboard = backend.dashboard()
+except:
+    dashboard = None
+
 # ======================
 # SIDEBAR NAVIGATION
 # ======================
@@ -179,13 +298,9 @@ with st.sidebar:
     st.markdown("<h1 style='color: white;'>🏥 MedCare</h1>", unsafe_allow_html=True)
     
     # Backend connection status
-    try:
-        response = requests.get("http://localhost:8000/", timeout=2)
-        if response.status_code == 200:
-            st.success("✅ Backend Connected")
-        else:
-            st.error("❌ Backend Error")
-    except:
+    if dashboard is not None:
+        st.success("✅ Backend Connected")
+    else:
         st.error("❌ Backend Offline")
     
     st.markdown("---")
@@ -194,7 +309,7 @@ with st.sidebar:
     menu = st.radio(
         "📱 Navigation",
         ["🏠 Dashboard", "👤 Add Patient", "💊 Add Medication", "📅 View Schedule", 
-         "🔔 Notifications", "⚙️ Settings", "🧠 DFA Pattern Tester"],
+         "🔔 Notifications", "📈 Adherence Analytics", "⚙️ Settings", "🧠 DFA Pattern Tester"],
         key="main_menu"
     )
     
@@ -204,9 +319,9 @@ with st.sidebar:
     st.markdown("### 📊 Quick Stats")
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Patients", len(st.session_state.patients))
+        st.metric("Patients", dashboard["total_patients"] if dashboard else len(st.session_state.patients))
     with col2:
-        st.metric("Meds", len(st.session_state.medications))
+        st.metric("Meds", dashboard["total_medications"] if dashboard else len(st.session_state.medications))
     
     st.markdown("---")
     
@@ -243,6 +358,9 @@ st.markdown("</div>", unsafe_allow_html=True)
 # ======================
 # NOTIFICATION DISPLAY AREA
 # ======================
+# Alarms are pushed by the backend; no polling or script reruns needed
+components.html(alarm_stream_listener(), height=110, scrolling=True)
+
 notifications = check_medication_time()
 if notifications or st.session_state.alarm_time:
     with st.container():
@@ -270,31 +388,45 @@ if menu == "🏠 Dashboard":
     with col1:
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.markdown("### 👥 Total Patients")
-        st.markdown(f"<h1 style='text-align: center; color: #667eea;'>{len(st.session_state.patients)}</h1>", unsafe_allow_html=True)
+        total_patients = dashboard["total_patients"] if dashboard else len(st.session_state.patients)
+        st.markdown(f"<h1 style='text-align: center; color: #667eea;'>{total_patients}</h1>", unsafe_allow_html=True)
         st.markdown("</div>", unsafe_allow_html=True)
     
     with col2:
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.markdown("### 💊 Active Medications")
-        active_meds = len([m for m in st.session_state.medications if m.get('active', True)])
+        if dashboard:
+            active_meds = dashboard["active_medications"]
+        else:
+            active_meds = len([m for m in st.session_state.medications if m.get('active', True)])
         st.markdown(f"<h1 style='text-align: center; color: #28a745;'>{active_meds}</h1>", unsafe_allow_html=True)
         st.markdown("</div>", unsafe_allow_html=True)
     
     with col3:
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.markdown("### ⏰ Next Medication")
-        try:
-            schedule = requests.get("http://localhost:8000/api/schedule/today", timeout=3).json()
-            if schedule:
-                next_med = schedule[0]
-                st.markdown(f"<h3 style='color: #dc3545;'>{next_med.get('medication', 'None')}</h3>", unsafe_allow_html=True)
-                st.markdown(f"**Time:** {next_med.get('time', 'N/A')}")
-            else:
-                st.info("No medications scheduled")
-        except:
+        if dashboard is None:
             st.info("Schedule not available")
+        elif dashboard["next_dose"]:
+            next_med = dashboard["next_dose"]
+            st.markdown(f"<h3 style='color: #dc3545;'>{next_med.get('medication', 'None')}</h3>", unsafe_allow_html=True)
+            st.markdown(f"**Time:** {next_med.get('time', 'N/A')}")
+        else:
+            st.info("No medications scheduled")
         st.markdown("</div>", unsafe_allow_html=True)
     
+    # Today's progress by time slot
+    if dashboard and dashboard["today"]["slots"]:
+        today = dashboard["today"]
+        st.markdown(f"### 🗓️ Today: {today['taken']}/{today['total']} doses taken")
+        slot_cols = st.columns(len(today["slots"]))
+        for slot_col, slot in zip(slot_cols, today["slots"]):
+            with slot_col:
+                st.metric(slot["time"], f"{slot['taken']}/{slot['total']}", f"{slot['pending']} pending",
+                          delta_color="off")
+        if dashboard["pending_alarm_count"]:
+            st.warning(f"🔔 {dashboard['pending_alarm_count']} alarm(s) waiting to be acknowledged")
+    
     # Quick Actions Row
     st.markdown("### ⚡ Quick Actions")
     qcol1, qcol2, qcol3, qcol4 = st.columns(4)
@@ -373,7 +505,6 @@ elif menu == "👤 Add Patient":
                     st.error("Please fill in all required fields (*)")
                 else:
                     new_patient = {
-                        "id": len(st.session_state.patients) + 1,
                         "name": name,
                         "gender": gender,
                         "phone": phone,
@@ -388,12 +519,11 @@ elif menu == "👤 Add Patient":
                     }
                     
                     try:
-                        response = requests.post(
-                            "http://localhost:8000/patients",
-                            json=new_patient,
-                            timeout=5
-                        )
+                        # The backend assigns the id
+                        response = backend.post("/patients", json=new_patient)
                         if response.status_code == 200:
+                            backend.invalidate()
+                            new_patient["id"] = response.json()["patient_id"]
                             st.session_state.patients.append(new_patient)
                             st.success(f"✅ Patient '{name}' added successfully!")
                             st.balloons()
@@ -407,8 +537,11 @@ elif menu == "👤 Add Patient":
                             
                             # Reset form
                             st.rerun()
+                        else:
+                            st.error(f"❌ Could not add patient: {response.json().get('detail', response.text)}")
                     except:
                         # Save locally
+                        new_patient["id"] = next_local_id(st.session_state.patients)
                         st.session_state.patients.append(new_patient)
                         st.success(f"✅ Patient '{name}' saved locally!")
         
@@ -431,6 +564,12 @@ elif menu == "👤 Add Patient":
 elif menu == "💊 Add Medication":
     st.markdown("<h2>💊 Add Medication with DFA Pattern</h2>", unsafe_allow_html=True)
     
+    # Type-ahead patient search (outside the form so matches refresh as you type)
+    patient_query = st.text_input("🔎 Find Patient", placeholder="Start typing a name, e.g. Jo or Doe")
+    patient_matches = find_patient_names(patient_query)
+    if patient_query and not patient_matches:
+        st.caption("No patients match that name")
+    
     with st.form("medication_form"):
         # Form in two columns
         col1, col2 = st.columns(2)
@@ -439,7 +578,7 @@ elif menu == "💊 Add Medication":
             st.markdown("### 📋 Medication Details")
             med_name = st.text_input("Medication Name *", placeholder="Metformin")
             patient = st.selectbox("Select Patient *", 
-                                 ["Select"] + [p.get('name', '') for p in st.session_state.patients])
+                                 ["Select"] + patient_matches)
             dosage = st.text_input("Dosage *", placeholder="500mg")
             frequency = st.selectbox("Frequency", ["Once Daily", "Twice Daily", "Thrice Daily", "As Needed"])
             start_date = st.date_input("Start Date", datetime.now())
@@ -455,31 +594,31 @@ elif menu == "💊 Add Medication":
             st.markdown("### 🧠 DFA Pattern Input")
             pattern = st.text_input(
                 "Enter Pattern Sequence *",
-                placeholder="e.g., ME (Morning+Evening), T (Twice Daily), MXE (Morning+Skip+Evening)",
-                help="M=Morning (8 AM), E=Evening (8 PM), T=Twice Daily (8 AM & 8 PM), X=Skip"
+                placeholder="e.g., ME (Morning+Evening), MNB (Morning+Noon+Bedtime), [MX] (every other day)",
+                help="M=Morning (8 AM), N=Noon (12 PM), A=Afternoon (2 PM), E=Evening (8 PM), B=Bedtime (10 PM), "
+                     "T=Twice Daily (8 AM & 8 PM), X=Skip; (MX){3} repeats a group, [MXMXMXX] is a weekly cycle"
             )
             
-            # Real-time pattern validation
+            # Real-time pattern validation (the backend owns the grammar)
+            pattern_check = None
             if pattern:
-                pattern_upper = pattern.upper()
-                if all(c in "METX" for c in pattern_upper) and len(pattern_upper) > 0:
+                try:
+                    pattern_check = backend.validate_pattern(pattern)
+                except:
+                    st.warning("Backend unavailable - the pattern will be checked when saving")
+                if pattern_check and pattern_check.get("valid"):
                     st.markdown(f"<div class='pattern-valid'>✅ VALID PATTERN: '{pattern}'</div>", unsafe_allow_html=True)
                     
                     # Show schedule visualization
                     st.markdown("#### 📅 Schedule Preview:")
-                    schedule_map = {"M": "🌅 8:00 AM - Morning", "E": "🌇 8:00 PM - Evening", 
-                                  "T": "🔄 8:00 AM & 8:00 PM - Twice Daily", "X": "⏭️ Skip"}
-                    
-                    for i, char in enumerate(pattern_upper):
-                        if char in schedule_map:
-                            st.write(f"{i+1}. {schedule_map[char]}")
-                else:
-                    invalid_chars = [c for c in pattern_upper if c not in "METX"]
-                    if invalid_chars:
-                        st.markdown(f"<div class='pattern-invalid'>❌ INVALID: Characters {', '.join(invalid_chars)} not allowed</div>", 
-                                  unsafe_allow_html=True)
-                    else:
-                        st.warning("Pattern cannot be empty")
+                    cycle_days = pattern_check.get("cycle_days", 1)
+                    if cycle_days > 1:
+                        st.caption(f"Repeats every {cycle_days} days, one symbol per day")
+                    for i, meaning in enumerate(pattern_check.get("meaning", [])):
+                        st.write(f"{i+1}. {meaning}")
+                elif pattern_check:
+                    st.markdown(f"<div class='pattern-invalid'>❌ INVALID: {pattern_check.get('message', '')}</div>", 
+                              unsafe_allow_html=True)
             
             # Special Instructions
             st.markdown("### 📝 Special Instructions")
@@ -489,17 +628,19 @@ elif menu == "💊 Add Medication":
                 height=100
             )
         
+        # Screening warnings block the save unless the prescriber overrides them
+        override_warnings = st.checkbox("Save even if allergy/interaction screening finds warnings", value=False)
+        
         # Form submission
         submitted = st.form_submit_button("💾 Save Medication", type="primary", use_container_width=True)
         
         if submitted:
             if not med_name or patient == "Select" or not dosage or not pattern:
                 st.error("Please fill all required fields (*)")
-            elif not all(c in "METX" for c in pattern.upper()):
-                st.error("Invalid pattern! Use only M, E, T, X")
+            elif pattern_check is not None and not pattern_check.get("valid"):
+                st.error(f"Invalid pattern! {pattern_check.get('message', '')}")
             else:
                 new_med = {
-                    "id": len(st.session_state.medications) + 1,
                     "name": med_name,
                     "patient": patient,
                     "dosage": dosage,
@@ -514,20 +655,32 @@ elif menu == "💊 Add Medication":
                 }
                 
                 try:
-                    response = requests.post(
-                        "http://localhost:8000/medications",
-                        json=new_med,
-                        timeout=5
-                    )
+                    # The backend assigns the id
+                    response = backend.post("/medications", json=new_med,
+                                            params={"override_warnings": str(override_warnings).lower()})
                     if response.status_code == 200:
+                        backend.invalidate()
+                        new_med["id"] = response.json()["medication"]["id"]
                         st.session_state.medications.append(new_med)
                         st.success(f"✅ Medication '{med_name}' added for {patient}!")
-                        st.balloons()
+                        
+                        # Allergy and interaction screening results
+                        warnings = response.json().get("warnings", [])
+                        show_screening_warnings(warnings)
+                        if not warnings:
+                            st.balloons()
                         
                         # Show alarm notification
                         if enable_alarm:
                             st.info(f"🔔 Alarm set for {alarm_time.strftime('%I:%M %p')}")
+                    elif response.status_code == 409 and isinstance(response.json().get("detail"), dict):
+                        detail = response.json()["detail"]
+                        st.error(f"❌ Not saved: {detail.get('message')}")
+                        show_screening_warnings(detail.get("warnings", []))
+                    else:
+                        st.error(f"❌ Could not add medication: {response.json().get('detail', response.text)}")
                 except:
+                    new_med["id"] = next_local_id(st.session_state.medications)
                     st.session_state.medications.append(new_med)
                     st.success(f"✅ Medication '{med_name}' saved locally!")
 
@@ -538,44 +691,57 @@ elif menu == "📅 View Schedule":
     st.markdown("<h2>📅 Medication Schedule</h2>", unsafe_allow_html=True)
     
     # Date selector
-    col_date1, col_date2 = st.columns([3, 1])
+    col_date1, col_date2, col_date3 = st.columns([2, 1, 1])
     with col_date1:
         selected_date = st.date_input("Select Date", datetime.now())
     with col_date2:
+        view_span = st.selectbox("Show", ["Day", "Week", "Month"])
+    with col_date3:
         if st.button("🔄 Refresh Schedule", use_container_width=True):
+            backend.schedule_range.clear()
             st.rerun()
     
-    # Fetch schedule
+    span_days = {"Day": 1, "Week": 7, "Month": 30}[view_span]
+    last_date = selected_date + timedelta(days=span_days - 1)
+    
+    # Fetch schedule (streamed from the backend, only medications valid in the window)
     try:
-        schedule_response = requests.get("http://localhost:8000/api/schedule/today", timeout=5)
-        if schedule_response.status_code == 200:
-            schedule_data = schedule_response.json()
-        else:
-            schedule_data = []
+        range_data = backend.schedule_range(selected_date.isoformat(), last_date.isoformat())
     except:
-        schedule_data = []
+        range_data = []
+    schedule_data = [m for m in range_data if m.get("date") == selected_date.isoformat()]
+    
+    if view_span != "Day":
+        st.markdown(f"### 🗓️ {selected_date.strftime('%b %d')} - {last_date.strftime('%b %d, %Y')}")
+        if range_data:
+            range_df = pd.DataFrame(range_data)
+            per_day = range_df.groupby("date").agg(doses=("medication", "size"),
+                                                   medications=("medication_id", "nunique"))
+            st.dataframe(per_day, use_container_width=True)
+        else:
+            st.info("No medications scheduled in this period")
+        st.markdown(f"#### Doses on {selected_date.strftime('%A, %b %d')}")
     
     # Display in time slots
     col1, col2, col3 = st.columns(3)
     
-    time_slots = {
-        "Morning (6 AM - 12 PM)": ["08:00 AM"],
-        "Afternoon (12 PM - 5 PM)": ["12:00 PM", "02:00 PM"],
-        "Evening (5 PM - 10 PM)": ["08:00 PM"]
-    }
+    # Before noon / noon to 5 PM / 5 PM onward (bedtime included)
+    by_part = {"morning": [], "afternoon": [], "evening": []}
+    for entry in schedule_data:
+        by_part[day_part(entry)].append(entry)
     
     with col1:
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.markdown("#### 🌅 Morning Medications")
-        morning_meds = [m for m in schedule_data if any(time in str(m.get("time", "")) for time in time_slots["Morning (6 AM - 12 PM)"])]
+        morning_meds = by_part["morning"]
         if morning_meds:
             for med in morning_meds:
                 with st.expander(f"💊 {med.get('medication', 'Unknown')}"):
                     st.markdown(f"**Patient:** {med.get('patient', 'Unknown')}")
                     st.markdown(f"**Dosage:** {med.get('dosage', 'N/A')}")
                     st.markdown(f"**Time:** {med.get('time', 'N/A')}")
-                    if st.button("✅ Mark as Taken", key=f"morning_{med.get('medication')}"):
-                        st.success(f"Marked {med.get('medication')} as taken!")
+                    if st.button("✅ Mark as Taken", key=f"morning_{med.get('medication_id')}_{med.get('time')}"):
+                        mark_taken(med.get('medication_id'), med.get('medication'))
         else:
             st.info("No morning medications")
         st.markdown("</div>", unsafe_allow_html=True)
@@ -583,15 +749,15 @@ elif menu == "📅 View Schedule":
     with col2:
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.markdown("#### ☀️ Afternoon Medications")
-        afternoon_meds = [m for m in schedule_data if any(time in str(m.get("time", "")) for time in time_slots["Afternoon (12 PM - 5 PM)"])]
+        afternoon_meds = by_part["afternoon"]
         if afternoon_meds:
             for med in afternoon_meds:
                 with st.expander(f"💊 {med.get('medication', 'Unknown')}"):
                     st.markdown(f"**Patient:** {med.get('patient', 'Unknown')}")
                     st.markdown(f"**Dosage:** {med.get('dosage', 'N/A')}")
                     st.markdown(f"**Time:** {med.get('time', 'N/A')}")
-                    if st.button("✅ Mark as Taken", key=f"afternoon_{med.get('medication')}"):
-                        st.success(f"Marked {med.get('medication')} as taken!")
+                    if st.button("✅ Mark as Taken", key=f"afternoon_{med.get('medication_id')}_{med.get('time')}"):
+                        mark_taken(med.get('medication_id'), med.get('medication'))
         else:
             st.info("No afternoon medications")
         st.markdown("</div>", unsafe_allow_html=True)
@@ -599,23 +765,23 @@ elif menu == "📅 View Schedule":
     with col3:
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.markdown("#### 🌇 Evening Medications")
-        evening_meds = [m for m in schedule_data if any(time in str(m.get("time", "")) for time in time_slots["Evening (5 PM - 10 PM)"])]
+        evening_meds = by_part["evening"]
         if evening_meds:
             for med in evening_meds:
                 with st.expander(f"💊 {med.get('medication', 'Unknown')}"):
                     st.markdown(f"**Patient:** {med.get('patient', 'Unknown')}")
                     st.markdown(f"**Dosage:** {med.get('dosage', 'N/A')}")
                     st.markdown(f"**Time:** {med.get('time', 'N/A')}")
-                    if st.button("✅ Mark as Taken", key=f"evening_{med.get('medication')}"):
-                        st.success(f"Marked {med.get('medication')} as taken!")
+                    if st.button("✅ Mark as Taken", key=f"evening_{med.get('medication_id')}_{med.get('time')}"):
+                        mark_taken(med.get('medication_id'), med.get('medication'))
         else:
             st.info("No evening medications")
         st.markdown("</div>", unsafe_allow_html=True)
     
     # Detailed schedule table
-    if schedule_data:
+    if range_data:
         st.markdown("### 📋 Detailed Schedule Table")
-        df = pd.DataFrame(schedule_data)
+        df = pd.DataFrame(range_data)
         st.dataframe(df, use_container_width=True, hide_index=True)
 
 # ======================
@@ -640,6 +806,25 @@ elif menu == "🔔 Notifications":
         if st.button("💾 Save Settings", use_container_width=True):
             st.success("Notification settings saved!")
     
+    # Alarms that came due and wait for an answer
+    st.markdown("### 🔔 Pending Alarms")
+    if dashboard is None:
+        st.info("Backend offline - pending alarms unavailable")
+    elif not dashboard["pending_alarms"]:
+        st.info("No alarms waiting to be acknowledged")
+    else:
+        for alarm in dashboard["pending_alarms"]:
+            col_pend1, col_pend2, col_pend3 = st.columns([2, 1, 1])
+            with col_pend1:
+                st.markdown(f"**{alarm['message']}** for {alarm['patient']}")
+                st.markdown(f"⏰ Due: {alarm['time']}")
+            with col_pend2:
+                if st.button("✅ Taken", key=f"pending_taken_{alarm['alarm_id']}"):
+                    mark_taken(alarm["medication_id"], alarm["medication"])
+            with col_pend3:
+                if st.button("🔕 Acknowledge", key=f"ack_{alarm['alarm_id']}"):
+                    acknowledge_alarm(alarm["alarm_id"])
+    
     # Active Alarms
     st.markdown("### ⏰ Active Medication Alarms")
     
@@ -656,7 +841,7 @@ elif menu == "🔔 Notifications":
                         st.info(f"Snoozed {med.get('name')} for {snooze_duration}")
                 with col_alarm3:
                     if st.button("✅ Taken", key=f"taken_{med.get('id')}"):
-                        st.success(f"Marked {med.get('name')} as taken!")
+                        mark_taken(med.get('id'), med.get('name'))
     
     # Test Alarm Section
     st.markdown("### 🔧 Test Alarm System")
@@ -665,6 +850,51 @@ elif menu == "🔔 Notifications":
         st.session_state.alarm_time = datetime.now()
         st.rerun()
 
+# ======================
+# ADHERENCE ANALYTICS PAGE
+# ======================
+elif menu == "📈 Adherence Analytics":
+    st.markdown("<h2>📈 Adherence Analytics</h2>", unsafe_allow_html=True)
+    
+    col_an1, col_an2 = st.columns(2)
+    with col_an1:
+        window_days = st.selectbox("Period", [7, 30, 90, 365], index=1, format_func=lambda d: f"Last {d} days")
+    with col_an2:
+        group_by = st.radio("Group by", ["patient", "medication"], horizontal=True)
+    
+    try:
+        adherence_df = pd.DataFrame(**backend.analytics("adherence", window_days, by=group_by))
+        late_df = pd.DataFrame(**backend.analytics("late-doses", window_days))
+        streaks_df = pd.DataFrame(**backend.analytics("missed-streaks", window_days))
+    except:
+        adherence_df = late_df = streaks_df = None
+        st.error("❌ Analytics not available - is the backend running?")
+    
+    if adherence_df is not None:
+        if adherence_df.empty:
+            st.info("No doses were due in this period yet")
+        else:
+            total_due = int(adherence_df["due"].sum())
+            total_taken = int(adherence_df["taken"].sum())
+            mcol1, mcol2, mcol3 = st.columns(3)
+            mcol1.metric("Doses Due", total_due)
+            mcol2.metric("Doses Taken", total_taken)
+            mcol3.metric("Adherence", f"{total_taken / total_due:.0%}" if total_due else "N/A")
+            
+            st.markdown("### ✅ Adherence Rate")
+            label = "patient" if group_by == "patient" else "medication"
+            st.bar_chart(adherence_df.set_index(label)["adherence"])
+            st.dataframe(adherence_df, use_container_width=True, hide_index=True)
+            
+            col_chart1, col_chart2 = st.columns(2)
+            with col_chart1:
+                st.markdown("### ⏱️ How Late Doses Were Taken")
+                st.bar_chart(late_df.set_index("bucket")["doses"])
+            with col_chart2:
+                st.markdown("### ⚠️ Missed Dose Streaks")
+                st.dataframe(streaks_df.sort_values("current_streak", ascending=False),
+                             use_container_width=True, hide_index=True)
+
 # ======================
 # SETTINGS PAGE
 # ======================
@@ -685,18 +915,24 @@ elif menu == "⚙️ Settings":
     with tabs[1]:
         st.markdown("### 🧠 DFA Pattern Settings")
         st.markdown("""
-        **Current DFA Alphabet:** M, E, T, X
+        **Current DFA Alphabet:** M, N, A, E, B, T, X
         
         **Meanings:**
         - **M** = Morning (Default: 8:00 AM)
+        - **N** = Noon (Default: 12:00 PM)
+        - **A** = Afternoon (Default: 2:00 PM)
         - **E** = Evening (Default: 8:00 PM)
+        - **B** = Bedtime (Default: 10:00 PM)
         - **T** = Twice Daily (Default: 8:00 AM & 8:00 PM)
         - **X** = Skip/No Medication
         
         **Validation Rules:**
-        1. Only characters M, E, T, X are allowed
-        2. Empty patterns are invalid
-        3. Case insensitive (M = m, E = e, etc.)
+        1. Symbols may be grouped and repeated: (MX){3} = MXMXMX
+        2. A pattern in brackets is a cycle with one symbol per day: [MXMXMXX] = Mon/Wed/Fri
+        3. Empty patterns are invalid
+        4. Case insensitive (M = m, E = e, etc.)
+        
+        Slot times are set on the backend with MEDICATION_SLOT_TIMES (e.g. "morning=07:30,bedtime=23:00").
         """)
         
         # Custom time settings
@@ -721,7 +957,7 @@ elif menu == "⚙️ Settings":
         **Smart Medication System v2.0**
         
         **Features:**
-        - 🧠 DFA Pattern Validation (M, E, T, X)
+        - 🧠 DFA Pattern Validation (M, N, A, E, B, T, X)
         - ⏰ Smart Medication Scheduling
         - 🔔 Notification & Alarm System
         - 📱 Interactive Patient Management
@@ -746,7 +982,7 @@ elif menu == "🧠 DFA Pattern Tester":
     with col_test1:
         pattern_input = st.text_area(
             "Enter Pattern(s) to Validate",
-            placeholder="Enter one pattern per line\nExample:\nME\nMET\nMXE\nT\nA  # Invalid\nME1  # Invalid",
+            placeholder="Enter one pattern per line\nExample:\nME\nMNB\n(MX){3}\n[MXMXMXX]\nQ  # Invalid\nME1  # Invalid",
             height=200
         )
         
@@ -755,21 +991,27 @@ elif menu == "🧠 DFA Pattern Tester":
                 patterns = [p.strip() for p in pattern_input.split('\n') if p.strip()]
                 results = []
                 
-                for pattern in patterns:
-                    try:
-                        response = requests.get(f"http://localhost:8000/validate-pattern/{pattern}", timeout=3)
-                        if response.status_code == 200:
-                            result = response.json()
-                            results.append({
-                                "Pattern": pattern,
-                                "Status": "✅ Valid" if result.get("valid") else "❌ Invalid",
-                                "Meaning": ", ".join(result.get("meaning", [])) if result.get("valid") else result.get("message", "Error")
-                            })
-                    except:
+                # Validate the whole batch in a single request
+                batch_start = tm.perf_counter()
+                try:
+                    response = backend.post("/validate-patterns", json=patterns, timeout=10)
+                    response.raise_for_status()
+                    batch = response.json()
+                    for result in batch.get("results", []):
+                        results.append({
+                            "Pattern": result.get("pattern"),
+                            "Status": "✅ Valid" if result.get("valid") else "❌ Invalid",
+                            "Meaning": ", ".join(result.get("meaning", [])) if result.get("valid") else result.get("message", "Error")
+                        })
+                    batch_source = f"backend, {batch.get('elapsed_ms', 0):.2f} ms server time"
+                except:
+                    batch_source = "local validation (backend unavailable)"
+                    for pattern in patterns:
                         # Local validation
                         pattern_upper = pattern.upper()
-                        if all(c in "METX" for c in pattern_upper) and len(pattern_upper) > 0:
-                            meaning_map = {"M": "Morning", "E": "Evening", "T": "Twice Daily", "X": "Skip"}
+                        if all(c in "MNAEBTX" for c in pattern_upper) and len(pattern_upper) > 0:
+                            meaning_map = {"M": "Morning", "N": "Noon", "A": "Afternoon", "E": "Evening",
+                                           "B": "Bedtime", "T": "Twice Daily", "X": "Skip"}
                             meaning = [meaning_map.get(c, "Unknown") for c in pattern_upper]
                             results.append({
                                 "Pattern": pattern,
@@ -782,8 +1024,11 @@ elif menu == "🧠 DFA Pattern Tester":
                                 "Status": "❌ Invalid",
                                 "Meaning": "Invalid characters or empty pattern"
                             })
+                batch_ms = (tm.perf_counter() - batch_start) * 1000
                 
                 if results:
+                    valid_total = sum(1 for r in results if r["Status"] == "✅ Valid")
+                    st.caption(f"⏱️ Validated {len(results)} patterns ({valid_total} valid) in {batch_ms:.1f} ms — {batch_source}")
                     results_df = pd.DataFrame(results)
                     st.dataframe(results_df, use_container_width=True, hide_index=True)
     
@@ -798,7 +1043,9 @@ elif menu == "🧠 DFA Pattern Tester":
             ("MXE", "Morning + Skip + Evening"),
             ("T", "Twice Daily only"),
             ("MMEE", "Multiple Mornings & Evenings"),
-            ("A", "❌ Invalid (A)"),
+            ("MNAB", "Morning + Noon + Afternoon + Bedtime"),
+            ("[MX]", "Every other day"),
+            ("Q", "❌ Invalid (Q)"),
             ("ME1", "❌ Invalid (1)"),
             ("", "❌ Empty")
         ]
@@ -814,13 +1061,15 @@ elif menu == "🧠 DFA Pattern Tester":
         st.markdown("### 🔄 DFA State Diagram")
         st.markdown("""
         ```
-        Start → [Read Character]
+        Grammar: item+ | [item+]
+                 item = symbol{n}? | (symbol+){n}?
+                 symbol ∈ {M,N,A,E,B,T,X}
                 ↓
-        [Check if char in {M,E,T,X}]
+        Thompson NFA → subset construction → minimized DFA
                 ↓
-        [Valid] → [Accept] → [Next Character]
+        [Read Character] → [Next State]
                 ↓
-        [Invalid] → [Reject]
+        [Accepting state at end] → [Accept], [Dead state] → [Reject]
         ```
         """)
 
@@ -0,0 +1,175 @@
+# backend_client.py - SHARED BACKEND CLIENT
+"""One pooled HTTP session for every call the frontend makes to the API.
+
+Streamlit reruns the whole script on every interaction, so read
+endpoints are wrapped in short TTL caches and the session itself is a
+cached resource shared by all reruns and browser sessions. Call
+``invalidate()`` after a write so the next rerun sees it. JSON reads
+also send back the ETag of the last response, so an unchanged resource
+comes back as an empty 304.
+"""
+import json
+import os
+from typing import Optional
+from urllib.parse import quote
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Where the FastAPI backend lives (override with BACKEND_URL=http://host:port)
+BACKEND_URL = os.environ.get("BACKEND_URL", "http://localhost:8000").rstrip("/")
+
+# Seconds to wait for the backend before falling back to local data
+DEFAULT_TIMEOUT = 5
+
+# Patients fetched per request when listing every name (the backend's page limit)
+NAME_PAGE_SIZE = 1000
+
+# Idempotent reads are retried on connection errors and gateway failures
+RETRY = Retry(
+    total=2,
+    backoff_factor=0.2,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset({"GET", "HEAD"}),
+)
+
+
+def url(path: str) -> str:
+    return f"{BACKEND_URL}/{path.lstrip('/')}"
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Keep-alive session with a connection pool, shared across reruns"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=RETRY)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get(path: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return get_session().get(url(path), **kwargs)
+
+
+def post(path: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return get_session().post(url(path), **kwargs)
+
+
+@st.cache_resource
+def _validators() -> dict:
+    """(path, params) -> (ETag, decoded body) of the last full response"""
+    return {}
+
+
+def get_json_page(path: str, params: Optional[dict] = None, **kwargs):
+    """GET a JSON resource with If-None-Match; returns (body, X-Next-After-Id or None).
+
+    A 304 reuses the body (and cursor) we already have.
+    """
+    key = (path, tuple(sorted((params or {}).items())))
+    known = _validators().get(key)
+    headers = dict(kwargs.pop("headers", None) or {})
+    if known is not None:
+        headers["If-None-Match"] = known[0]
+    response = get(path, params=params, headers=headers, **kwargs)
+    if response.status_code == 304 and known is not None:
+        return known[1], known[2]
+    response.raise_for_status()
+    body = response.json()
+    next_after = response.headers.get("X-Next-After-Id")
+    etag = response.headers.get("ETag")
+    if etag:
+        _validators()[key] = (etag, body, next_after)
+    return body, next_after
+
+
+def get_json(path: str, params: Optional[dict] = None, **kwargs):
+    """GET a JSON resource with If-None-Match; a 304 reuses the body we already have"""
+    return get_json_page(path, params, **kwargs)[0]
+
+
+# ======================
+# CACHED READS
+# ======================
+@st.cache_data(ttl=5, show_spinner=False)
+def dashboard() -> dict:
+    """Counts, next dose, slot summary and alarms; also the health check"""
+    return get_json("/api/dashboard", timeout=3)
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def patient_names() -> list:
+    """Every patient name, paged through the X-Next-After-Id cursor"""
+    names, after_id = [], None
+    while True:
+        params = {"fields": "id,name", "limit": NAME_PAGE_SIZE}
+        if after_id is not None:
+            params["after_id"] = after_id
+        patients, after_id = get_json_page("/patients", params=params, timeout=3)
+        names.extend(p.get("name", "") for p in patients)
+        if after_id is None:
+            return names
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def search_patient_names(query: str, limit: int = 20) -> list:
+    """Names starting with ``query`` (at any word), for type-ahead boxes"""
+    response = get("/patients/search", params={"name": query, "limit": limit, "fields": "id,name"}, timeout=3)
+    response.raise_for_status()
+    return [p.get("name", "") for p in response.json()]
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def validate_pattern(pattern: str) -> dict:
+    """The backend's pattern check: valid, meaning, cycle_days and message"""
+    response = get(f"/validate-pattern/{quote(pattern, safe='')}", timeout=3)
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=15, show_spinner=False)
+def schedule_range(first: str, last: str) -> list:
+    """Schedule entries for [first, last], read from the NDJSON stream"""
+    with get("/api/schedule", params={"from": first, "to": last}, stream=True, timeout=10) as response:
+        response.raise_for_status()
+        return [json.loads(line) for line in response.iter_lines() if line]
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def analytics(name: str, days: int, **params) -> dict:
+    """An /api/analytics table in pandas "split" form (pd.DataFrame(**result))"""
+    response = get(f"/api/analytics/{name}", params={"days": days, **params}, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def invalidate():
+    """Drop cached reads after a patient or medication was added"""
+    dashboard.clear()
+    patient_names.clear()
+    search_patient_names.clear()
+    schedule_range.clear()
+
+
+# ======================
+# WRITES
+# ======================
+def mark_taken(med_id: int) -> dict:
+    """Record a dose; the backend also dismisses the medication's pending alarms"""
+    response = post(f"/api/medications/{med_id}/mark-taken")
+    response.raise_for_status()
+    invalidate()
+    return response.json()
+
+
+def acknowledge_alarm(alarm_id: str) -> dict:
+    """Dismiss one pending alarm without recording a dose"""
+    response = post(f"/api/notifications/{quote(alarm_id, safe='')}/ack")
+    response.raise_for_status()
+    invalidate()
+    return response.json()